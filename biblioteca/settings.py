@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'usuarios',
@@ -45,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Solo se instala con METRICAS_ACTIVAS (ver libros/metricas.py)
+    'libros.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,22 +81,46 @@ WSGI_APPLICATION = 'biblioteca.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+def entero_env(nombre, defecto):
+    return int(os.environ.get(nombre, defecto))
+
+
+def booleano_env(nombre, defecto=False):
+    return os.environ.get(nombre, str(defecto)).lower() in ('1', 'true', 'si', 'yes')
+
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'biblioteca',
-        'USER': 'postgres',
-        'PASSWORD': '123',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'biblioteca'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', '123'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Segundos que se reutiliza una conexión entre peticiones (0 = una por petición)
+        'CONN_MAX_AGE': entero_env('DB_CONN_MAX_AGE', 0),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Pool de conexiones de psycopg 3 (requiere `pip install "psycopg[binary,pool]"`).
+# Reemplaza a las conexiones persistentes: Django no admite los dos a la vez.
+if booleano_env('DB_POOL'):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': entero_env('DB_POOL_MIN', 2),
+            'max_size': entero_env('DB_POOL_MAX', 10),
+            'timeout': entero_env('DB_POOL_TIMEOUT', 10),
+        },
+    }
+
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'usuarios.autenticacion.JWTAutenticacionRapida',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'libros.pagination.CursorPaginacion',
 }
 
 
@@ -103,6 +131,60 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Caché de usuarios de la autenticación JWT (ver usuarios/autenticacion.py)
+USUARIOS_CACHE_TAMANIO = entero_env('USUARIOS_CACHE_TAMANIO', 1024)
+USUARIOS_CACHE_TTL = entero_env('USUARIOS_CACHE_TTL', 60)
+TOKENS_REVOCADOS_PODA = 3600
+
+# Métricas por petición y perfiles con cProfile (ver libros/metricas.py)
+METRICAS_ACTIVAS = booleano_env('METRICAS_ACTIVAS')
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+METRICAS_UMBRAL_REPETIDAS = 5
+METRICAS_PERFIL_DIR = BASE_DIR / 'perfiles'
+METRICAS_PERFIL_MUESTREO = float(os.environ.get('METRICAS_PERFIL_MUESTREO', '0'))
+
+
+# Caché de respuestas del catálogo (ver libros/cache.py). En memoria sirve
+# para un solo proceso; con varios workers hay que usar un backend compartido
+# para que todos vean las mismas versiones, por ejemplo con REDIS_URL.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'biblioteca',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+CACHE_RESPUESTAS_ALIAS = 'default'
+CACHE_RESPUESTAS_TIMEOUT = 300
+
+
+# Índice de similitud ítem-ítem del recomendador (ver `manage.py calcular_similitudes`)
+RECOMENDADOR_INDICE = BASE_DIR / 'indices' / 'similitudes.npz'
+
+# Ranking ponderado (ver libros/ranking.py). Sin RANKING_MINIMO_VOTOS se usa
+# la media de votos por libro como mínimo de votos.
+RANKING_MINIMO_VOTOS = None
+RANKING_TAMANIO = 100
+RANKING_INTERVALO = 60
+RANKING_REFRESCO_EN_SEGUNDO_PLANO = True
+
+# Tendencias (ver libros/tendencias.py): horas que se guarda la actividad por
+# hora (la diaria se guarda siempre) y cada cuántos segundos se borra la vieja.
+TENDENCIAS_RETENCION_HORAS = 7 * 24
+TENDENCIAS_PODA = 3600
+
+# Cola de tareas (ver libros/tareas.py): intentos por tarea, segundos antes
+# del primer reintento (se duplican en cada uno), segundos tras los que una
+# tarea en curso se da por perdida y carpeta donde se guardan los reportes.
+TAREAS_MAX_INTENTOS = 3
+TAREAS_ESPERA_REINTENTO = 30
+TAREAS_TIMEOUT = 3600
+TAREAS_DIR = BASE_DIR / 'tareas'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,30 @@
+"""
+Perfil de producción: ``DJANGO_SETTINGS_MODULE=biblioteca.settings_produccion``.
+
+Toda la configuración sensible sale de variables de entorno (ver README).
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, booleano_env, entero_env
+
+DEBUG = booleano_env('DJANGO_DEBUG')
+
+try:
+    SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+except KeyError:
+    raise ImproperlyConfigured('Falta la variable de entorno DJANGO_SECRET_KEY.')
+
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host.strip()]
+
+# Conexiones persistentes (salvo que se use el pool): sin el saludo TCP/TLS y
+# la autenticación de PostgreSQL en cada petición. CONN_HEALTH_CHECKS descarta
+# al inicio de la petición las conexiones que el servidor haya cerrado.
+if not booleano_env('DB_POOL'):
+    DATABASES['default']['CONN_MAX_AGE'] = entero_env('DB_CONN_MAX_AGE', 60)
+
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+SESSION_COOKIE_SECURE = True
+CSRF_COOKIE_SECURE = True
@@ -0,0 +1,310 @@
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from . import ranking
+from .cache import invalidar
+from .models import (
+    Genero, Autor, Libro, Calificacion, UsuarioGenero,
+    ActividadCalificaciones, ActividadLibro, ActividadGenero,
+)
+
+CAMPOS_ESTRELLAS = ['estrellas_1', 'estrellas_2', 'estrellas_3', 'estrellas_4', 'estrellas_5']
+CAMPOS_AGREGADOS = ['suma_puntuaciones', 'cantidad_calificaciones'] + CAMPOS_ESTRELLAS
+
+# Cada puntuación (1.0 a 5.0) cae en la estrella más cercana: [1.5, 2.5) -> 2, etc.
+LIMITES_ESTRELLAS = [Decimal('1.5'), Decimal('2.5'), Decimal('3.5'), Decimal('4.5')]
+
+TAMANIO_LOTE = 1000
+
+HORA, DIA = ActividadCalificaciones.HORA, ActividadCalificaciones.DIA
+
+
+def estrellas(puntuacion):
+    """Devuelve la estrella (1 a 5) en la que se cuenta una puntuación."""
+    redondeada = Decimal(puntuacion).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+    return min(5, max(1, int(redondeada)))
+
+
+def _ranking_desactualizado():
+    # El ranking se recalcula en segundo plano recién cuando la transacción confirma
+    transaction.on_commit(ranking.programar_refresco)
+
+
+def _filtro_estrella(numero):
+    filtro = Q()
+    if numero > 1:
+        filtro &= Q(puntuacion__gte=LIMITES_ESTRELLAS[numero - 2])
+    if numero < 5:
+        filtro &= Q(puntuacion__lt=LIMITES_ESTRELLAS[numero - 1])
+    return filtro
+
+
+def _deltas(suma, cantidad, cambios_estrellas):
+    deltas = {'suma_puntuaciones': suma, 'cantidad_calificaciones': cantidad}
+    for numero, delta in cambios_estrellas.items():
+        deltas[CAMPOS_ESTRELLAS[numero - 1]] = delta
+    return {campo: delta for campo, delta in deltas.items() if delta}
+
+
+def _actualizar(libro_id, suma, cantidad, cambios_estrellas):
+    cambios = {campo: F(campo) + delta for campo, delta in _deltas(suma, cantidad, cambios_estrellas).items()}
+    if not cambios:
+        return
+    Libro.objects.filter(pk=libro_id).update(**cambios)
+    Autor.objects.filter(libros=libro_id).update(**cambios)
+    Genero.objects.filter(libros=libro_id).update(**cambios)
+    _ranking_desactualizado()
+
+
+def _actualizar_celda(usuario_id, libro_id, suma, cantidad):
+    """Suma a la celda (usuario, género del libro) de la matriz; la crea o la borra según haga falta."""
+    celda = UsuarioGenero.objects.filter(usuario_id=usuario_id, genero__libros=libro_id)
+    cambios = {
+        'suma_puntuaciones': F('suma_puntuaciones') + suma,
+        'cantidad_calificaciones': F('cantidad_calificaciones') + cantidad,
+    }
+    if celda.update(**cambios):
+        if cantidad < 0:
+            celda.filter(cantidad_calificaciones=0).delete()
+        return
+    if cantidad <= 0:
+        return
+    genero_id = Libro.objects.values_list('genero_id', flat=True).get(pk=libro_id)
+    try:
+        with transaction.atomic():
+            UsuarioGenero.objects.create(usuario_id=usuario_id, genero_id=genero_id,
+                                         suma_puntuaciones=suma, cantidad_calificaciones=cantidad)
+    except IntegrityError:
+        # Otra transacción creó la celda entre el UPDATE y el INSERT
+        celda.update(**cambios)
+
+
+def retencion_horas():
+    return getattr(settings, 'TENDENCIAS_RETENCION_HORAS', 7 * 24)
+
+
+def inicios(fecha):
+    """``{HORA: inicio de la hora, DIA: inicio del día}`` de ``fecha``, en la zona horaria actual."""
+    hora = timezone.localtime(fecha).replace(minute=0, second=0, microsecond=0)
+    return {HORA: hora, DIA: hora.replace(hour=0)}
+
+
+def _primera_hora_guardada():
+    return inicios(timezone.now())[HORA] - timedelta(hours=retencion_horas() - 1)
+
+
+def _actualizar_actividad(libro_id, fecha, suma, cantidad, cambios_estrellas):
+    """Suma a las filas de la hora y del día de ``fecha``, del libro y de su género; crea o borra las que haga falta."""
+    if fecha is None:
+        return
+    deltas = _deltas(suma, cantidad, cambios_estrellas)
+    cambios = {campo: F(campo) + delta for campo, delta in deltas.items()}
+    periodos = inicios(fecha)
+    if periodos[HORA] < _primera_hora_guardada():
+        del periodos[HORA]
+    en_periodos = reduce(or_, (Q(granularidad=granularidad, inicio=inicio) for granularidad, inicio in periodos.items()))
+    genero_id = None
+
+    for modelo, duenio in ((ActividadLibro, Q(libro_id=libro_id)), (ActividadGenero, Q(genero__libros=libro_id))):
+        filas = modelo.objects.filter(duenio, en_periodos)
+        actualizadas = filas.update(**cambios)
+        if cantidad < 0:
+            filas.filter(cantidad_calificaciones=0).delete()
+        if cantidad <= 0 or actualizadas == len(periodos):
+            continue
+        # Primera calificación de la hora o del día: se crean las filas que faltan
+        existentes = set(filas.values_list('granularidad', flat=True))
+        if genero_id is None:
+            genero_id = Libro.objects.values_list('genero_id', flat=True).get(pk=libro_id)
+        clave = {'libro_id': libro_id} if modelo is ActividadLibro else {'genero_id': genero_id}
+        for granularidad, inicio in periodos.items():
+            if granularidad in existentes:
+                continue
+            try:
+                with transaction.atomic():
+                    modelo.objects.create(granularidad=granularidad, inicio=inicio, **clave, **deltas)
+            except IntegrityError:
+                modelo.objects.filter(granularidad=granularidad, inicio=inicio, **clave).update(**cambios)
+        if HORA in periodos and HORA not in existentes:
+            podar_actividad()
+
+
+_ultima_poda = 0.0
+_lock_poda = threading.Lock()
+
+
+def podar_actividad(forzar=False):
+    """Borra las filas por hora fuera de la retención (a lo sumo cada ``TENDENCIAS_PODA`` s)."""
+    global _ultima_poda
+    ahora = time.monotonic()
+    with _lock_poda:
+        if not forzar and ahora - _ultima_poda < getattr(settings, 'TENDENCIAS_PODA', 3600):
+            return 0
+        _ultima_poda = ahora
+    limite = _primera_hora_guardada()
+    return sum(
+        modelo.objects.filter(granularidad=HORA, inicio__lt=limite).delete()[0]
+        for modelo in (ActividadLibro, ActividadGenero)
+    )
+
+
+def sumar_calificacion(libro_id, puntuacion, usuario_id, fecha):
+    puntuacion = Decimal(puntuacion)
+    _actualizar(libro_id, puntuacion, 1, {estrellas(puntuacion): 1})
+    _actualizar_celda(usuario_id, libro_id, puntuacion, 1)
+    _actualizar_actividad(libro_id, fecha, puntuacion, 1, {estrellas(puntuacion): 1})
+
+
+def restar_calificacion(libro_id, puntuacion, usuario_id, fecha):
+    puntuacion = Decimal(puntuacion)
+    _actualizar(libro_id, -puntuacion, -1, {estrellas(puntuacion): -1})
+    _actualizar_celda(usuario_id, libro_id, -puntuacion, -1)
+    _actualizar_actividad(libro_id, fecha, -puntuacion, -1, {estrellas(puntuacion): -1})
+
+
+def cambiar_calificacion(libro_id, anterior, nueva, usuario_id, fecha_anterior, fecha):
+    anterior, nueva = Decimal(anterior), Decimal(nueva)
+    cambios_estrellas = {estrellas(anterior): -1}
+    cambios_estrellas[estrellas(nueva)] = cambios_estrellas.get(estrellas(nueva), 0) + 1
+    _actualizar(libro_id, nueva - anterior, 0, cambios_estrellas)
+    _actualizar_celda(usuario_id, libro_id, nueva - anterior, 0)
+    # En la actividad la calificación se muda del período de su fecha anterior al de la nueva
+    _actualizar_actividad(libro_id, fecha_anterior, -anterior, -1, {estrellas(anterior): -1})
+    _actualizar_actividad(libro_id, fecha, nueva, 1, {estrellas(nueva): 1})
+
+
+def _guardar(modelo, filas, ids):
+    """Pone en cero los agregados de ``ids`` (o de todos) y escribe ``filas``."""
+    queryset = modelo.objects.all() if ids is None else modelo.objects.filter(pk__in=ids)
+    queryset.update(**{campo: 0 for campo in CAMPOS_AGREGADOS})
+    objetos = [modelo(pk=pk, **valores) for pk, valores in filas.items()]
+    modelo.objects.bulk_update(objetos, CAMPOS_AGREGADOS, batch_size=TAMANIO_LOTE)
+    invalidar(modelo)
+
+
+def _sumar_desde_libros(campo, ids):
+    libros = Libro.objects.all() if ids is None else Libro.objects.filter(**{f'{campo}__in': ids})
+    filas = libros.values(campo).annotate(**{f'total_{c}': Sum(c) for c in CAMPOS_AGREGADOS})
+    return {
+        fila[campo]: {c: fila[f'total_{c}'] for c in CAMPOS_AGREGADOS}
+        for fila in filas
+    }
+
+
+def recalcular_autores(ids=None):
+    _guardar(Autor, _sumar_desde_libros('autor', ids), ids)
+
+
+def recalcular_generos(ids=None):
+    _guardar(Genero, _sumar_desde_libros('genero', ids), ids)
+    _ranking_desactualizado()
+
+
+def recalcular_matriz(usuarios=None, generos=None):
+    """Reconstruye las celdas de la matriz usuario x género (todas, o las de ``usuarios`` y ``generos``)."""
+    celdas = UsuarioGenero.objects.all()
+    calificaciones = Calificacion.objects.all()
+    if usuarios is not None:
+        celdas = celdas.filter(usuario_id__in=usuarios)
+        calificaciones = calificaciones.filter(usuario_id__in=usuarios)
+    if generos is not None:
+        celdas = celdas.filter(genero_id__in=generos)
+        calificaciones = calificaciones.filter(libro__genero_id__in=generos)
+    celdas.delete()
+    filas = calificaciones.values('usuario_id', 'libro__genero_id').annotate(
+        suma=Sum('puntuacion'), cantidad=Count('id'),
+    )
+    UsuarioGenero.objects.bulk_create(
+        [UsuarioGenero(usuario_id=fila['usuario_id'], genero_id=fila['libro__genero_id'],
+                       suma_puntuaciones=fila['suma'], cantidad_calificaciones=fila['cantidad'])
+         for fila in filas],
+        batch_size=TAMANIO_LOTE,
+    )
+
+
+def recalcular_actividad(libros=None):
+    """Reconstruye las filas por hora y por día (todas o las de ``libros``) desde la fecha de cada calificación."""
+    calificaciones = Calificacion.objects.filter(fecha__isnull=False)
+    actividad = ActividadLibro.objects.all()
+    periodos = None
+    if libros is not None:
+        calificaciones = calificaciones.filter(libro_id__in=libros)
+        actividad = actividad.filter(libro_id__in=libros)
+        periodos = set(actividad.values_list('inicio', flat=True))
+    actividad.delete()
+
+    nuevas = []
+    for granularidad, truncar in ((HORA, TruncHour), (DIA, TruncDay)):
+        filas = calificaciones.filter(fecha__gte=_primera_hora_guardada()) if granularidad == HORA else calificaciones
+        filas = filas.annotate(inicio=truncar('fecha')).values('libro_id', 'inicio').annotate(
+            suma_puntuaciones=Sum('puntuacion'),
+            cantidad_calificaciones=Count('id'),
+            **{campo: Count('id', filter=_filtro_estrella(i)) for i, campo in enumerate(CAMPOS_ESTRELLAS, 1)},
+        )
+        nuevas += [ActividadLibro(granularidad=granularidad, **fila) for fila in filas]
+    ActividadLibro.objects.bulk_create(nuevas, batch_size=TAMANIO_LOTE)
+
+    if libros is None:
+        recalcular_actividad_generos()
+    else:
+        generos = set(Libro.objects.filter(pk__in=libros).values_list('genero_id', flat=True))
+        recalcular_actividad_generos(generos, periodos | {fila.inicio for fila in nuevas})
+
+
+def recalcular_actividad_generos(generos=None, periodos=None):
+    """Suma por género las filas de ``ActividadLibro`` (todas, o las de ``generos`` que empiezan en ``periodos``)."""
+    actividad = ActividadLibro.objects.all()
+    anteriores = ActividadGenero.objects.all()
+    if generos is not None:
+        actividad = actividad.filter(libro__genero_id__in=generos, inicio__in=periodos)
+        anteriores = anteriores.filter(genero_id__in=generos, inicio__in=periodos)
+    anteriores.delete()
+    filas = actividad.values('libro__genero_id', 'granularidad', 'inicio').annotate(
+        **{f'total_{campo}': Sum(campo) for campo in CAMPOS_AGREGADOS},
+    )
+    ActividadGenero.objects.bulk_create(
+        [ActividadGenero(genero_id=fila['libro__genero_id'], granularidad=fila['granularidad'], inicio=fila['inicio'],
+                         **{campo: fila[f'total_{campo}'] for campo in CAMPOS_AGREGADOS})
+         for fila in filas],
+        batch_size=TAMANIO_LOTE,
+    )
+
+
+@transaction.atomic
+def recalcular_agregados(libros=None, usuarios=None):
+    """Reconstruye los agregados desde la tabla de calificaciones.
+
+    Sin argumentos recalcula todo; con ``libros`` (lista de IDs) solo esos
+    libros, los autores y géneros a los que pertenecen, su actividad por hora
+    y por día y, en la matriz usuario x género, esos géneros (solo para
+    ``usuarios``, si se indican).
+    """
+    calificaciones = Calificacion.objects.all()
+    autores = generos = None
+    if libros is not None:
+        libros = list(libros)
+        calificaciones = calificaciones.filter(libro_id__in=libros)
+        relacionados = Libro.objects.filter(pk__in=libros).values_list('autor_id', 'genero_id')
+        autores = {autor_id for autor_id, _ in relacionados}
+        generos = {genero_id for _, genero_id in relacionados}
+
+    filas = calificaciones.values('libro_id').annotate(
+        suma_puntuaciones=Sum('puntuacion'),
+        cantidad_calificaciones=Count('id'),
+        **{campo: Count('id', filter=_filtro_estrella(i)) for i, campo in enumerate(CAMPOS_ESTRELLAS, 1)},
+    )
+    _guardar(Libro, {fila.pop('libro_id'): fila for fila in filas}, libros)
+    recalcular_autores(autores)
+    recalcular_generos(generos)
+    recalcular_matriz(usuarios, generos)
+    recalcular_actividad(libros)
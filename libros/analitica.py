@@ -0,0 +1,37 @@
+"""Lectura compacta de la tabla de calificaciones para el recomendador.
+
+Trae ``(libro_id, usuario_id, puntuacion)`` con un cursor del servidor a
+columnas tipadas (ids enteros, puntuaciones ``float32``), sin instanciar
+modelos. Los reportes no la usan: leen los agregados y ``libros.matrices``.
+"""
+from array import array
+
+import numpy as np
+import pandas as pd
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .models import Calificacion
+
+TAMANIO_BLOQUE = 20000
+
+
+def cargar_calificaciones(queryset=None, chunk_size=TAMANIO_BLOQUE):
+    """Lee ``(libro_id, usuario_id, puntuacion)`` con un cursor del servidor a arreglos tipados."""
+    queryset = Calificacion.objects.all() if queryset is None else queryset
+    libro_ids, usuario_ids, puntuaciones = array('q'), array('q'), array('f')
+    filas = (
+        queryset.order_by()
+        .annotate(valor=Cast('puntuacion', FloatField()))
+        .values_list('libro_id', 'usuario_id', 'valor')
+        .iterator(chunk_size=chunk_size)
+    )
+    for libro_id, usuario_id, valor in filas:
+        libro_ids.append(libro_id)
+        usuario_ids.append(usuario_id)
+        puntuaciones.append(valor)
+    return pd.DataFrame({
+        'libro_id': np.frombuffer(libro_ids, dtype=np.int64),
+        'usuario_id': np.frombuffer(usuario_ids, dtype=np.int64),
+        'puntuacion': np.frombuffer(puntuaciones, dtype=np.float32),
+    })
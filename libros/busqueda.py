@@ -0,0 +1,233 @@
+"""Búsqueda de libros por título y autor (``/api/libros/?q=``).
+
+En PostgreSQL se usa la columna ``busqueda`` (``tsvector`` con el título y el
+nombre del autor, mantenida por triggers e indexada con GIN, ver la migración
+0005) para la búsqueda de texto completo, y los índices de trigramas sobre
+``titulo`` y ``autor.nombre`` para tolerar errores de tipeo.
+
+Con otros motores (SQLite en las pruebas) se arma en memoria un índice
+invertido palabra -> libros, que se reconstruye cuando cambia la versión de
+``Libro`` o ``Autor`` en la caché (ver ``libros.cache``).
+"""
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+
+import numpy as np
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVectorField, TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import Expression, F, Q
+from django.db.models.functions import Greatest
+
+from . import cache
+from .models import Autor, Libro
+
+LONGITUD_MAXIMA = 200
+CONFIGURACION = 'spanish'
+
+# Índice en memoria: peso de cada campo y similitud mínima de trigramas
+PESO_TITULO = 1.0
+PESO_AUTOR = 0.5
+SIMILITUD_MINIMA = 0.45
+
+
+def texto_busqueda(request):
+    """Devuelve el texto de ``?q=`` (recortado) o ``None``."""
+    texto = (request.query_params.get('q') or '').strip()
+    return texto[:LONGITUD_MAXIMA] or None
+
+
+def normalizar(texto):
+    texto = (texto or '').lower()
+    if texto.isascii():
+        return texto
+    sin_acentos = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in sin_acentos if not unicodedata.combining(c))
+
+
+PALABRA = re.compile(r'\w+')
+
+
+def palabras(texto):
+    return PALABRA.findall(normalizar(texto))
+
+
+def trigramas(palabra):
+    # Igual que pg_trgm: dos espacios al principio y uno al final
+    relleno = f'  {palabra} '
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class IndiceInvertido:
+    """Índice palabra -> posiciones de libros, en arreglos de numpy (formato CSR)."""
+
+    def __init__(self, filas):
+        vocabulario = {}
+        token_de = vocabulario.setdefault
+        libro_ids, tokens, posiciones, pesos = array('q'), array('q'), array('q'), array('f')
+        for posicion, (libro_id, titulo, autor) in enumerate(filas):
+            libro_ids.append(libro_id)
+            encontradas = dict.fromkeys(palabras(autor), PESO_AUTOR)
+            encontradas.update(dict.fromkeys(palabras(titulo), PESO_TITULO))
+            tokens.extend([token_de(palabra, len(vocabulario)) for palabra in encontradas])
+            posiciones.extend([posicion] * len(encontradas))
+            pesos.extend(encontradas.values())
+
+        tokens = np.frombuffer(tokens, dtype=np.int64)
+        orden = np.argsort(tokens, kind='stable')
+        self.libro_ids = np.frombuffer(libro_ids, dtype=np.int64)
+        self.posiciones = np.frombuffer(posiciones, dtype=np.int64)[orden].astype(np.int32)
+        self.pesos = np.frombuffer(pesos, dtype=np.float32)[orden]
+        self.inicio = np.searchsorted(tokens[orden], np.arange(len(vocabulario) + 1))
+        self.vocabulario = vocabulario
+        frecuencias = np.diff(self.inicio)
+        self.idf = np.log1p(len(self.libro_ids) / np.maximum(frecuencias, 1)).astype(np.float32)
+
+        self.por_trigrama = {}
+        for palabra, token in vocabulario.items():
+            for trigrama in trigramas(palabra):
+                self.por_trigrama.setdefault(trigrama, []).append(token)
+        self.cantidad_trigramas = [0] * len(vocabulario)
+        for palabra, token in vocabulario.items():
+            self.cantidad_trigramas[token] = len(trigramas(palabra))
+
+    def candidatos(self, palabra):
+        """Palabras del índice parecidas a ``palabra``: ``{token: similitud}``."""
+        exacto = self.vocabulario.get(palabra)
+        if exacto is not None:
+            return {exacto: 1.0}
+        propios = trigramas(palabra)
+        compartidos = Counter(
+            token for trigrama in propios for token in self.por_trigrama.get(trigrama, ())
+        )
+        resultado = {}
+        for token, comunes in compartidos.items():
+            similitud = comunes / (len(propios) + self.cantidad_trigramas[token] - comunes)
+            if similitud >= SIMILITUD_MINIMA:
+                resultado[token] = similitud
+        return resultado
+
+    def _puntajes(self, palabra):
+        """Posiciones que contienen ``palabra`` (o una parecida) y su puntaje, sin repetidas."""
+        partes_pos, partes_puntaje = [], []
+        for token, similitud in self.candidatos(palabra).items():
+            desde, hasta = self.inicio[token], self.inicio[token + 1]
+            partes_pos.append(self.posiciones[desde:hasta])
+            partes_puntaje.append(self.pesos[desde:hasta] * (similitud * self.idf[token]))
+        if not partes_pos:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        posiciones = np.concatenate(partes_pos)
+        puntajes = np.concatenate(partes_puntaje)
+        # Si varias palabras parecidas caen en el mismo libro, queda la mejor
+        orden = np.lexsort((-puntajes, posiciones))
+        posiciones, puntajes = posiciones[orden], puntajes[orden]
+        primeras = np.concatenate(([True], posiciones[1:] != posiciones[:-1]))
+        return posiciones[primeras], puntajes[primeras]
+
+    def buscar(self, texto):
+        """Libros que contienen todas las palabras de ``texto``: ``(libro_ids, puntajes)`` de mayor a menor."""
+        posiciones = puntajes = None
+        for palabra in dict.fromkeys(palabras(texto)):
+            encontradas, puntos = self._puntajes(palabra)
+            if posiciones is None:
+                posiciones, puntajes = encontradas, puntos
+                continue
+            posiciones, en_previas, en_nuevas = np.intersect1d(
+                posiciones, encontradas, assume_unique=True, return_indices=True,
+            )
+            puntajes = puntajes[en_previas] + puntos[en_nuevas]
+        if posiciones is None or len(posiciones) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids = self.libro_ids[posiciones]
+        orden = np.lexsort((ids, -puntajes))
+        return ids[orden], puntajes[orden]
+
+
+_indice = None
+_lock = threading.Lock()
+
+
+def obtener_indice():
+    """Índice en memoria de este proceso; se rearma si cambiaron libros o autores."""
+    global _indice
+    version = tuple(sorted(cache.versiones((Libro, Autor)).items()))
+    with _lock:
+        if _indice is None or _indice[0] != version:
+            filas = Libro.objects.order_by().values_list('id', 'titulo', 'autor__nombre').iterator(chunk_size=20000)
+            _indice = (version, IndiceInvertido(filas))
+        return _indice[1]
+
+
+class ResultadosEnMemoria:
+    """Resultados del índice en memoria con la interfaz que usa el paginador.
+
+    Solo se traen de la base los libros de la página pedida.
+    """
+
+    def __init__(self, queryset, libro_ids, puntajes):
+        self.queryset = queryset
+        self.libro_ids = libro_ids
+        self.puntajes = puntajes
+
+    def __len__(self):
+        return len(self.libro_ids)
+
+    def __getitem__(self, rebanada):
+        ids = self.libro_ids[rebanada].tolist()
+        libros = self.queryset.in_bulk(ids)
+        resultado = []
+        for libro_id, puntaje in zip(ids, self.puntajes[rebanada].tolist()):
+            if libro_id in libros:
+                libros[libro_id].rango = puntaje
+                resultado.append(libros[libro_id])
+        return resultado
+
+
+class VectorBusqueda(Expression):
+    """La columna ``busqueda`` de ``libros_libro``, que no está declarada en el modelo
+    para no traer el ``tsvector`` en cada consulta."""
+    output_field = SearchVectorField()
+
+    def as_sql(self, compiler, connection):
+        tabla = compiler.quote_name_unless_alias(compiler.query.get_initial_alias())
+        return f'{tabla}.{connection.ops.quote_name("busqueda")}', []
+
+
+def buscar_postgres(queryset, texto):
+    consulta = SearchQuery(texto, config=CONFIGURACION, search_type='websearch')
+    return (
+        queryset.alias(vector=VectorBusqueda())
+        .annotate(
+            rango=SearchRank(VectorBusqueda(), consulta),
+            similitud=Greatest(
+                TrigramWordSimilarity(texto, 'titulo'),
+                TrigramWordSimilarity(texto, 'autor__nombre'),
+            ),
+        )
+        .filter(
+            Q(vector=consulta)
+            | Q(titulo__trigram_word_similar=texto)
+            | Q(autor__nombre__trigram_word_similar=texto)
+        )
+        .order_by(F('rango').desc(), F('similitud').desc(), 'id')
+    )
+
+
+def buscar(queryset, texto):
+    """Filtra ``queryset`` por ``texto`` y lo ordena por relevancia.
+
+    Devuelve un queryset en PostgreSQL o ``ResultadosEnMemoria`` en otros motores.
+    """
+    if connection.vendor == 'postgresql':
+        return buscar_postgres(queryset, texto)
+    libro_ids, puntajes = obtener_indice().buscar(texto)
+    if queryset.query.has_filters() and len(libro_ids):
+        # Filtros del listado (autor, género, fechas...): se respetan antes de paginar
+        permitidos = np.fromiter(queryset.order_by().values_list('pk', flat=True).iterator(), dtype=np.int64)
+        coinciden = np.isin(libro_ids, permitidos)
+        libro_ids, puntajes = libro_ids[coinciden], puntajes[coinciden]
+    return ResultadosEnMemoria(queryset, libro_ids, puntajes)
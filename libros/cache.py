@@ -0,0 +1,129 @@
+"""Caché de respuestas de lectura del catálogo.
+
+Cada modelo tiene un número de versión guardado en la caché (el instante de
+su último cambio, en microsegundos) que suben las señales ``post_save`` y
+``post_delete``. La clave de una respuesta incluye la ruta, los parámetros y
+las versiones de los modelos de los que depende, así que después de un cambio
+las entradas viejas simplemente dejan de leerse. La misma clave sirve de ETag
+y la versión más nueva de Last-Modified, para responder 304 sin cuerpo.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Genero, Autor, Libro, Calificacion
+
+MODELOS_VERSIONADOS = (Libro, Autor, Genero, Calificacion)
+
+
+def obtener_cache():
+    return caches[getattr(settings, 'CACHE_RESPUESTAS_ALIAS', 'default')]
+
+
+def _clave_version(modelo):
+    return f'version:{modelo._meta.label_lower}'
+
+
+def _ahora():
+    return time.time_ns() // 1000
+
+
+def versiones(modelos):
+    """Devuelve ``{clave: version}``; los modelos sin versión arrancan en este instante."""
+    cache = obtener_cache()
+    claves = [_clave_version(modelo) for modelo in modelos]
+    actuales = cache.get_many(claves)
+    for clave in claves:
+        if clave not in actuales:
+            cache.add(clave, _ahora())
+            actuales[clave] = cache.get(clave, 0)
+    return actuales
+
+
+def _subir_versiones(modelos):
+    cache = obtener_cache()
+    for modelo in modelos:
+        clave = _clave_version(modelo)
+        cache.set(clave, max(_ahora(), cache.get(clave, 0) + 1), None)
+
+
+def invalidar(*modelos):
+    """Da por vencidas las respuestas que dependen de ``modelos``.
+
+    Se sube la versión en el momento y otra vez al confirmar la transacción,
+    por si mientras tanto otra petición guardó en caché los datos viejos.
+    """
+    _subir_versiones(modelos)
+    transaction.on_commit(lambda: _subir_versiones(modelos))
+
+
+def _al_cambiar(sender, **kwargs):
+    invalidar(sender)
+
+
+def conectar_senales():
+    for modelo in MODELOS_VERSIONADOS:
+        post_save.connect(_al_cambiar, sender=modelo, dispatch_uid=f'cache_{modelo._meta.label_lower}_save')
+        post_delete.connect(_al_cambiar, sender=modelo, dispatch_uid=f'cache_{modelo._meta.label_lower}_delete')
+
+
+def _no_modificado(request, etag, ultima_modificacion):
+    si_no_coincide = request.headers.get('If-None-Match')
+    if si_no_coincide is not None:
+        return si_no_coincide.strip() == '*' or etag in [e.strip() for e in si_no_coincide.split(',')]
+    desde = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return desde is not None and int(ultima_modificacion) <= desde
+
+
+def respuesta_cacheada(*modelos):
+    """Cachea el resultado de una acción de lectura mientras ``modelos`` no cambien.
+
+    Se guarda ``response.data`` antes de renderizar, así que la negociación de
+    contenido, la autenticación y los permisos se siguen aplicando en cada
+    petición; lo que se evita es la consulta y la serialización.
+    """
+    def decorador(metodo):
+        @functools.wraps(metodo)
+        def envoltura(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return metodo(self, request, *args, **kwargs)
+
+            actuales = versiones(modelos)
+            material = repr((
+                request.path, sorted(request.query_params.lists()),
+                request.accepted_renderer.format, sorted(actuales.items()),
+            ))
+            firma = hashlib.sha1(material.encode()).hexdigest()
+            etag = quote_etag(firma)
+            ultima_modificacion = max(actuales.values()) / 1_000_000
+
+            if _no_modificado(request, etag, ultima_modificacion):
+                respuesta = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                cache = obtener_cache()
+                clave = f'respuesta:{firma}'
+                guardado = cache.get(clave)
+                if guardado is not None:
+                    respuesta = Response(guardado)
+                else:
+                    respuesta = metodo(self, request, *args, **kwargs)
+                    if respuesta.status_code != status.HTTP_200_OK:
+                        return respuesta
+                    cache.set(clave, respuesta.data, getattr(settings, 'CACHE_RESPUESTAS_TIMEOUT', 300))
+
+            respuesta['ETag'] = etag
+            respuesta['Last-Modified'] = http_date(ultima_modificacion)
+            # Requiere autenticación: solo el cliente puede guardarla y debe revalidar
+            patch_cache_control(respuesta, private=True, no_cache=True)
+            return respuesta
+        return envoltura
+    return decorador
@@ -0,0 +1,118 @@
+"""Los agregados de ``reporte_libros`` como datos, para la API y los gráficos.
+
+Cada estadística es una única consulta agrupada sobre las columnas
+materializadas (``libros.agregados``) o una muestra acotada de las matrices
+(``libros.matrices``): ninguna recorre la tabla de calificaciones.
+"""
+from django.contrib.auth.models import User
+from django.db.models import Count, FloatField, Sum
+from django.db.models.functions import Cast, Coalesce
+
+from . import matrices
+from .models import Genero, Autor, Libro, UsuarioGenero
+
+DECIMALES = 4
+
+
+def _filas(queryset, **columnas):
+    """Lista de diccionarios ``{nombre: valor}`` (``columnas`` es ``{nombre: campo}``); redondea los promedios."""
+    filas = []
+    for fila in queryset.values_list(*columnas.values()):
+        fila = dict(zip(columnas, fila))
+        if fila.get('prom') is not None:
+            fila['prom'] = round(fila['prom'], DECIMALES)
+        filas.append(fila)
+    return filas
+
+
+def _con_votos():
+    return Libro.objects.filter(cantidad_calificaciones__gt=0).con_promedio()
+
+
+# 1. Total de libros por género
+def libros_por_genero():
+    return _filas(Genero.objects.annotate(total=Count('libros')).order_by('id'),
+                  id='id', nombre='nombre', total='total')
+
+
+# 2. Autores con más libros
+def autores_mas_libros(n=10):
+    return _filas(Autor.objects.annotate(total=Count('libros')).order_by('-total', 'id')[:n],
+                  id='id', nombre='nombre', total='total')
+
+
+# 3. Libros con más calificaciones
+def libros_mas_calificados(n=10):
+    return _filas(Libro.objects.order_by('-cantidad_calificaciones', 'id')[:n],
+                  id='id', titulo='titulo', total='cantidad_calificaciones')
+
+
+# 4. Promedio de calificación por género
+def promedio_genero():
+    return _filas(Genero.objects.filter(cantidad_calificaciones__gt=0).con_promedio().order_by('id'),
+                  id='id', nombre='nombre', prom='promedio', total='cantidad_calificaciones')
+
+
+# 5. Libros con mejor promedio
+def promedio_libro(n=10):
+    return _filas(_con_votos().order_by('-promedio', 'id')[:n],
+                  id='id', titulo='titulo', prom='promedio', total='cantidad_calificaciones')
+
+
+# 6. Promedio de calificación por usuario
+def promedio_usuario():
+    por_usuario = UsuarioGenero.objects.values('usuario_id', 'usuario__username').annotate(
+        prom=Cast(Sum('suma_puntuaciones'), FloatField()) / Sum('cantidad_calificaciones'),
+        total=Sum('cantidad_calificaciones'),
+    ).order_by('usuario_id')
+    return _filas(por_usuario, id='usuario_id', username='usuario__username', prom='prom', total='total')
+
+
+# 7. Usuarios con más calificaciones
+def usuarios_mas_calificaron(n=10):
+    usuarios = User.objects.annotate(
+        total=Coalesce(Sum('calificaciones_por_genero__cantidad_calificaciones'), 0),
+    )
+    return _filas(usuarios.order_by('-total', 'id')[:n], id='id', username='username', total='total')
+
+
+def como_matriz(df, filas, columnas, nombre_filas, nombre_columnas):
+    """Convierte una muestra de ``libros.matrices`` en ``{filas, columnas, valores}`` (``None`` si no hay dato)."""
+    pivot = df.pivot_table(index=filas, columns=columnas, values='puntuacion', aggfunc='mean', observed=True)
+    valores = [
+        [None if valor != valor else round(float(valor), DECIMALES) for valor in fila]
+        for fila in pivot.to_numpy()
+    ]
+    return {nombre_filas: list(pivot.index), nombre_columnas: list(pivot.columns), 'valores': valores}
+
+
+# 8. Promedio por usuario y género
+def usuario_genero(n=30, muestreo='top'):
+    return como_matriz(matrices.usuario_genero(n, muestreo), 'usuario', 'genero', 'usuarios', 'generos')
+
+
+# 9. Puntuaciones por libro y usuario
+def usuario_libro(n=30, muestreo='top'):
+    return como_matriz(matrices.usuario_libro(n, muestreo), 'libro__titulo', 'usuario__username',
+                       'libros', 'usuarios')
+
+
+# 10. Cantidad vs. promedio de los libros con más calificaciones
+def cantidad_vs_promedio(n=10):
+    return _filas(_con_votos().order_by('-cantidad_calificaciones', 'id')[:n],
+                  id='id', titulo='titulo', prom='promedio', total='cantidad_calificaciones')
+
+
+# nombre en la URL: (función, n por defecto o None si no tiene límite, admite ?muestreo=)
+ESTADISTICAS = {
+    'libros-por-genero': (libros_por_genero, None, False),
+    'autores-mas-libros': (autores_mas_libros, 10, False),
+    'libros-mas-calificados': (libros_mas_calificados, 10, False),
+    'promedio-genero': (promedio_genero, None, False),
+    'promedio-libro': (promedio_libro, 10, False),
+    'promedio-usuario': (promedio_usuario, None, False),
+    'usuarios-mas-calificaron': (usuarios_mas_calificaron, 10, False),
+    'usuario-genero': (usuario_genero, 30, True),
+    'usuario-libro': (usuario_libro, 30, True),
+    'cantidad-vs-promedio': (cantidad_vs_promedio, 10, False),
+}
@@ -0,0 +1,150 @@
+"""Filtros y orden por parámetros de consulta para los listados.
+
+Cada vista declara qué parámetros acepta en ``filtros`` y por qué campos se
+puede ordenar en ``ordenamientos``. Los valores se validan antes de llegar a
+la base (un valor inválido responde 400) y todo se resuelve en la misma
+consulta del listado.
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+
+# Mayor entero que entra en una columna bigint: uno más grande es un 500 en la base, no un 400
+MAXIMO_ENTERO = 2 ** 63 - 1
+
+
+def _error(nombre, mensaje):
+    raise serializers.ValidationError({nombre: [mensaje]})
+
+
+def _entero(valor):
+    resultado = int(valor)
+    if abs(resultado) > MAXIMO_ENTERO:
+        raise ValueError(f'{valor} está fuera de rango')
+    return resultado
+
+
+def ids(nombre, valor, request):
+    """Uno o varios IDs separados por comas."""
+    try:
+        resultado = [_entero(parte) for parte in valor.split(',') if parte.strip()]
+    except ValueError:
+        _error(nombre, 'Debe ser un ID o una lista de IDs separados por comas.')
+    if not resultado:
+        _error(nombre, 'Debe ser un ID o una lista de IDs separados por comas.')
+    return resultado
+
+
+def id_unico(nombre, valor, request):
+    """Un solo ID."""
+    try:
+        resultado = _entero(valor)
+    except ValueError:
+        resultado = 0
+    if resultado < 1:
+        _error(nombre, 'Debe ser un ID.')
+    return resultado
+
+
+def fecha(nombre, valor, request):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        _error(nombre, 'Debe ser una fecha con formato AAAA-MM-DD.')
+
+
+def numero(nombre, valor, request):
+    try:
+        resultado = Decimal(valor)
+    except InvalidOperation:
+        _error(nombre, 'Debe ser un número.')
+    if not resultado.is_finite():
+        _error(nombre, 'Debe ser un número.')
+    return resultado
+
+
+def entero(nombre, valor, request):
+    try:
+        return _entero(valor)
+    except ValueError:
+        _error(nombre, 'Debe ser un número entero.')
+
+
+def usuario(nombre, valor, request):
+    """``me`` es el usuario autenticado; si no, un ID."""
+    if valor == 'me':
+        return request.user.pk
+    return entero(nombre, valor, request)
+
+
+def opciones(*validas):
+    """Uno de los valores de ``validas``."""
+    def convertir(nombre, valor, request):
+        if valor not in validas:
+            _error(nombre, f"Debe ser uno de: {', '.join(validas)}.")
+        return valor
+    return convertir
+
+
+class Filtro:
+    """Un parámetro de consulta: el lookup del ORM y cómo validar su valor.
+
+    ``preparar`` recibe el queryset antes de filtrar, por si el lookup usa
+    una anotación.
+    """
+
+    def __init__(self, lookup, convertir, preparar=None):
+        self.lookup = lookup
+        self.convertir = convertir
+        self.preparar = preparar
+
+    def filtrar(self, queryset, nombre, valor, request):
+        if self.preparar is not None:
+            queryset = self.preparar(queryset)
+        return queryset.filter(**{self.lookup: self.convertir(nombre, valor, request)})
+
+
+class FiltroConsulta(BaseFilterBackend):
+    """Aplica ``view.filtros`` y el ``?ordering=`` permitido por ``view.ordenamientos``.
+
+    ``ordenamientos`` va del nombre público al campo (o anotación) del
+    queryset; ``anotaciones_orden`` dice cómo agregar las anotaciones. La
+    paginación por cursor toma el orden de ``get_ordering``.
+    """
+    parametro_orden = 'ordering'
+
+    def filter_queryset(self, request, queryset, view):
+        for nombre, filtro in getattr(view, 'filtros', {}).items():
+            valor = request.query_params.get(nombre)
+            if valor not in (None, ''):
+                queryset = filtro.filtrar(queryset, nombre, valor, request)
+
+        orden = self.get_ordering(request, queryset, view)
+        if orden:
+            anotaciones = getattr(view, 'anotaciones_orden', {})
+            for campo in {campo.lstrip('-') for campo in orden}:
+                if campo in anotaciones:
+                    queryset = anotaciones[campo](queryset)
+            queryset = queryset.order_by(*orden)
+        return queryset
+
+    def get_ordering(self, request, queryset, view):
+        valor = request.query_params.get(self.parametro_orden)
+        if not valor:
+            return None
+        permitidos = getattr(view, 'ordenamientos', {})
+        orden = []
+        for parte in valor.split(','):
+            parte = parte.strip()
+            nombre = parte.lstrip('-')
+            if nombre not in permitidos:
+                _error(self.parametro_orden, f"No se puede ordenar por '{nombre}'. "
+                                             f"Opciones: {', '.join(sorted(permitidos))}.")
+            orden.append(('-' if parte.startswith('-') else '') + permitidos[nombre])
+        # Desempate estable para que el cursor no repita ni saltee filas
+        if not any(campo.lstrip('-') == 'id' for campo in orden):
+            orden.append('id')
+        return tuple(orden)
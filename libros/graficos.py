@@ -0,0 +1,221 @@
+"""Dibujo de los gráficos de ``reporte_libros``.
+
+Este módulo no importa Django: cada gráfico recibe su DataFrame ya cargado,
+así se puede dibujar en otros procesos sin abrir conexiones a la base.
+"""
+import hashlib
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+
+def save_plot(fig, path):
+    fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
+
+
+def huella(df):
+    """Huella del contenido de un DataFrame, para saber si su gráfico cambió."""
+    digest = hashlib.sha256(repr(list(df.columns)).encode())
+    # El orden de las categorías es el orden de filas y columnas de los mapas de calor
+    for columna in df.select_dtypes('category'):
+        digest.update(repr(list(df[columna].cat.categories)).encode())
+    if not df.empty:
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+# 1. Total de libros por género
+def libros_por_genero(df1, path):
+    fig, ax = plt.subplots(figsize=(10, 6))  # Tamaño más amplio
+    barplot = sns.barplot(data=df1, x='nombre', y='total', ax=ax)
+
+    ax.set_title("Cantidad de libros por género", fontsize=14)
+    ax.set_xlabel("Género", fontsize=12)
+    ax.set_ylabel("Total de libros", fontsize=12)
+
+    # Rotar etiquetas del eje X para evitar superposición
+    plt.xticks(rotation=35, ha='right', fontsize=10)
+
+    # Etiquetas encima de cada barra
+    for p in barplot.patches:
+        height = p.get_height()
+        ax.annotate(f'{int(height)}',
+                    (p.get_x() + p.get_width() / 2., height + 0.1),
+                    ha='center', va='bottom', fontsize=9)
+
+    fig.tight_layout()
+    save_plot(fig, path)
+
+
+# 2. Top 10 autores con más libros
+def autores_mas_libros(df2, path):
+    fig = sns.barplot(data=df2, y='nombre', x='total').get_figure()
+    fig.suptitle("Top 10 autores con más libros")
+    save_plot(fig, path)
+
+
+# 3. Libros con más calificaciones
+def libros_mas_calificados(df3, path):
+    fig = sns.barplot(data=df3, y='titulo', x='total').get_figure()
+    fig.suptitle("Top 10 libros más calificados")
+    save_plot(fig, path)
+
+
+# 4. Promedio de calificación por género
+def promedio_genero(df4, path):
+    fig, ax = plt.subplots(figsize=(10, 6))  # Tamaño amplio
+    barplot = sns.barplot(data=df4, x='nombre', y='prom', ax=ax, color='cornflowerblue')
+
+    ax.set_title("Promedio de calificaciones por género", fontsize=14)
+    ax.set_xlabel("Género", fontsize=12)
+    ax.set_ylabel("Promedio", fontsize=12)
+
+    plt.xticks(rotation=35, ha='right', fontsize=10)
+
+    # Etiquetas encima de las barras
+    for p in barplot.patches:
+        height = p.get_height()
+        ax.annotate(f'{height:.2f}',
+                    (p.get_x() + p.get_width() / 2., height + 0.05),
+                    ha='center', va='bottom', fontsize=9)
+
+    fig.tight_layout()
+    save_plot(fig, path)
+
+
+# 5. Promedio de calificación por libro
+def promedio_libro(df5, path):
+    fig = sns.barplot(data=df5, y='titulo', x='prom').get_figure()
+    fig.suptitle("Top 10 libros con mejor promedio")
+    save_plot(fig, path)
+
+
+# 6. Promedio de calificación por usuario
+def promedio_usuario(df6, path):
+    fig, ax = plt.subplots(figsize=(14, 6))  # Ancho extendido
+    barplot = sns.barplot(data=df6, x='username', y='prom', ax=ax, color='steelblue')
+
+    ax.set_title("Promedio de calificaciones por usuario", fontsize=14)
+    ax.set_xlabel("Usuario", fontsize=12)
+    ax.set_ylabel("Promedio", fontsize=12)
+
+    plt.xticks(rotation=35, ha='right', fontsize=9)
+
+    # Mostrar valores encima de las barras
+    for p in barplot.patches:
+        height = p.get_height()
+        ax.annotate(f'{height:.2f}',
+                    (p.get_x() + p.get_width() / 2., height + 0.05),
+                    ha='center', va='bottom', fontsize=9)
+
+    fig.tight_layout()
+    save_plot(fig, path)
+
+
+# 7. Usuarios con más calificaciones (formato horizontal para nombres largos)
+def usuarios_mas_calificaron(df7, path):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    barplot = sns.barplot(
+                            data=df7,
+                            y='username',
+                            x='total',
+                            hue='username',         # ← Añadido
+                            dodge=False,            # ← Para que no separe las barras
+                            palette='Blues_d',
+                            legend=False,           # ← Elimina leyenda redundante
+                            ax=ax
+                        )
+
+    ax.set_title("Top 10 usuarios con más calificaciones", fontsize=14)
+    ax.set_xlabel("Cantidad de calificaciones", fontsize=12)
+    ax.set_ylabel("Usuario", fontsize=12)
+
+    # Etiquetas al final de las barras
+    for p in barplot.patches:
+        width = p.get_width()
+        ax.annotate(f'{int(width)}',
+                    (width + 0.5, p.get_y() + p.get_height() / 2),
+                    va='center', fontsize=9)
+
+    fig.tight_layout()
+    save_plot(fig, path)
+
+
+# 8. Mapa de calor: promedio de calificación por usuario y género
+def mapa_calor_usuario_genero(df8, path):
+    # df8 trae una fila por celda de la muestra; las categorías dan el orden de filas y columnas
+    pivot = df8.pivot_table(index='usuario', columns='genero', values='puntuacion', aggfunc='mean', observed=True)
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+    sns.heatmap(pivot, annot=True, cmap="YlGnBu", ax=ax)
+    ax.set_title('Promedio de Calificación por Usuario y Género')
+    save_plot(fig, path)
+
+
+# 9. Mapa de calor (libro vs usuario)
+def heatmap_puntuaciones(df9, path):
+    pivot = df9.pivot_table(index='libro__titulo', columns='usuario__username', values='puntuacion',
+                            aggfunc='mean', observed=True)
+
+    fig, ax = plt.subplots(figsize=(20, 15))
+    sns.heatmap(
+        pivot,
+        annot=True,
+        fmt=".1f",
+        cmap="YlGnBu",
+        ax=ax,
+        annot_kws={"size": 8}
+    )
+
+    ax.set_title("Mapa de calor de puntuaciones por usuario y libro", fontsize=14, pad=20)
+    ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha='right', fontsize=8)
+    ax.set_yticklabels(ax.get_yticklabels(), rotation=0, fontsize=9)
+
+    fig.tight_layout()
+    save_plot(fig, path)
+
+
+# 10. Comparación libros vs promedio y cantidad (Top 10 libros con más calificaciones)
+def cantidad_vs_promedio(df10, path):
+    fig, ax = plt.subplots(figsize=(12, 7))
+    sns.scatterplot(data=df10, x='total', y='prom', ax=ax, color='royalblue')
+
+    # Agregar etiquetas de texto a cada punto
+    for _, row in df10.iterrows():
+        ax.text(row['total'] + 0.1, row['prom'], row['titulo'], fontsize=9)
+
+    ax.set_title("Top 10 libros: cantidad vs. promedio de calificación", fontsize=14)
+    ax.set_xlabel("Cantidad de calificaciones")
+    ax.set_ylabel("Promedio de calificación")
+    fig.tight_layout()
+
+    save_plot(fig, path)
+
+
+GRAFICOS = {
+    1: ('1_libros_por_genero.png', libros_por_genero),
+    2: ('2_autores_mas_libros.png', autores_mas_libros),
+    3: ('3_libros_mas_calificados.png', libros_mas_calificados),
+    4: ('4_promedio_genero.png', promedio_genero),
+    5: ('5_promedio_libro.png', promedio_libro),
+    6: ('6_promedio_usuario.png', promedio_usuario),
+    7: ('7_usuarios_mas_calificaron.png', usuarios_mas_calificaron),
+    8: ('8_mapa_calor_usuario_genero.png', mapa_calor_usuario_genero),
+    9: ('9_heatmap_puntuaciones.png', heatmap_puntuaciones),
+    10: ('10_cantidad_vs_promedio.png', cantidad_vs_promedio),
+}
+
+
+def renderizar(numero, df, output_dir):
+    """Dibuja el gráfico ``numero`` y devuelve la ruta del PNG generado."""
+    sns.set(style="whitegrid")
+    archivo, dibujar = GRAFICOS[numero]
+    path = os.path.join(output_dir, archivo)
+    dibujar(df, path)
+    return path
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from libros.recomendador import calcular_indice, guardar_indice
+
+
+class Command(BaseCommand):
+    help = 'Precalcula los libros más parecidos a cada libro (filtrado colaborativo ítem-ítem)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=50, help='Vecinos que se guardan por libro')
+        parser.add_argument('--salida', help='Ruta del .npz (por defecto settings.RECOMENDADOR_INDICE)')
+
+    def handle(self, *args, **options):
+        if options['k'] < 1:
+            raise CommandError('--k debe ser mayor que cero.')
+        inicio = time.perf_counter()
+        libro_ids, vecinos, similitudes = calcular_indice(k=options['k'])
+        guardar_indice(libro_ids, vecinos, similitudes, options['salida'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Índice de similitud calculado para {len(libro_ids)} libros "
+            f"en {time.perf_counter() - inicio:.2f} s."
+        ))
@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from libros.models import Libro, Calificacion
+from libros.serializers import (
+    LibroSerializer, CalificacionSerializer,
+    CAMPOS_LIBRO_PLANO, CAMPOS_CALIFICACION_PLANO,
+    libro_desde_fila, calificacion_desde_fila,
+)
+
+# Filas distintas que se leen de la base; se repiten hasta llegar a --filas
+MUESTRA = 5000
+
+
+class Command(BaseCommand):
+    help = 'Compara el tiempo de LibroSerializer/CalificacionSerializer con la lectura plana de los listados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, nargs='+', default=[10000, 100000],
+                            help='Cantidades de filas a serializar')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Se toma el mejor tiempo')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1 or min(options['filas']) < 1:
+            raise CommandError('--filas y --repeticiones deben ser mayores que cero.')
+
+        casos = [
+            ('libros', LibroSerializer, libro_desde_fila,
+             Libro.objects.select_related('autor', 'genero').order_by('id'), CAMPOS_LIBRO_PLANO),
+            ('calificaciones', CalificacionSerializer, calificacion_desde_fila,
+             Calificacion.objects.select_related('usuario').order_by('id'), CAMPOS_CALIFICACION_PLANO),
+        ]
+        resultados = []
+        for nombre, serializer_class, armar, queryset, columnas in casos:
+            objetos = list(queryset[:MUESTRA])
+            filas = list(queryset.values_list(*columnas)[:MUESTRA])
+            if not objetos:
+                self.stdout.write(self.style.WARNING(f"⚠️  No hay {nombre}: se omiten."))
+                continue
+            if serializer_class(objetos[:100], many=True).data != [armar(fila) for fila in filas[:100]]:
+                raise CommandError(f'La lectura plana de {nombre} no coincide con {serializer_class.__name__}.')
+
+            for cantidad in options['filas']:
+                muestra_objetos = [objetos[i % len(objetos)] for i in range(cantidad)]
+                muestra_filas = [filas[i % len(filas)] for i in range(cantidad)]
+                serializer = self.medir(lambda: serializer_class(muestra_objetos, many=True).data,
+                                        options['repeticiones'])
+                plano = self.medir(lambda: [armar(fila) for fila in muestra_filas], options['repeticiones'])
+                resultados.append([nombre, cantidad, round(serializer * 1000, 1), round(plano * 1000, 1),
+                                   f'{serializer / plano:.1f}x'])
+
+        columnas = ['listado', 'filas', 'serializer_ms', 'plano_ms', 'mejora']
+        self.stdout.write(self.style.SUCCESS("\n⏱️  Serialización de listados:\n"))
+        try:
+            from tabulate import tabulate
+            self.stdout.write(tabulate(resultados, headers=columnas, tablefmt='fancy_grid'))
+        except ImportError:
+            for fila in resultados:
+                self.stdout.write('  '.join(f'{c}={v}' for c, v in zip(columnas, fila)))
+
+    @staticmethod
+    def medir(funcion, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        return min(tiempos)
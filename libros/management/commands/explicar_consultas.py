@@ -0,0 +1,101 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from libros.models import Genero, Autor, Libro, Calificacion
+
+# Índices de trigramas que crea la migración 0004 solo en PostgreSQL
+INDICES_TRIGRAMA = ['libro_titulo_trgm_idx', 'autor_nombre_trgm_idx']
+
+
+class Command(BaseCommand):
+    help = 'Muestra el plan (EXPLAIN) y el tiempo de las consultas principales de la API y los reportes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comparar', action='store_true',
+                            help='Mostrar también el plan sin los índices de consulta (se borran '
+                                 'dentro de una transacción que se deshace; usar en una base de prueba)')
+        parser.add_argument('--repeticiones', type=int, default=20, help='Ejecuciones para medir el tiempo')
+        parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE (solo PostgreSQL)')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser mayor que cero.')
+        if options['analyze'] and connection.vendor != 'postgresql':
+            raise CommandError('--analyze solo está disponible con PostgreSQL.')
+        if not Calificacion.objects.exists():
+            self.stdout.write(self.style.WARNING(
+                "⚠️  No hay calificaciones: carga datos antes, por ejemplo con generar_calificaciones --semilla=1"
+            ))
+            return
+
+        antes = {}
+        if options['comparar']:
+            with transaction.atomic():
+                self.borrar_indices()
+                antes = self.medir(options['repeticiones'], options['analyze'])
+                transaction.set_rollback(True)
+        despues = self.medir(options['repeticiones'], options['analyze'])
+
+        for nombre, (plan, ms) in despues.items():
+            self.stdout.write(self.style.SUCCESS(f"\n🔎 {nombre}"))
+            if nombre in antes:
+                plan_antes, ms_antes = antes[nombre]
+                self.stdout.write(f"  Sin índices ({ms_antes:.3f} ms):")
+                self.stdout.write(self.sangrar(plan_antes))
+                self.stdout.write(f"  Con índices ({ms:.3f} ms):")
+            else:
+                self.stdout.write(f"  {ms:.3f} ms:")
+            self.stdout.write(self.sangrar(plan))
+
+    def borrar_indices(self):
+        nombres = [
+            indice.name
+            for modelo in (Genero, Autor, Libro, Calificacion)
+            for indice in modelo._meta.indexes
+        ]
+        if connection.vendor == 'postgresql':
+            nombres += INDICES_TRIGRAMA
+        with connection.cursor() as cursor:
+            for nombre in nombres:
+                cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(nombre)}')
+
+    def consultas(self):
+        usuario_id = Calificacion.objects.values_list('usuario_id', flat=True).first()
+        libro = Libro.objects.select_related('autor', 'genero').first()
+        fragmento = libro.titulo[1:5]
+        return {
+            'Calificaciones de un usuario (recomendaciones)':
+                Calificacion.objects.filter(usuario_id=usuario_id).values_list('libro_id', 'puntuacion'),
+            'Libros de un género por votos (ranking)':
+                Libro.objects.filter(genero_id=libro.genero_id, cantidad_calificaciones__gt=0)
+                .order_by('-cantidad_calificaciones')
+                .values_list('id', 'suma_puntuaciones', 'cantidad_calificaciones'),
+            'Libros más votados (populares)':
+                Libro.objects.order_by('-cantidad_calificaciones').values_list('id', flat=True)[:50],
+            'Libro por título':
+                Libro.objects.filter(titulo=libro.titulo).values_list('id', flat=True),
+            'Libros de un año':
+                Libro.objects.filter(fecha_de_lanzamiento__year=libro.fecha_de_lanzamiento.year)
+                .values_list('id', flat=True),
+            f'Títulos que contienen "{fragmento}"':
+                Libro.objects.filter(titulo__icontains=fragmento).values_list('id', flat=True)[:50],
+            'Autor por nombre':
+                Autor.objects.filter(nombre=libro.autor.nombre).values_list('id', flat=True),
+            'Género por nombre':
+                Genero.objects.filter(nombre=libro.genero.nombre).values_list('id', flat=True),
+        }
+
+    def medir(self, repeticiones, analyze):
+        resultados = {}
+        for nombre, queryset in self.consultas().items():
+            plan = queryset.explain(analyze=True) if analyze else queryset.explain()
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                list(queryset.all())
+            resultados[nombre] = (plan, (time.perf_counter() - inicio) * 1000 / repeticiones)
+        return resultados
+
+    @staticmethod
+    def sangrar(texto):
+        return '\n'.join(f'    {linea}' for linea in texto.splitlines())
@@ -0,0 +1,167 @@
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from libros.agregados import recalcular_agregados
+from libros.cache import invalidar
+from libros.models import Libro, Calificacion
+from libros.ranking import refrescar_ranking
+
+
+class Command(BaseCommand):
+    help = 'Genera (o carga desde un CSV) calificaciones en lotes usando la base de datos configurada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min', type=int, default=0, help='Mínimo de calificaciones por libro')
+        parser.add_argument('--max', type=int, default=8, help='Máximo de calificaciones por libro')
+        parser.add_argument('--lote', type=int, default=10000, help='Filas por lote (una transacción por lote)')
+        parser.add_argument('--semilla', type=int, help='Semilla para obtener siempre los mismos datos')
+        parser.add_argument('--dias', type=int, default=0,
+                            help='Repartir las fechas al azar en los últimos N días (por defecto, todas ahora)')
+        parser.add_argument('--archivo', help='CSV con columnas libro_id,usuario_id,puntuacion[,fecha] a cargar')
+        parser.add_argument('--copy', action='store_true', help='Usar COPY de PostgreSQL en lugar de bulk_create')
+        parser.add_argument('--borrar', action='store_true', help='Borrar todas las calificaciones antes de cargar')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que cero.')
+        if options['dias'] < 0:
+            raise CommandError('--dias no puede ser negativo.')
+        if options['min'] < 0 or options['max'] < 0:
+            raise CommandError('--min y --max no pueden ser negativos.')
+        if options['min'] > options['max']:
+            raise CommandError('--min no puede ser mayor que --max.')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy solo está disponible con PostgreSQL.')
+
+        if options['borrar']:
+            Calificacion.objects.all().delete()
+
+        if options['archivo']:
+            filas = self.leer_archivo(options['archivo'], options['lote'])
+        else:
+            filas = self.generar(options['min'], options['max'], options['semilla'], options['dias'])
+
+        insertar = self.insertar_copy if options['copy'] else self.insertar_bulk
+        antes = Calificacion.objects.count()
+        procesadas = 0
+        inicio = time.perf_counter()
+
+        try:
+            while True:
+                lote = list(islice(filas, options['lote']))
+                if not lote:
+                    break
+                with transaction.atomic():
+                    insertar(lote)
+                procesadas += len(lote)
+                if options['verbosity'] > 1:
+                    transcurrido = time.perf_counter() - inicio
+                    self.stdout.write(f"  {procesadas} filas ({procesadas / transcurrido:,.0f} filas/s)")
+        finally:
+            # Las cargas masivas no pasan por la API: se reconstruyen los agregados al final, también
+            # si la carga se cortó y quedaron confirmados los lotes anteriores
+            transcurrido = time.perf_counter() - inicio
+            recalcular_agregados()
+            refrescar_ranking()
+            invalidar(Calificacion)
+        insertadas = Calificacion.objects.count() - antes
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {insertadas} calificaciones insertadas ({procesadas - insertadas} repetidas omitidas) "
+            f"en {transcurrido:.2f} s, {procesadas / max(transcurrido, 1e-9):,.0f} filas/s."
+        ))
+
+    def generar(self, minimo, maximo, semilla, dias=0):
+        azar = random.Random(semilla)
+        ahora = timezone.now()
+        usuarios = list(User.objects.order_by('id').values_list('id', flat=True))
+        if len(usuarios) < 1:
+            raise CommandError('Debe haber al menos 1 usuario en la base de datos.')
+
+        for libro_id in list(Libro.objects.order_by('id').values_list('id', flat=True)):
+            cantidad = min(azar.randint(minimo, maximo), len(usuarios))
+            for usuario_id in azar.sample(usuarios, cantidad):
+                fecha = ahora - timedelta(seconds=azar.randrange(dias * 86400)) if dias else ahora
+                yield libro_id, usuario_id, Decimal(f'{azar.uniform(1.0, 5.0):.1f}'), fecha
+
+    def leer_archivo(self, ruta, lote):
+        """Lee el CSV de a ``lote`` filas; lanza ``CommandError`` con la línea de la primera fila inválida."""
+        ahora = timezone.now()
+        with open(ruta, newline='', encoding='utf-8') as archivo:
+            lector = csv.DictReader(archivo)
+            while True:
+                filas = [(lector.line_num, self.leer_fila(lector.line_num, fila, ahora))
+                         for fila in islice(lector, lote)]
+                if not filas:
+                    return
+                # Un libro o usuario inexistente fallaría recién al confirmar el lote (FK diferida)
+                for campo, modelo, posicion in (('libro_id', Libro, 0), ('usuario_id', User, 1)):
+                    existentes = set(modelo.objects.filter(pk__in={datos[posicion] for _, datos in filas})
+                                     .values_list('pk', flat=True))
+                    for linea, datos in filas:
+                        if datos[posicion] not in existentes:
+                            raise CommandError(f'Línea {linea}: no existe {campo}={datos[posicion]}.')
+                for _, datos in filas:
+                    yield datos
+
+    def leer_fila(self, linea, fila, ahora):
+        try:
+            libro_id, usuario_id = int(fila['libro_id']), int(fila['usuario_id'])
+            if not all(0 < pk < 2 ** 63 for pk in (libro_id, usuario_id)):
+                raise ValueError('ID fuera de rango')
+            puntuacion = Decimal(fila['puntuacion'])
+            fecha = ahora
+            if fila.get('fecha'):
+                fecha = datetime.fromisoformat(fila['fecha'])
+                if timezone.is_naive(fecha):
+                    fecha = timezone.make_aware(fecha)
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            raise CommandError(f'Línea {linea}: fila inválida {dict(fila)}.')
+        valida = puntuacion.is_finite() and 1 <= puntuacion <= 5 and puntuacion == puntuacion.quantize(Decimal('0.1'))
+        if not valida:
+            raise CommandError(f'Línea {linea}: la puntuación debe ir de 1.0 a 5.0 con un decimal.')
+        return libro_id, usuario_id, puntuacion, fecha
+
+    def insertar_bulk(self, lote):
+        Calificacion.objects.bulk_create(
+            [Calificacion(libro_id=libro_id, usuario_id=usuario_id, puntuacion=puntuacion, fecha=fecha)
+             for libro_id, usuario_id, puntuacion, fecha in lote],
+            ignore_conflicts=True,
+        )
+
+    def insertar_copy(self, lote):
+        tabla = Calificacion._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE calificaciones_carga '
+                '(libro_id bigint, usuario_id integer, puntuacion numeric(2, 1), fecha timestamptz) ON COMMIT DROP'
+            )
+            sentencia = 'COPY calificaciones_carga (libro_id, usuario_id, puntuacion, fecha) FROM STDIN'
+            crudo = cursor.cursor
+            if hasattr(crudo, 'copy'):
+                # psycopg 3
+                with crudo.copy(sentencia) as copia:
+                    for fila in lote:
+                        copia.write_row(fila)
+            else:
+                # psycopg2
+                buffer = io.StringIO(''.join(
+                    f'{libro}\t{usuario}\t{puntuacion}\t{fecha.isoformat()}\n' for libro, usuario, puntuacion, fecha in lote
+                ))
+                crudo.copy_expert(sentencia, buffer)
+            cursor.execute(
+                f'INSERT INTO {tabla} (libro_id, usuario_id, puntuacion, fecha) '
+                'SELECT libro_id, usuario_id, puntuacion, fecha FROM calificaciones_carga '
+                'ON CONFLICT (libro_id, usuario_id) DO NOTHING'
+            )
+            # Dentro de una transacción externa cada lote es solo un savepoint y ON COMMIT DROP no llega a correr
+            cursor.execute('DROP TABLE calificaciones_carga')
@@ -0,0 +1,88 @@
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from libros.cache import invalidar
+from libros.models import Genero, Autor, Libro, Calificacion
+
+PALABRAS = [
+    'sombra', 'río', 'noche', 'jardín', 'ciudad', 'silencio', 'memoria', 'viento', 'casa', 'mar',
+    'tiempo', 'fuego', 'camino', 'espejo', 'guerra', 'amor', 'olvido', 'luna', 'tierra', 'invierno',
+    'secreto', 'sueño', 'isla', 'bosque', 'piedra', 'voz', 'puerta', 'lluvia', 'desierto', 'cielo',
+]
+NOMBRES = ['Ana', 'Luis', 'María', 'Jorge', 'Lucía', 'Pedro', 'Sofía', 'Carlos', 'Elena', 'Miguel']
+APELLIDOS = ['Benítez', 'Giménez', 'Rojas', 'Acosta', 'Duarte', 'Núñez', 'Ortiz', 'Romero', 'Vera', 'Cabral']
+NACIONALIDADES = ['Paraguaya', 'Argentina', 'Uruguaya', 'Chilena', 'Peruana', 'Mexicana', 'Española', 'Colombiana']
+TAMANIO_LOTE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Carga un catálogo sintético (géneros, autores, libros, usuarios y calificaciones) para pruebas de rendimiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generos', type=int, default=20)
+        parser.add_argument('--autores', type=int, default=500)
+        parser.add_argument('--libros', type=int, default=10000)
+        parser.add_argument('--usuarios', type=int, default=500)
+        parser.add_argument('--min', type=int, default=0, help='Mínimo de calificaciones por libro')
+        parser.add_argument('--max', type=int, default=20, help='Máximo de calificaciones por libro')
+        parser.add_argument('--semilla', type=int, default=1, help='Con la misma semilla se generan los mismos datos')
+        parser.add_argument('--dias', type=int, default=0,
+                            help='Repartir las fechas de las calificaciones en los últimos N días')
+        parser.add_argument('--borrar', action='store_true',
+                            help='Borrar antes el catálogo y las calificaciones existentes (no los usuarios)')
+
+    def handle(self, *args, **options):
+        if min(options['generos'], options['autores'], options['libros'], options['usuarios']) < 1:
+            raise CommandError('--generos, --autores, --libros y --usuarios deben ser mayores que cero.')
+        if options['borrar']:
+            with transaction.atomic():
+                Calificacion.objects.all().delete()
+                Libro.objects.all().delete()
+                Autor.objects.all().delete()
+                Genero.objects.all().delete()
+        elif Libro.objects.exists():
+            raise CommandError('Ya hay libros cargados: usa --borrar o una base vacía para obtener datos reproducibles.')
+
+        azar = random.Random(options['semilla'])
+        with transaction.atomic():
+            generos = Genero.objects.bulk_create(
+                [Genero(nombre=f'Género {i + 1}') for i in range(options['generos'])]
+            )
+            autores = Autor.objects.bulk_create(
+                [Autor(nombre=f'{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)} {i + 1}',
+                       nacionalidad=azar.choice(NACIONALIDADES))
+                 for i in range(options['autores'])],
+                batch_size=TAMANIO_LOTE,
+            )
+            inicio = date(1900, 1, 1)
+            Libro.objects.bulk_create(
+                [Libro(titulo=self.titulo(azar, i), autor=azar.choice(autores), genero=azar.choice(generos),
+                       fecha_de_lanzamiento=inicio + timedelta(days=azar.randrange(125 * 365)),
+                       url_del_libro=f'https://example.com/libros/{i + 1}')
+                 for i in range(options['libros'])],
+                batch_size=TAMANIO_LOTE,
+            )
+            # Un único hash para todos: hashear miles de contraseñas tardaría minutos
+            clave = make_password('lector')
+            User.objects.bulk_create(
+                [User(username=f'lector{i + 1}', password=clave) for i in range(options['usuarios'])],
+                batch_size=TAMANIO_LOTE, ignore_conflicts=True,
+            )
+        invalidar(Genero, Autor, Libro)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {options['generos']} géneros, {options['autores']} autores, {options['libros']} libros "
+            f"y {options['usuarios']} usuarios (contraseña 'lector') creados."
+        ))
+        call_command('generar_calificaciones', min=options['min'], max=options['max'], semilla=options['semilla'],
+                     dias=options['dias'], stdout=self.stdout, verbosity=options['verbosity'])
+
+    @staticmethod
+    def titulo(azar, i):
+        primera, segunda = azar.sample(PALABRAS, 2)
+        return f'{primera.capitalize()} de {segunda} {i + 1}'
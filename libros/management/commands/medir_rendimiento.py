@@ -0,0 +1,211 @@
+import json
+import logging
+import platform
+import tempfile
+import time
+from datetime import datetime, timezone
+from io import StringIO
+
+import django
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from libros import busqueda
+from libros.models import Genero, Autor, Libro, Calificacion
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+class ContadorConsultas:
+    """Cuenta las consultas ejecutadas (``connection.queries`` se vacía al empezar cada petición)."""
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ('Mide latencia, peticiones por segundo y consultas de cada endpoint de /api/ y el tiempo de '
+            'reporte_libros y recomendar_libros; guarda los resultados en JSON para comparar entre corridas')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20, help='Peticiones medidas por endpoint')
+        parser.add_argument('--usuario', help='Usuario con el que se firma el token (por defecto, el que más calificó)')
+        parser.add_argument('--con-cache', action='store_true',
+                            help='Dejar activa la caché de respuestas (por defecto se mide sin ella)')
+        parser.add_argument('--sin-comandos', action='store_true', help='No medir reporte_libros ni recomendar_libros')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+        parser.add_argument('--comparar', help='Resultados JSON de una corrida anterior contra los que comparar')
+        parser.add_argument('--tolerancia', type=float, default=20.0,
+                            help='Aumento de p50 (en %%) a partir del cual se informa una regresión')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser mayor que cero.')
+        libro = (Libro.objects.filter(cantidad_calificaciones__gt=0).order_by('-cantidad_calificaciones', 'id').first()
+                 or Libro.objects.order_by('id').first())
+        if libro is None:
+            raise CommandError('No hay libros: carga datos antes, por ejemplo con generar_datos.')
+        usuarios = User.objects.order_by('id')
+        if options['usuario']:
+            usuario = usuarios.filter(username=options['usuario']).first()
+        else:
+            usuario = (usuarios.annotate(n=Count('calificaciones')).filter(n__gt=0)
+                       .order_by('-n', 'id').first() or usuarios.first())
+        if usuario is None:
+            raise CommandError('No hay un usuario con el que firmar el token.')
+
+        anterior = self.leer(options['comparar']) if options['comparar'] else None
+        resultado = {
+            'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'motor': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'cache_respuestas': options['con_cache'],
+            'escala': {
+                'generos': Genero.objects.count(), 'autores': Autor.objects.count(),
+                'libros': Libro.objects.count(), 'usuarios': User.objects.count(),
+                'calificaciones': Calificacion.objects.count(),
+            },
+        }
+        ajustes = {} if options['con_cache'] else {'CACHE_RESPUESTAS_TIMEOUT': 0}
+        # Los 503 esperables (por ejemplo /similares/ sin índice) no se imprimen por cada petición
+        registro = logging.getLogger('django.request')
+        registro.disabled = True
+        try:
+            with override_settings(**ajustes):
+                resultado['endpoints'] = self.medir_endpoints(libro, usuario, options['repeticiones'])
+        finally:
+            registro.disabled = False
+        if not options['sin_comandos']:
+            resultado['comandos'] = self.medir_comandos(libro)
+
+        self.mostrar(resultado)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"\n💾 Resultados guardados en {options['salida']}"))
+        if anterior is not None:
+            regresiones = self.comparar(anterior, resultado, options['tolerancia'])
+            if regresiones:
+                raise CommandError(f'{regresiones} regresiones respecto de {options["comparar"]}.')
+
+    def endpoints(self, libro):
+        palabra = (busqueda.palabras(libro.titulo) or ['libro'])[0]
+        return {
+            'generos': '/api/generos/',
+            'autores': '/api/autores/',
+            'libros': '/api/libros/',
+            'libros_pagina_1000': '/api/libros/?page_size=1000',
+            'libros_por_promedio': '/api/libros/?ordering=-promedio',
+            'libros_filtrados': f'/api/libros/?genero={libro.genero_id}&votos_min=1',
+            'libros_busqueda': f'/api/libros/?q={palabra}',
+            'libro': f'/api/libros/{libro.pk}/',
+            'libros_top': '/api/libros/top/',
+            'libros_top_genero': f'/api/libros/top/?genero={libro.genero_id}',
+            'libros_similares': f'/api/libros/{libro.pk}/similares/',
+            'libros_export': '/api/libros/export/',
+            'calificaciones': '/api/calificaciones/',
+            'mis_calificaciones': '/api/calificaciones/?usuario=me',
+            'recomendaciones': '/api/recomendaciones/',
+            'estadisticas_promedio_usuario': '/api/estadisticas/promedio-usuario/',
+            'estadisticas_usuario_libro': '/api/estadisticas/usuario-libro/',
+        }
+
+    def medir_endpoints(self, libro, usuario, repeticiones):
+        cliente = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(usuario)}')
+        resultados = {}
+        for nombre, ruta in self.endpoints(libro).items():
+            # La primera petición arma índices y caches en memoria: se cuenta aparte
+            consultas = ContadorConsultas()
+            inicio = time.perf_counter()
+            with connection.execute_wrapper(consultas):
+                estado, tamanio = self.pedir(cliente, ruta)
+            primera = time.perf_counter() - inicio
+
+            latencias = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                self.pedir(cliente, ruta)
+                latencias.append(time.perf_counter() - inicio)
+            ms = np.array(latencias) * 1000
+            resultados[nombre] = {
+                'ruta': ruta, 'estado': estado, 'bytes': tamanio, 'consultas': consultas.total,
+                'primera_ms': round(primera * 1000, 2),
+                'media_ms': round(float(ms.mean()), 2),
+                'p50_ms': round(float(np.percentile(ms, 50)), 2),
+                'p95_ms': round(float(np.percentile(ms, 95)), 2),
+                'rps': round(1000 / float(ms.mean()), 1),
+            }
+        return resultados
+
+    @staticmethod
+    def pedir(cliente, ruta):
+        respuesta = cliente.get(ruta)
+        cuerpo = b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+        return respuesta.status_code, len(cuerpo)
+
+    def medir_comandos(self, libro):
+        resultados = {}
+        with tempfile.TemporaryDirectory() as carpeta:
+            comandos = {
+                'reporte_libros': ('reporte_libros', {'output_dir': carpeta}),
+                'recomendar_libros': ('recomendar_libros', {'genero': libro.genero_id}),
+            }
+            for nombre, (comando, argumentos) in comandos.items():
+                consultas = ContadorConsultas()
+                inicio = time.perf_counter()
+                with connection.execute_wrapper(consultas):
+                    call_command(comando, stdout=StringIO(), **argumentos)
+                resultados[nombre] = {
+                    'segundos': round(time.perf_counter() - inicio, 3), 'consultas': consultas.total,
+                }
+        return resultados
+
+    def leer(self, ruta):
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                return json.load(archivo)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'No se pudo leer {ruta}: {error}')
+
+    def mostrar(self, resultado):
+        escala = ', '.join(f'{cantidad} {nombre}' for nombre, cantidad in resultado['escala'].items())
+        self.stdout.write(self.style.SUCCESS(f"\n📊 {resultado['motor']}: {escala}\n"))
+        columnas = ['estado', 'consultas', 'primera_ms', 'p50_ms', 'p95_ms', 'rps', 'bytes']
+        filas = [[nombre, *(datos[c] for c in columnas)] for nombre, datos in resultado['endpoints'].items()]
+        filas += [[nombre, '', datos['consultas'], round(datos['segundos'] * 1000, 1), '', '', '', '']
+                  for nombre, datos in resultado.get('comandos', {}).items()]
+        self.tabla(filas, ['endpoint', *columnas])
+
+    def comparar(self, anterior, actual, tolerancia):
+        """Muestra la diferencia de p50 y consultas por endpoint y devuelve cuántos empeoraron."""
+        filas, regresiones = [], 0
+        for nombre, datos in actual['endpoints'].items():
+            previo = anterior.get('endpoints', {}).get(nombre)
+            if previo is None:
+                continue
+            cambio = (datos['p50_ms'] - previo['p50_ms']) / max(previo['p50_ms'], 1e-9) * 100
+            # Menos de 1 ms de diferencia es ruido de medición
+            peor = (cambio > tolerancia and datos['p50_ms'] - previo['p50_ms'] > 1) or datos['consultas'] > previo['consultas']
+            regresiones += peor
+            filas.append([nombre, previo['p50_ms'], datos['p50_ms'], f'{cambio:+.1f}%',
+                          previo['consultas'], datos['consultas'], '❌' if peor else '✅'])
+        self.stdout.write(self.style.SUCCESS(f"\n🔁 Comparación con la corrida del {anterior.get('fecha', '?')}:\n"))
+        self.tabla(filas, ['endpoint', 'p50_antes', 'p50_ahora', 'cambio', 'consultas_antes', 'consultas_ahora', ''])
+        return regresiones
+
+    def tabla(self, filas, columnas):
+        try:
+            from tabulate import tabulate
+            self.stdout.write(tabulate(filas, headers=columnas, tablefmt='fancy_grid'))
+        except ImportError:
+            for fila in filas:
+                self.stdout.write('  '.join(f'{c}={v}' for c, v in zip(columnas, fila)))
@@ -0,0 +1,217 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+# Sin la caché de respuestas (ver --con-cache) cada petición consulta la base; las calificaciones
+# propias no se cachean nunca
+RUTAS = ['/api/calificaciones/?usuario=me&page_size=10', '/api/libros/?page_size=10']
+
+# Perfiles de conexión que compara --comparar (se aplican por variables de entorno)
+PERFILES = {
+    'sin persistencia': {'DB_POOL': '0', 'DB_CONN_MAX_AGE': '0'},
+    'persistentes': {'DB_POOL': '0', 'DB_CONN_MAX_AGE': '60'},
+    'pool': {'DB_POOL': '1'},
+}
+
+
+def peticion_wsgi(aplicacion, ruta, token):
+    camino, _, consulta = ruta.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': camino, 'QUERY_STRING': consulta,
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_AUTHORIZATION': f'Bearer {token}',
+        'wsgi.input': io.BytesIO(b''), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    estado = []
+    cuerpo = aplicacion(environ, lambda status, headers, exc_info=None: estado.append(int(status.split()[0])))
+    try:
+        for _ in cuerpo:
+            pass
+    finally:
+        # Igual que un servidor WSGI: al cerrar se dispara request_finished
+        if hasattr(cuerpo, 'close'):
+            cuerpo.close()
+    return estado[0]
+
+
+async def peticion_asgi(aplicacion, ruta, token):
+    camino, _, consulta = ruta.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': camino, 'raw_path': camino.encode(), 'query_string': consulta.encode(),
+        'root_path': '', 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+    }
+    leido = False
+
+    async def receive():
+        nonlocal leido
+        if not leido:
+            leido = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # El cliente nunca se desconecta: Django cancela esta espera al responder
+        await asyncio.Event().wait()
+
+    estado = []
+
+    async def send(mensaje):
+        if mensaje['type'] == 'http.response.start':
+            estado.append(mensaje['status'])
+
+    await aplicacion(scope, receive, send)
+    return estado[0]
+
+
+def resumen(latencias, estados, duracion):
+    ms = np.array(latencias) * 1000
+    return {
+        'peticiones': len(ms),
+        'errores': sum(1 for estado in estados if estado >= 400),
+        'rps': round(len(ms) / duracion, 1),
+        'media_ms': round(float(ms.mean()), 2),
+        'p50_ms': round(float(np.percentile(ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(ms, 95)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia (p50/p95/p99) de la API llamando a biblioteca/wsgi.py o asgi.py sin servidor de por medio'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interfaz', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--url', action='append', help=f'Ruta a pedir (se puede repetir). Por defecto: {RUTAS}')
+        parser.add_argument('--peticiones', type=int, default=500, help='Peticiones medidas')
+        parser.add_argument('--calentamiento', type=int, default=20, help='Peticiones previas que no se miden')
+        parser.add_argument('--concurrencia', type=int, default=8, help='Peticiones simultáneas')
+        parser.add_argument('--usuario', help='Usuario con el que se firma el token (por defecto, el primero)')
+        parser.add_argument('--con-cache', action='store_true',
+                            help='Dejar la caché de respuestas (por defecto se desactiva para medir las conexiones)')
+        parser.add_argument('--comparar', action='store_true',
+                            help='Correr cada perfil de conexión (sin persistencia, persistentes, pool) '
+                                 'con WSGI y ASGI en procesos separados y comparar')
+        parser.add_argument('--json', action='store_true', help='Imprimir el resultado como JSON')
+
+    def handle(self, *args, **options):
+        if options['peticiones'] < 1 or options['concurrencia'] < 1:
+            raise CommandError('--peticiones y --concurrencia deben ser mayores que cero.')
+        if options['comparar']:
+            return self.comparar(options)
+
+        usuarios = User.objects.order_by('id')
+        usuario = usuarios.filter(username=options['usuario']).first() if options['usuario'] else usuarios.first()
+        if usuario is None:
+            raise CommandError('No hay un usuario con el que firmar el token.')
+        token = str(AccessToken.for_user(usuario))
+        rutas = options['url'] or RUTAS
+        total = options['calentamiento'] + options['peticiones']
+        pedidos = [rutas[i % len(rutas)] for i in range(total)]
+
+        # Con la caché, después del calentamiento casi ninguna petición abre una conexión
+        ajustes = {} if options['con_cache'] else {'CACHE_RESPUESTAS_TIMEOUT': 0}
+        with override_settings(**ajustes):
+            if options['interfaz'] == 'wsgi':
+                latencias, estados, duracion = self.correr_wsgi(pedidos, token, options)
+            else:
+                latencias, estados, duracion = asyncio.run(self.correr_asgi(pedidos, token, options))
+
+        resultado = resumen(latencias, estados, duracion)
+        resultado['interfaz'] = options['interfaz']
+        resultado['cache_respuestas'] = options['con_cache']
+        base = settings.DATABASES['default']
+        resultado['conexiones'] = 'pool' if 'pool' in base.get('OPTIONS', {}) else f"CONN_MAX_AGE={base.get('CONN_MAX_AGE', 0)}"
+        if options['json']:
+            self.stdout.write(json.dumps(resultado))
+        else:
+            self.mostrar([resultado])
+
+    def correr_wsgi(self, pedidos, token, options):
+        from biblioteca.wsgi import application
+
+        def medir(ruta):
+            inicio = time.perf_counter()
+            estado = peticion_wsgi(application, ruta, token)
+            return time.perf_counter() - inicio, estado
+
+        calentamiento, medidos = pedidos[:options['calentamiento']], pedidos[options['calentamiento']:]
+        if options['concurrencia'] == 1:
+            for ruta in calentamiento:
+                medir(ruta)
+            inicio = time.perf_counter()
+            resultados = [medir(ruta) for ruta in medidos]
+        else:
+            with ThreadPoolExecutor(options['concurrencia']) as hilos:
+                list(hilos.map(medir, calentamiento))
+                inicio = time.perf_counter()
+                resultados = list(hilos.map(medir, medidos))
+        duracion = time.perf_counter() - inicio
+        return [r[0] for r in resultados], [r[1] for r in resultados], duracion
+
+    async def correr_asgi(self, pedidos, token, options):
+        from biblioteca.asgi import application
+        limite = asyncio.Semaphore(options['concurrencia'])
+
+        async def medir(ruta):
+            async with limite:
+                inicio = time.perf_counter()
+                estado = await peticion_asgi(application, ruta, token)
+                return time.perf_counter() - inicio, estado
+
+        await asyncio.gather(*(medir(ruta) for ruta in pedidos[:options['calentamiento']]))
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(medir(ruta) for ruta in pedidos[options['calentamiento']:]))
+        duracion = time.perf_counter() - inicio
+        return [r[0] for r in resultados], [r[1] for r in resultados], duracion
+
+    def comparar(self, options):
+        argumentos = [
+            '--peticiones', str(options['peticiones']), '--calentamiento', str(options['calentamiento']),
+            '--concurrencia', str(options['concurrencia']), '--json',
+        ]
+        for ruta in options['url'] or []:
+            argumentos += ['--url', ruta]
+        if options['usuario']:
+            argumentos += ['--usuario', options['usuario']]
+        if options['con_cache']:
+            argumentos.append('--con-cache')
+
+        filas = []
+        for perfil, variables in PERFILES.items():
+            for interfaz in ('wsgi', 'asgi'):
+                entorno = {**os.environ, **variables, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+                proceso = subprocess.run(
+                    [sys.executable, '-m', 'django', 'prueba_carga', '--interfaz', interfaz, *argumentos],
+                    env=entorno, capture_output=True, text=True,
+                )
+                if proceso.returncode != 0:
+                    error = (proceso.stderr.strip().splitlines() or ['error desconocido'])[-1]
+                    self.stdout.write(self.style.WARNING(f"⚠️  {perfil} / {interfaz}: {error}"))
+                    continue
+                resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+                resultado['conexiones'] = perfil
+                filas.append(resultado)
+        self.mostrar(filas)
+
+    def mostrar(self, filas):
+        columnas = ['conexiones', 'interfaz', 'peticiones', 'errores', 'rps', 'media_ms', 'p50_ms', 'p95_ms', 'p99_ms']
+        self.stdout.write(self.style.SUCCESS("\n⏱️  Latencia por petición:\n"))
+        try:
+            from tabulate import tabulate
+            self.stdout.write(tabulate([[fila[c] for c in columnas] for fila in filas],
+                                       headers=columnas, tablefmt='fancy_grid'))
+        except ImportError:
+            for fila in filas:
+                self.stdout.write('  '.join(f'{c}={fila[c]}' for c in columnas))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from libros.agregados import recalcular_agregados
+from libros.models import Libro, Autor, Genero
+from libros.ranking import refrescar_ranking
+
+
+class Command(BaseCommand):
+    help = ('Reconstruye desde cero los agregados de calificaciones de libros, autores y géneros '
+            'y la matriz usuario x género')
+
+    def handle(self, *args, **options):
+        recalcular_agregados()
+        refrescar_ranking()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Agregados recalculados: {Libro.objects.count()} libros, "
+            f"{Autor.objects.count()} autores y {Genero.objects.count()} géneros."
+        ))
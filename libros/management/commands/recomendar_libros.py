@@ -1,10 +1,10 @@
 from django.core.management.base import BaseCommand
 from libros.models import Libro, Genero
-from django.db.models import Avg, Count
+from libros.ranking import mejores_libros
 import pandas as pd
 
 class Command(BaseCommand):
-    help = 'Recomienda libros por género basados en promedio de puntuaciones'
+    help = 'Recomienda libros por género según su promedio ponderado por cantidad de votos'
 
     def add_arguments(self, parser):
         parser.add_argument('--genero', type=int, help='ID del género para recomendar libros')
@@ -21,20 +21,20 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f"❌ Género con ID {genero_id} no encontrado."))
             return
 
-        libros = (
-            Libro.objects.filter(genero=genero)
-            .annotate(prom=Avg('calificaciones__puntuacion'), votos=Count('calificaciones'))
-            .filter(votos__gt=0)
-            .order_by('-prom')[:10]
-        )
+        # Promedio bayesiano sobre los agregados: un único 5.0 no le gana a cientos de 4.8
+        mejores = mejores_libros(genero.id, 10)
 
-        if not libros:
+        if not mejores:
             self.stdout.write(self.style.WARNING(f"⚠️  No hay libros con calificaciones en el género '{genero.nombre}'."))
             return
 
-        df = pd.DataFrame(libros.values('titulo', 'prom', 'votos'))
-        df.rename(columns={'prom': 'promedio', 'votos': 'cantidad_calificaciones'}, inplace=True)
-        df['promedio'] = pd.to_numeric(df['promedio'], errors='coerce').round(1)
+        titulos = Libro.objects.in_bulk([libro_id for libro_id, *_ in mejores])
+        df = pd.DataFrame(
+            [(titulos[libro_id].titulo, puntaje, promedio, votos) for libro_id, puntaje, promedio, votos in mejores],
+            columns=['titulo', 'puntaje', 'promedio', 'cantidad_calificaciones'],
+        )
+        df['puntaje'] = df['puntaje'].round(2)
+        df['promedio'] = df['promedio'].round(1)
 
 
         self.stdout.write(self.style.SUCCESS(f"\n📚 Recomendaciones para el género '{genero.nombre}':\n"))
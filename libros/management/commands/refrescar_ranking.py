@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from libros.ranking import refrescar_ranking
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el ranking ponderado (promedio bayesiano) general y por género'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanio', type=int, help='Posiciones que se guardan por ranking')
+
+    def handle(self, *args, **options):
+        total = refrescar_ranking(options['tamanio'])
+        self.stdout.write(self.style.SUCCESS(f"✅ Ranking actualizado: {total} posiciones guardadas."))
@@ -1,242 +1,160 @@
-from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from libros.models import Libro, Genero, Autor, Calificacion
-from django.db.models import Count, Avg
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Count, F, Max, Sum
+from libros import estadisticas, matrices
+from libros.graficos import GRAFICOS, huella, renderizar
+from libros.models import Genero, Autor, Libro, Calificacion
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
 import os
-from django.db.models import Avg
+import pandas as pd
+
+ARCHIVO_HUELLAS = '.huellas.json'
+
+
+def tabla(filas, *columnas):
+    return pd.DataFrame(filas, columns=list(columnas))
+
+
+# Cómo se arma el DataFrame de cada gráfico: son las mismas estadísticas que
+# publica /api/estadisticas/ (ver libros.estadisticas), así que ni la memoria
+# ni las consultas crecen con la tabla de calificaciones.
+CARGAS = {
+    1: lambda top, muestreo: tabla(estadisticas.libros_por_genero(), 'nombre', 'total'),
+    2: lambda top, muestreo: tabla(estadisticas.autores_mas_libros(), 'nombre', 'total'),
+    3: lambda top, muestreo: tabla(estadisticas.libros_mas_calificados(), 'titulo', 'total'),
+    4: lambda top, muestreo: tabla(estadisticas.promedio_genero(), 'nombre', 'prom'),
+    5: lambda top, muestreo: tabla(estadisticas.promedio_libro(), 'titulo', 'prom'),
+    6: lambda top, muestreo: tabla(estadisticas.promedio_usuario(), 'username', 'prom'),
+    7: lambda top, muestreo: tabla(estadisticas.usuarios_mas_calificaron(), 'username', 'total'),
+    8: lambda top, muestreo: matrices.usuario_genero(top, muestreo),
+    9: lambda top, muestreo: matrices.usuario_libro(top, muestreo),
+    10: lambda top, muestreo: tabla(estadisticas.cantidad_vs_promedio(), 'titulo', 'prom', 'total'),
+}
+# Los dos primeros solo cuentan libros: no dependen de las calificaciones
+SOLO_CATALOGO = {1, 2}
+
+
+def cargar_datos(numeros=None, top=30, muestreo='top'):
+    """Arma los DataFrames de los gráficos ``numeros`` (todos por defecto), indexados por número."""
+    numeros = sorted(CARGAS) if numeros is None else numeros
+    return {numero: CARGAS[numero](top, muestreo) for numero in numeros}
+
+
+def estado_tablas():
+    """Resumen barato de las tablas de las que salen los gráficos, en cinco consultas agregadas.
+
+    Cambia con cada alta o baja de libros, autores, géneros o usuarios, cada
+    cambio de autor o de género de un libro y cada alta, cambio (por su
+    ``fecha``) o baja de una calificación. No detecta renombres.
+    """
+    libros = Libro.objects.aggregate(
+        n=Count('id'), ultimo=Max('id'),
+        autores=Sum(F('id') * F('autor_id')), generos=Sum(F('id') * F('genero_id')),
+    )
+    catalogo = [libros] + [
+        modelo.objects.aggregate(n=Count('id'), ultimo=Max('id')) for modelo in (Autor, Genero, User)
+    ]
+    calificaciones = Calificacion.objects.aggregate(n=Count('id'), ultimo=Max('id'), fecha=Max('fecha'))
+    return catalogo, calificaciones
+
+
+def claves_rapidas(numeros, top, muestreo):
+    """Clave de cada gráfico: si no cambió desde la última ejecución no hace falta ni cargar sus datos."""
+    catalogo, calificaciones = estado_tablas()
+    claves = {}
+    for numero in numeros:
+        partes = [catalogo]
+        if numero not in SOLO_CATALOGO:
+            partes.append(calificaciones)
+        if numero in (8, 9):
+            partes.append([top, muestreo])
+        texto = json.dumps(partes, sort_keys=True, cls=DjangoJSONEncoder)
+        claves[numero] = hashlib.sha256(texto.encode()).hexdigest()
+    return claves
 
 
 class Command(BaseCommand):
     help = 'Genera 10 reportes diferentes con pandas, seaborn y matplotlib'
 
-    def handle(self, *args, **kwargs):
-        output_dir = "graficos"
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=1, help='Procesos que dibujan gráficos en paralelo')
+        parser.add_argument('--only', type=int, nargs='+', choices=sorted(GRAFICOS), metavar='N',
+                            help='Genera solo los gráficos indicados (por número, de 1 a 10)')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Omite los gráficos cuyos datos no cambiaron desde la última ejecución')
+        parser.add_argument('--output-dir', default='graficos', help='Carpeta donde se guardan los PNG')
+        parser.add_argument('--top', type=int, default=30,
+                            help='Usuarios, libros y géneros (los de más votos) que muestran los mapas de calor')
+        parser.add_argument('--muestreo', choices=matrices.MUESTREOS, default='top',
+                            help='Orden de los mapas de calor: por votos (top) o agrupados por similitud (cluster)')
+
+    def handle(self, *args, **options):
+        if options['jobs'] < 1 or options['top'] < 1:
+            raise CommandError('--jobs y --top deben ser mayores que cero.')
+        output_dir = options['output_dir']
         os.makedirs(output_dir, exist_ok=True)
 
-        def save_plot(fig, filename):
-            path = os.path.join(output_dir, filename)
-            fig.savefig(path, bbox_inches='tight')
-            plt.close(fig)
-
-        sns.set(style="whitegrid")
-
-        # 1. Total de libros por género
-        df1 = pd.DataFrame(Genero.objects.annotate(total=Count('libros')).values('nombre', 'total'))
-        if not df1.empty:
-            fig, ax = plt.subplots(figsize=(10, 6))  # Tamaño más amplio
-            barplot = sns.barplot(data=df1, x='nombre', y='total', ax=ax)
-
-            ax.set_title("Cantidad de libros por género", fontsize=14)
-            ax.set_xlabel("Género", fontsize=12)
-            ax.set_ylabel("Total de libros", fontsize=12)
-
-            # Rotar etiquetas del eje X para evitar superposición
-            plt.xticks(rotation=35, ha='right', fontsize=10)
-
-            # Etiquetas encima de cada barra
-            for p in barplot.patches:
-                height = p.get_height()
-                ax.annotate(f'{int(height)}', 
-                            (p.get_x() + p.get_width() / 2., height + 0.1),
-                            ha='center', va='bottom', fontsize=9)
-
-            fig.tight_layout()
-            save_plot(fig, "1_libros_por_genero.png")
-
-
-        # 2. Top 10 autores con más libros
-        df2 = pd.DataFrame(Autor.objects.annotate(total=Count('libros')).values('nombre', 'total'))
-        df2 = df2.sort_values('total', ascending=False).head(10)
-        if not df2.empty:
-            fig = sns.barplot(data=df2, y='nombre', x='total').get_figure()
-            fig.suptitle("Top 10 autores con más libros")
-            save_plot(fig, "2_autores_mas_libros.png")
-
-        # 3. Libros con más calificaciones
-        df3 = pd.DataFrame(Libro.objects.annotate(total=Count('calificaciones')).values('titulo', 'total'))
-        df3 = df3.sort_values('total', ascending=False).head(10)
-        if not df3.empty:
-            fig = sns.barplot(data=df3, y='titulo', x='total').get_figure()
-            fig.suptitle("Top 10 libros más calificados")
-            save_plot(fig, "3_libros_mas_calificados.png")
-
-        # 4. Promedio de calificación por género
-        df4 = pd.DataFrame(
-            Genero.objects
-            .annotate(prom=Avg('libros__calificaciones__puntuacion'))
-            .values('nombre', 'prom')
-        )
-        df4 = df4.dropna()
-
-        if not df4.empty:
-            fig, ax = plt.subplots(figsize=(10, 6))  # Tamaño amplio
-            barplot = sns.barplot(data=df4, x='nombre', y='prom', ax=ax, color='cornflowerblue')
-
-            ax.set_title("Promedio de calificaciones por género", fontsize=14)
-            ax.set_xlabel("Género", fontsize=12)
-            ax.set_ylabel("Promedio", fontsize=12)
-
-            plt.xticks(rotation=35, ha='right', fontsize=10)
-
-            # Etiquetas encima de las barras
-            for p in barplot.patches:
-                height = p.get_height()
-                ax.annotate(f'{height:.2f}', 
-                            (p.get_x() + p.get_width() / 2., height + 0.05),
-                            ha='center', va='bottom', fontsize=9)
-
-            fig.tight_layout()
-            save_plot(fig, "4_promedio_genero.png")
-
-
-        # 5. Promedio de calificación por libro
-        df5 = pd.DataFrame(Libro.objects.annotate(prom=Avg('calificaciones__puntuacion')).values('titulo', 'prom'))
-        df5 = df5.dropna().sort_values(by='prom', ascending=False).head(10)
-        if not df5.empty:
-            fig = sns.barplot(data=df5, y='titulo', x='prom').get_figure()
-            fig.suptitle("Top 10 libros con mejor promedio")
-            save_plot(fig, "5_promedio_libro.png")
-
-        # 6. Promedio de calificación por usuario
-        df6 = pd.DataFrame(
-            User.objects.annotate(prom=Avg('calificaciones__puntuacion'))
-            .values('username', 'prom')
-        )
-        df6 = df6.dropna()
-
-        if not df6.empty:
-            fig, ax = plt.subplots(figsize=(14, 6))  # Ancho extendido
-            barplot = sns.barplot(data=df6, x='username', y='prom', ax=ax, color='steelblue')
-
-            ax.set_title("Promedio de calificaciones por usuario", fontsize=14)
-            ax.set_xlabel("Usuario", fontsize=12)
-            ax.set_ylabel("Promedio", fontsize=12)
-
-            plt.xticks(rotation=35, ha='right', fontsize=9)
-
-            # Mostrar valores encima de las barras
-            for p in barplot.patches:
-                height = p.get_height()
-                ax.annotate(f'{height:.2f}',
-                            (p.get_x() + p.get_width() / 2., height + 0.05),
-                            ha='center', va='bottom', fontsize=9)
-
-            fig.tight_layout()
-            save_plot(fig, "6_promedio_usuario.png")
-
-        # 7. Usuarios con más calificaciones (formato horizontal para nombres largos)
-        df7 = pd.DataFrame(
-            User.objects.annotate(total=Count('calificaciones'))
-            .values('username', 'total')
-        )
-        df7 = df7.sort_values(by='total', ascending=False).head(10)
-
-        if not df7.empty:
-            fig, ax = plt.subplots(figsize=(10, 6))
-            barplot = sns.barplot(
-                                    data=df7,
-                                    y='username',
-                                    x='total',
-                                    hue='username',         # ← Añadido
-                                    dodge=False,            # ← Para que no separe las barras
-                                    palette='Blues_d',
-                                    legend=False,           # ← Elimina leyenda redundante
-                                    ax=ax
-                                )
-
-
-            ax.set_title("Top 10 usuarios con más calificaciones", fontsize=14)
-            ax.set_xlabel("Cantidad de calificaciones", fontsize=12)
-            ax.set_ylabel("Usuario", fontsize=12)
-
-            # Etiquetas al final de las barras
-            for p in barplot.patches:
-                width = p.get_width()
-                ax.annotate(f'{int(width)}',
-                            (width + 0.5, p.get_y() + p.get_height() / 2),
-                            va='center', fontsize=9)
-
-            fig.tight_layout()
-            save_plot(fig, "7_usuarios_mas_calificaron.png")
-
-        # 8. Mapa de calor: promedio de calificación por usuario y género
-
-        cal_data = Calificacion.objects.select_related('usuario', 'libro__genero')
-        df8 = pd.DataFrame([
-            {
-                'usuario': c.usuario.username,
-                'genero': c.libro.genero.nombre,
-                'puntuacion': float(c.puntuacion)
-            }
-            for c in cal_data
-        ])
-
-        if not df8.empty:
-            pivot = df8.pivot_table(index='usuario', columns='genero', values='puntuacion', aggfunc='mean')
-            pivot = pivot.apply(pd.to_numeric, errors='coerce')  # ← cambio clave aquí
-
-            fig, ax = plt.subplots(figsize=(12, 8))
-            sns.heatmap(pivot, annot=True, cmap="YlGnBu", ax=ax)
-            ax.set_title('Promedio de Calificación por Usuario y Género')
-            save_plot(fig, "8_mapa_calor_usuario_genero.png")
-
-
-        # 9. Mapa de calor (libro vs usuario)
-        df9 = pd.DataFrame(
-            Calificacion.objects.values('libro__titulo', 'usuario__username', 'puntuacion')
-        )
-
-        if not df9.empty:
-            pivot = df9.pivot(index='libro__titulo', columns='usuario__username', values='puntuacion')
-            pivot = pivot.apply(pd.to_numeric, errors='coerce')
-
-            fig, ax = plt.subplots(figsize=(20, 15))
-            sns.heatmap(
-                pivot,
-                annot=True,
-                fmt=".1f",
-                cmap="YlGnBu",
-                ax=ax,
-                annot_kws={"size": 8}
-            )
-
-            ax.set_title("Mapa de calor de puntuaciones por usuario y libro", fontsize=14, pad=20)
-            ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha='right', fontsize=8)
-            ax.set_yticklabels(ax.get_yticklabels(), rotation=0, fontsize=9)
-
-            fig.tight_layout()
-            save_plot(fig, "9_heatmap_puntuaciones.png")
-
-
-       # 10. Comparación libros vs promedio y cantidad (Top 10 libros con más calificaciones)
-        df10 = pd.DataFrame(
-            Libro.objects.annotate(
-                prom=Avg('calificaciones__puntuacion'),
-                total=Count('calificaciones')
-            ).values('titulo', 'prom', 'total')
-        )
-
-        df10 = df10.dropna()
-        df10 = df10.sort_values(by='total', ascending=False).head(10)  # ← solo los 10 con más calificaciones
-
-        if not df10.empty:
-            fig, ax = plt.subplots(figsize=(12, 7))
-            sns.scatterplot(data=df10, x='total', y='prom', ax=ax, color='royalblue')
-
-            # Agregar etiquetas de texto a cada punto
-            for _, row in df10.iterrows():
-                ax.text(row['total'] + 0.1, row['prom'], row['titulo'], fontsize=9)
-
-            ax.set_title("Top 10 libros: cantidad vs. promedio de calificación", fontsize=14)
-            ax.set_xlabel("Cantidad de calificaciones")
-            ax.set_ylabel("Promedio de calificación")
-            fig.tight_layout()
-
-            save_plot(fig, "10_cantidad_vs_promedio.png")
-
-
-
-        self.stdout.write(self.style.SUCCESS("✅ ¡Los 10 gráficos fueron generados correctamente!"))
+        numeros = options['only'] or sorted(GRAFICOS)
+
+        ruta_huellas = os.path.join(output_dir, ARCHIVO_HUELLAS)
+        huellas = {}
+        if os.path.exists(ruta_huellas):
+            with open(ruta_huellas, encoding='utf-8') as archivo:
+                huellas = json.load(archivo)
+        # Cada gráfico guarda la clave rápida de las tablas y la huella de su DataFrame
+        anteriores = {
+            int(numero): valor if isinstance(valor, dict) else {'huella': valor}
+            for numero, valor in huellas.items()
+        }
+        claves = claves_rapidas(numeros, options['top'], options['muestreo'])
+
+        def sin_cambios(numero, campo, actual):
+            existe = os.path.exists(os.path.join(output_dir, GRAFICOS[numero][0]))
+            return options['incremental'] and existe and anteriores.get(numero, {}).get(campo) == actual
+
+        a_cargar = []
+        for numero in numeros:
+            if sin_cambios(numero, 'clave', claves[numero]):
+                self.stdout.write(f"⏭️  Gráfico {numero} sin cambios, se omite.")
+            else:
+                a_cargar.append(numero)
+
+        datos = cargar_datos(a_cargar, options['top'], options['muestreo'])
+        pendientes, vigentes = [], {}
+        for numero in a_cargar:
+            df = datos[numero]
+            if df.empty:
+                continue
+            actual = huella(df)
+            vigentes[numero] = {'clave': claves[numero], 'huella': actual}
+            if sin_cambios(numero, 'huella', actual):
+                self.stdout.write(f"⏭️  Gráfico {numero} sin cambios, se omite.")
+                continue
+            pendientes.append((numero, actual))
+
+        if options['jobs'] > 1 and len(pendientes) > 1:
+            # Los procesos hijos solo dibujan: no deben heredar conexiones abiertas
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['jobs']) as pool:
+                futuros = [pool.submit(renderizar, n, datos[n], output_dir) for n, _ in pendientes]
+                for futuro in futuros:
+                    futuro.result()
+        else:
+            for numero, _ in pendientes:
+                renderizar(numero, datos[numero], output_dir)
+
+        # Las huellas se guardan recién cuando todos los gráficos se dibujaron bien
+        huellas.update({str(numero): valor for numero, valor in vigentes.items()})
+        generados = [numero for numero, _ in pendientes]
+
+        with open(ruta_huellas, 'w', encoding='utf-8') as archivo:
+            json.dump(huellas, archivo, indent=2, sort_keys=True)
+
+        if options['only'] or options['incremental']:
+            self.stdout.write(self.style.SUCCESS(f"✅ {len(generados)} gráficos generados: {generados}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ ¡Los 10 gráficos fueron generados correctamente!"))
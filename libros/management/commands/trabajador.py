@@ -0,0 +1,66 @@
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from libros import tareas
+
+
+class Command(BaseCommand):
+    help = ('Ejecuta las tareas encoladas (reportes, recálculo de agregados, recomendaciones, calificaciones '
+            'sintéticas) con un grupo de procesos o hilos')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=1, help='Procesos que toman tareas en paralelo')
+        parser.add_argument('--hilos', type=int, default=1, help='Hilos que toman tareas dentro de cada proceso')
+        parser.add_argument('--espera', type=float, default=1.0,
+                            help='Segundos entre consultas a la cola cuando no hay tareas')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Terminar cuando la cola quede vacía en lugar de seguir esperando tareas')
+
+    def handle(self, *args, **options):
+        procesos, hilos = options['procesos'], options['hilos']
+        if procesos < 1 or hilos < 1:
+            raise CommandError('--procesos y --hilos deben ser mayores que cero.')
+        if options['espera'] <= 0:
+            raise CommandError('--espera debe ser mayor que cero.')
+        if not options['una_vez']:
+            self.stdout.write(self.style.SUCCESS(
+                f"👷 Trabajador con {procesos} procesos x {hilos} hilos esperando tareas (Ctrl+C para detener)."
+            ))
+
+        inicio = time.perf_counter()
+        if procesos == 1:
+            detener = threading.Event()
+            ejecutadas = self.esperar(detener, lambda: tareas.trabajar_con_hilos(
+                tareas.nombre_trabajador(), hilos, detener, options['una_vez'], options['espera'],
+            ))
+        else:
+            detener = multiprocessing.Event()
+            # Los procesos hijos abren sus propias conexiones: no deben heredar las abiertas
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=procesos, initializer=tareas.iniciar_proceso,
+                                     initargs=(detener,)) as pool:
+                futuros = [pool.submit(tareas.trabajar_en_proceso, hilos, options['una_vez'], options['espera'])
+                           for _ in range(procesos)]
+                ejecutadas = self.esperar(detener, lambda: sum(futuro.result() for futuro in futuros))
+
+        if ejecutadas is not None:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {ejecutadas} tareas ejecutadas en {time.perf_counter() - inicio:.2f} s."
+            ))
+
+    def esperar(self, detener, resultado):
+        """Devuelve ``resultado()``; con Ctrl+C o SIGTERM no se toman más tareas y se terminan las en curso."""
+        anterior = signal.signal(signal.SIGTERM, lambda *_: detener.set())
+        try:
+            return resultado()
+        except KeyboardInterrupt:
+            detener.set()
+            self.stdout.write(self.style.WARNING("⏹️  Trabajador detenido."))
+            return None
+        finally:
+            signal.signal(signal.SIGTERM, anterior)
@@ -0,0 +1,114 @@
+"""Muestras acotadas de las matrices usuario x género y usuario x libro.
+
+La matriz usuario x género está materializada en ``UsuarioGenero`` (una fila
+por celda con calificaciones, al día gracias a ``libros.agregados``) y la
+usuario x libro es la propia tabla de calificaciones, que ya es dispersa. Los
+mapas de calor no pivotean la tabla completa: toman los ``n`` usuarios, libros
+y géneros con más votos y leen solo esas celdas, así el costo depende de ``n``
+y no del volumen de datos.
+
+Filas y columnas se devuelven como categorías en el orden en que se dibujan:
+por cantidad de votos (``'top'``) o agrupadas por similitud con clustering
+jerárquico (``'cluster'``), para que los gustos parecidos queden juntos.
+"""
+from collections import Counter
+
+import pandas as pd
+from django.db.models import FloatField, Sum
+from django.db.models.functions import Cast
+
+from .models import Genero, Libro, Calificacion, UsuarioGenero
+
+MUESTREOS = ('top', 'cluster')
+
+
+def _etiquetas(pares):
+    """``{id: nombre}`` en el mismo orden; a los nombres repetidos se les agrega el id."""
+    repetidos = Counter(nombre for _, nombre in pares)
+    return {pk: nombre if repetidos[nombre] == 1 else f'{nombre} (#{pk})' for pk, nombre in pares}
+
+
+def usuarios_mas_activos(n):
+    """``{usuario_id: username}`` de los ``n`` usuarios con más calificaciones."""
+    filas = (
+        UsuarioGenero.objects.values('usuario_id', 'usuario__username')
+        .annotate(total=Sum('cantidad_calificaciones'))
+        .order_by('-total', 'usuario_id')[:n]
+    )
+    return _etiquetas([(fila['usuario_id'], fila['usuario__username']) for fila in filas])
+
+
+def generos_mas_calificados(n):
+    return _etiquetas(list(
+        Genero.objects.filter(cantidad_calificaciones__gt=0)
+        .order_by('-cantidad_calificaciones', 'id').values_list('id', 'nombre')[:n]
+    ))
+
+
+def libros_mas_calificados(n):
+    return _etiquetas(list(
+        Libro.objects.filter(cantidad_calificaciones__gt=0)
+        .order_by('-cantidad_calificaciones', 'id').values_list('id', 'titulo')[:n]
+    ))
+
+
+def _muestra(celdas, filas, columnas, nombre_filas, nombre_columnas, muestreo):
+    df = pd.DataFrame(list(celdas), columns=['fila', 'columna', 'puntuacion'])
+    df = pd.DataFrame({
+        nombre_filas: df['fila'].map(filas),
+        nombre_columnas: df['columna'].map(columnas),
+        'puntuacion': df['puntuacion'].astype('float32'),
+    })
+    # Solo quedan las filas y columnas con alguna celda, en el orden de votos
+    presentes_filas, presentes_columnas = set(df[nombre_filas]), set(df[nombre_columnas])
+    orden_filas = [nombre for nombre in filas.values() if nombre in presentes_filas]
+    orden_columnas = [nombre for nombre in columnas.values() if nombre in presentes_columnas]
+    if muestreo == 'cluster':
+        orden_filas, orden_columnas = ordenar_por_similitud(df, nombre_filas, nombre_columnas,
+                                                            orden_filas, orden_columnas)
+    df[nombre_filas] = pd.Categorical(df[nombre_filas], categories=orden_filas)
+    df[nombre_columnas] = pd.Categorical(df[nombre_columnas], categories=orden_columnas)
+    return df
+
+
+def ordenar_por_similitud(df, nombre_filas, nombre_columnas, orden_filas, orden_columnas):
+    """Reordena filas y columnas con clustering jerárquico sobre la muestra (``n`` x ``n`` como mucho)."""
+    from scipy.cluster.hierarchy import leaves_list, linkage
+
+    matriz = df.pivot_table(index=nombre_filas, columns=nombre_columnas, values='puntuacion', aggfunc='mean')
+    matriz = matriz.reindex(index=orden_filas, columns=orden_columnas)
+    # Cada fila centrada en su media; las celdas vacías cuentan como "ni más ni menos que su media"
+    centrada = matriz.sub(matriz.mean(axis=1), axis=0).fillna(0).to_numpy()
+    if len(orden_filas) > 2:
+        orden_filas = [orden_filas[i] for i in leaves_list(linkage(centrada, 'average'))]
+    if len(orden_columnas) > 2:
+        orden_columnas = [orden_columnas[i] for i in leaves_list(linkage(centrada.T, 'average'))]
+    return orden_filas, orden_columnas
+
+
+def usuario_genero(n=30, muestreo='top'):
+    """Promedio por usuario y género de los ``n`` usuarios y géneros con más votos.
+
+    Devuelve un DataFrame largo ``(usuario, genero, puntuacion)``, una fila por celda.
+    """
+    usuarios, generos = usuarios_mas_activos(n), generos_mas_calificados(n)
+    celdas = (
+        UsuarioGenero.objects.filter(usuario_id__in=usuarios, genero_id__in=generos)
+        .annotate(promedio=Cast('suma_puntuaciones', FloatField()) / Cast('cantidad_calificaciones', FloatField()))
+        .values_list('usuario_id', 'genero_id', 'promedio')
+    )
+    return _muestra(celdas, usuarios, generos, 'usuario', 'genero', muestreo)
+
+
+def usuario_libro(n=30, muestreo='top'):
+    """Puntuaciones de los ``n`` usuarios más activos a los ``n`` libros más votados (``n`` x ``n`` como mucho).
+
+    Devuelve un DataFrame largo ``(libro__titulo, usuario__username, puntuacion)``.
+    """
+    usuarios, libros = usuarios_mas_activos(n), libros_mas_calificados(n)
+    celdas = (
+        Calificacion.objects.filter(libro_id__in=libros, usuario_id__in=usuarios)
+        .annotate(valor=Cast('puntuacion', FloatField()))
+        .values_list('libro_id', 'usuario_id', 'valor')
+    )
+    return _muestra(celdas, libros, usuarios, 'libro__titulo', 'usuario__username', muestreo)
@@ -0,0 +1,313 @@
+"""Métricas por petición (opcional, con ``METRICAS_ACTIVAS``).
+
+``MetricasMiddleware`` mide en cada petición el tiempo total, la cantidad y
+el tiempo de las consultas SQL y el tiempo de serialización, agrupados por
+vista y acción del ViewSet. Si una misma consulta se repite
+``METRICAS_UMBRAL_REPETIDAS`` veces o más en una petición (el patrón N+1) se
+cuenta y se registra en el log. Los histogramas de este proceso se publican
+en ``/api/_metrics/`` en el formato de texto de Prometheus.
+
+Con el encabezado ``X-Perfil`` (o ``?_perfil=``) igual a ``METRICAS_TOKEN``
+la petición se ejecuta con cProfile y el resultado se guarda en
+``METRICAS_PERFIL_DIR``; ``METRICAS_PERFIL_MUESTREO`` perfila además esa
+fracción de las peticiones al azar.
+"""
+import contextlib
+import contextvars
+import cProfile
+import hmac
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import Http404, HttpResponse
+from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from usuarios.autenticacion import JWTAutenticacionRapida
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def activas():
+    return getattr(settings, 'METRICAS_ACTIVAS', False)
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, buckets):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = buckets
+        self.series = defaultdict(lambda: [[0] * len(buckets), 0.0, 0])
+
+    def observar(self, etiquetas, valor):
+        conteos, _, _ = serie = self.series[etiquetas]
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                conteos[i] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+    def exponer(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        for etiquetas, (conteos, suma, total) in sorted(self.series.items()):
+            base = _etiquetas(etiquetas)
+            for limite, conteo in zip(self.buckets, conteos):
+                lineas.append(f'{self.nombre}_bucket{{{base},le="{limite}"}} {conteo}')
+            lineas.append(f'{self.nombre}_bucket{{{base},le="+Inf"}} {total}')
+            lineas.append(f'{self.nombre}_sum{{{base}}} {suma:.6f}')
+            lineas.append(f'{self.nombre}_count{{{base}}} {total}')
+        return lineas
+
+
+class Contador:
+    def __init__(self, nombre, ayuda):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.series = Counter()
+
+    def incrementar(self, etiquetas):
+        self.series[etiquetas] += 1
+
+    def exponer(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} counter']
+        lineas += [f'{self.nombre}{{{_etiquetas(etiquetas)}}} {valor}' for etiquetas, valor in sorted(self.series.items())]
+        return lineas
+
+
+def _etiquetas(pares):
+    return ','.join(f'{clave}="{valor}"' for clave, valor in pares)
+
+
+class Registro:
+    """Métricas acumuladas de este proceso."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.limpiar()
+
+    def limpiar(self):
+        self.duracion = Histograma('biblioteca_peticion_segundos', 'Duración total de la petición.', BUCKETS_SEGUNDOS)
+        self.consultas = Histograma('biblioteca_consultas', 'Consultas SQL por petición.', BUCKETS_CONSULTAS)
+        self.tiempo_consultas = Histograma('biblioteca_consultas_segundos', 'Tiempo en consultas SQL por petición.',
+                                           BUCKETS_SEGUNDOS)
+        self.serializacion = Histograma('biblioteca_serializacion_segundos', 'Tiempo serializando por petición.',
+                                        BUCKETS_SEGUNDOS)
+        self.peticiones = Contador('biblioteca_peticiones_total', 'Peticiones respondidas.')
+        self.repetidas = Contador('biblioteca_consultas_repetidas_total',
+                                  'Peticiones con una misma consulta repetida (posible N+1).')
+
+    def guardar(self, medicion, estado):
+        etiquetas = (('vista', medicion.vista), ('accion', medicion.accion), ('metodo', medicion.metodo))
+        with self.lock:
+            self.duracion.observar(etiquetas, medicion.total)
+            self.peticiones.incrementar((*etiquetas, ('estado', str(estado))))
+            if medicion.instrumentada:
+                self.consultas.observar(etiquetas, medicion.cantidad_consultas)
+                self.tiempo_consultas.observar(etiquetas, medicion.tiempo_consultas)
+                self.serializacion.observar(etiquetas, medicion.tiempo_serializacion)
+                if medicion.repetida is not None:
+                    self.repetidas.incrementar(etiquetas)
+
+    def exponer(self):
+        with self.lock:
+            metricas = (self.duracion, self.consultas, self.tiempo_consultas, self.serializacion,
+                        self.peticiones, self.repetidas)
+            return '\n'.join(linea for metrica in metricas for linea in metrica.exponer()) + '\n'
+
+
+registro = Registro()
+_medicion = contextvars.ContextVar('medicion', default=None)
+
+
+class Medicion:
+    """Lo medido en una petición."""
+
+    def __init__(self, request, instrumentada=True):
+        self.metodo = request.method
+        self.vista = self.accion = 'desconocida'
+        self.instrumentada = instrumentada
+        self.sql = Counter()
+        self.tiempo_consultas = 0.0
+        self.tiempo_serializacion = 0.0
+        self.total = 0.0
+        self.repetida = None
+
+    @property
+    def cantidad_consultas(self):
+        return sum(self.sql.values())
+
+    def __call__(self, execute, sql, params, many, context):
+        # Envoltorio de connection.execute_wrapper: el SQL sin parámetros agrupa las consultas iguales
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_consultas += time.perf_counter() - inicio
+            self.sql[sql] += 1
+
+    def terminar(self, duracion):
+        self.total = duracion
+        if self.sql:
+            sql, veces = self.sql.most_common(1)[0]
+            if veces >= getattr(settings, 'METRICAS_UMBRAL_REPETIDAS', 5):
+                self.repetida = (sql, veces)
+                logger.warning('Consulta repetida %d veces en %s.%s (posible N+1): %s',
+                               veces, self.vista, self.accion, sql)
+
+    def server_timing(self):
+        partes = [f'total;dur={self.total * 1000:.1f}']
+        if self.instrumentada:
+            partes += [
+                f'db;dur={self.tiempo_consultas * 1000:.1f};desc="{self.cantidad_consultas} consultas"',
+                f'serializacion;dur={self.tiempo_serializacion * 1000:.1f}',
+            ]
+        return ', '.join(partes)
+
+
+@contextlib.contextmanager
+def serializando():
+    """Suma el tiempo del bloque a la serialización de la petición en curso."""
+    medicion = _medicion.get()
+    if medicion is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.tiempo_serializacion += time.perf_counter() - inicio
+
+
+_data_original = None
+
+
+def instrumentar_serializers():
+    """Mide ``serializer.data`` de DRF: ahí se arma la respuesta de cada vista."""
+    global _data_original
+    if _data_original is not None:
+        return
+    _data_original = serializers.BaseSerializer.data
+
+    def data(self):
+        with serializando():
+            return _data_original.fget(self)
+    serializers.BaseSerializer.data = property(data)
+
+
+def _token_valido(valor):
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    return bool(token) and hmac.compare_digest(str(valor), token)
+
+
+def _perfil_pedido(request):
+    pedido = request.headers.get('X-Perfil') or request.GET.get('_perfil')
+    if pedido and _token_valido(pedido):
+        return True
+    muestreo = getattr(settings, 'METRICAS_PERFIL_MUESTREO', 0.0)
+    return muestreo > 0 and random.random() < muestreo
+
+
+def _guardar_perfil(perfil, medicion):
+    carpeta = getattr(settings, 'METRICAS_PERFIL_DIR', 'perfiles')
+    os.makedirs(carpeta, exist_ok=True)
+    nombre = f"{datetime.now():%Y%m%d-%H%M%S-%f}_{medicion.vista}_{medicion.accion}.prof"
+    perfil.dump_stats(os.path.join(carpeta, nombre))
+    return nombre
+
+
+# Un solo perfil a la vez por proceso: desde Python 3.12 cProfile ocupa el slot global de sys.monitoring
+# (un segundo perfil simultáneo lanza ValueError) y, aun antes, mezclaría los frames de otros hilos
+_lock_perfil = threading.Lock()
+
+
+class MetricasMiddleware:
+    """Ver el docstring del módulo. Sin ``METRICAS_ACTIVAS`` no se instala."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not activas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+        instrumentar_serializers()
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        medicion = Medicion(request)
+        request._medicion = medicion
+        # Si ya hay otra petición perfilándose, esta se atiende sin perfil
+        perfil = None
+        if _perfil_pedido(request) and _lock_perfil.acquire(blocking=False):
+            perfil = cProfile.Profile()
+        marca = _medicion.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with connection.execute_wrapper(medicion):
+                if perfil is not None:
+                    respuesta = perfil.runcall(self.get_response, request)
+                else:
+                    respuesta = self.get_response(request)
+        finally:
+            _medicion.reset(marca)
+            if perfil is not None:
+                _lock_perfil.release()
+        medicion.terminar(time.perf_counter() - inicio)
+        if perfil is not None:
+            respuesta['X-Perfil-Archivo'] = _guardar_perfil(perfil, medicion)
+        return self.responder(medicion, respuesta)
+
+    async def __acall__(self, request):
+        # Las consultas de las vistas asíncronas corren en otro hilo: solo se mide el tiempo total
+        medicion = Medicion(request, instrumentada=False)
+        request._medicion = medicion
+        inicio = time.perf_counter()
+        respuesta = await self.get_response(request)
+        medicion.terminar(time.perf_counter() - inicio)
+        return self.responder(medicion, respuesta)
+
+    def responder(self, medicion, respuesta):
+        respuesta['Server-Timing'] = medicion.server_timing()
+        registro.guardar(medicion, respuesta.status_code)
+        return respuesta
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicion = getattr(request, '_medicion', None)
+        if medicion is None:
+            return None
+        clase = getattr(view_func, 'cls', None)
+        medicion.vista = clase.__name__ if clase is not None else view_func.__name__
+        acciones = getattr(view_func, 'actions', None) or {}
+        medicion.accion = acciones.get(request.method.lower(), request.method.lower())
+        return None
+
+
+def metricas(request):
+    """``/api/_metrics/``: con ``Authorization: Bearer <METRICAS_TOKEN>`` o el JWT de un usuario staff."""
+    if not activas():
+        raise Http404
+    autorizacion = request.headers.get('Authorization', '')
+    permitido = autorizacion.startswith('Bearer ') and _token_valido(autorizacion[len('Bearer '):])
+    if not permitido and autorizacion:
+        try:
+            resultado = JWTAutenticacionRapida().authenticate(request)
+        except AuthenticationFailed:
+            resultado = None
+        permitido = resultado is not None and resultado[0].is_staff
+    if not permitido:
+        return HttpResponse('No autorizado.\n', status=401, content_type='text/plain; charset=utf-8')
+    return HttpResponse(registro.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,156 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:37
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+CAMPOS = ['suma_puntuaciones', 'cantidad_calificaciones',
+          'estrellas_1', 'estrellas_2', 'estrellas_3', 'estrellas_4', 'estrellas_5']
+
+
+def poblar_agregados(apps, schema_editor):
+    Calificacion = apps.get_model('libros', 'Calificacion')
+    Libro = apps.get_model('libros', 'Libro')
+    Autor = apps.get_model('libros', 'Autor')
+    Genero = apps.get_model('libros', 'Genero')
+    limites = [None, Decimal('1.5'), Decimal('2.5'), Decimal('3.5'), Decimal('4.5'), None]
+
+    def filtro(numero):
+        q = Q()
+        if limites[numero - 1] is not None:
+            q &= Q(puntuacion__gte=limites[numero - 1])
+        if limites[numero] is not None:
+            q &= Q(puntuacion__lt=limites[numero])
+        return q
+
+    filas = Calificacion.objects.values('libro_id').annotate(
+        suma_puntuaciones=Sum('puntuacion'),
+        cantidad_calificaciones=Count('id'),
+        **{f'estrellas_{i}': Count('id', filter=filtro(i)) for i in range(1, 6)},
+    )
+    Libro.objects.bulk_update(
+        [Libro(pk=fila.pop('libro_id'), **fila) for fila in filas], CAMPOS, batch_size=1000,
+    )
+    for modelo, campo in ((Autor, 'autor'), (Genero, 'genero')):
+        filas = Libro.objects.values(campo).annotate(**{f'total_{c}': Sum(c) for c in CAMPOS})
+        modelo.objects.bulk_update(
+            [modelo(pk=fila[campo], **{c: fila[f'total_{c}'] for c in CAMPOS}) for fila in filas],
+            CAMPOS, batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='autor',
+            name='cantidad_calificaciones',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='autor',
+            name='estrellas_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='autor',
+            name='estrellas_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='autor',
+            name='estrellas_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='autor',
+            name='estrellas_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='autor',
+            name='estrellas_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='autor',
+            name='suma_puntuaciones',
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='genero',
+            name='cantidad_calificaciones',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genero',
+            name='estrellas_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genero',
+            name='estrellas_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genero',
+            name='estrellas_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genero',
+            name='estrellas_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genero',
+            name='estrellas_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genero',
+            name='suma_puntuaciones',
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='cantidad_calificaciones',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='estrellas_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='estrellas_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='estrellas_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='estrellas_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='estrellas_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='suma_puntuaciones',
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=14),
+        ),
+        migrations.RunPython(poblar_agregados, migrations.RunPython.noop),
+    ]
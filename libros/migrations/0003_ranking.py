@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0002_agregados_calificaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosicionRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicion', models.PositiveIntegerField()),
+                ('puntaje', models.FloatField()),
+                ('promedio', models.FloatField()),
+                ('votos', models.PositiveIntegerField()),
+                ('genero', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ranking', to='libros.genero')),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='posiciones', to='libros.libro')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['genero', 'posicion'], name='ranking_genero_posicion_idx')],
+            },
+        ),
+    ]
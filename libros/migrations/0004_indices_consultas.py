@@ -0,0 +1,79 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:52
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+
+# Búsquedas por parte del título o del nombre (ILIKE '%...%' y similitud).
+# Solo existen en PostgreSQL, así que no se declaran en los modelos.
+INDICES_TRIGRAMA = [
+    ('libro', 'titulo', 'libro_titulo_trgm_idx'),
+    ('autor', 'nombre', 'autor_nombre_trgm_idx'),
+]
+
+
+def crear_indices_trigrama(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for modelo, campo, nombre in INDICES_TRIGRAMA:
+        tabla = apps.get_model('libros', modelo)._meta.db_table
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} USING gin ({campo} gin_trgm_ops)'
+        )
+
+
+def borrar_indices_trigrama(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, _, nombre in INDICES_TRIGRAMA:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0003_ranking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='calificacion',
+            name='puntuacion',
+            field=models.DecimalField(decimal_places=1, max_digits=2, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.AddIndex(
+            model_name='autor',
+            index=models.Index(fields=['nombre'], name='autor_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calificacion',
+            index=models.Index(fields=['usuario', 'libro'], include=('puntuacion',), name='calif_usuario_libro_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genero',
+            index=models.Index(fields=['nombre'], name='genero_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['titulo'], name='libro_titulo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['fecha_de_lanzamiento'], name='libro_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['genero', '-cantidad_calificaciones'], include=('suma_puntuaciones',), name='libro_genero_votos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['-cantidad_calificaciones'], name='libro_votos_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='calificacion',
+            constraint=models.CheckConstraint(condition=models.Q(('puntuacion__gte', 1), ('puntuacion__lte', 5)), name='calif_puntuacion_rango'),
+        ),
+        migrations.RunPython(crear_indices_trigrama, borrar_indices_trigrama),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations
+
+# Columna tsvector con el título (peso A) y el nombre del autor (peso B) que
+# mantienen dos triggers: uno al insertar o cambiar un libro y otro que, al
+# renombrar un autor, vuelve a calcularla en sus libros. Solo en PostgreSQL;
+# con otros motores la búsqueda usa el índice en memoria de libros.busqueda.
+CREAR = """
+ALTER TABLE libros_libro ADD COLUMN IF NOT EXISTS busqueda tsvector;
+
+CREATE OR REPLACE FUNCTION libros_libro_busqueda() RETURNS trigger AS $$
+BEGIN
+    NEW.busqueda :=
+        setweight(to_tsvector('spanish', coalesce(NEW.titulo, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(
+            (SELECT nombre FROM libros_autor WHERE id = NEW.autor_id), '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER libros_libro_busqueda_trg
+    BEFORE INSERT OR UPDATE OF titulo, autor_id ON libros_libro
+    FOR EACH ROW EXECUTE FUNCTION libros_libro_busqueda();
+
+CREATE OR REPLACE FUNCTION libros_autor_busqueda() RETURNS trigger AS $$
+BEGIN
+    UPDATE libros_libro SET titulo = titulo WHERE autor_id = NEW.id;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER libros_autor_busqueda_trg
+    AFTER UPDATE OF nombre ON libros_autor
+    FOR EACH ROW WHEN (OLD.nombre IS DISTINCT FROM NEW.nombre)
+    EXECUTE FUNCTION libros_autor_busqueda();
+
+UPDATE libros_libro SET titulo = titulo;
+
+CREATE INDEX IF NOT EXISTS libro_busqueda_idx ON libros_libro USING gin (busqueda);
+"""
+
+BORRAR = """
+DROP TRIGGER IF EXISTS libros_autor_busqueda_trg ON libros_autor;
+DROP FUNCTION IF EXISTS libros_autor_busqueda();
+DROP TRIGGER IF EXISTS libros_libro_busqueda_trg ON libros_libro;
+DROP FUNCTION IF EXISTS libros_libro_busqueda();
+ALTER TABLE libros_libro DROP COLUMN IF EXISTS busqueda;
+"""
+
+
+def crear_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREAR)
+
+
+def borrar_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(BORRAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0004_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_busqueda, borrar_busqueda),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def poblar_matriz(apps, schema_editor):
+    Calificacion = apps.get_model('libros', 'Calificacion')
+    UsuarioGenero = apps.get_model('libros', 'UsuarioGenero')
+    filas = Calificacion.objects.values('usuario_id', 'libro__genero_id').annotate(
+        suma=Sum('puntuacion'), cantidad=Count('id'),
+    )
+    UsuarioGenero.objects.bulk_create(
+        [UsuarioGenero(usuario_id=fila['usuario_id'], genero_id=fila['libro__genero_id'],
+                       suma_puntuaciones=fila['suma'], cantidad_calificaciones=fila['cantidad'])
+         for fila in filas.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0005_busqueda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsuarioGenero',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('suma_puntuaciones', models.DecimalField(decimal_places=1, default=0, max_digits=14)),
+                ('cantidad_calificaciones', models.PositiveIntegerField(default=0)),
+                ('genero', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calificaciones_por_usuario', to='libros.genero')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calificaciones_por_genero', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'genero'), name='usuario_genero_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_matriz, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0006_matriz_usuario_genero'),
+    ]
+
+    operations = [
+        # Sin default al agregar la columna: las calificaciones existentes quedan sin fecha
+        # en lugar de aparecer todas como recién hechas
+        migrations.AddField(
+            model_name='calificacion',
+            name='fecha',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='calificacion',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='ActividadGenero',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('suma_puntuaciones', models.DecimalField(decimal_places=1, default=0, max_digits=14)),
+                ('cantidad_calificaciones', models.PositiveIntegerField(default=0)),
+                ('estrellas_1', models.PositiveIntegerField(default=0)),
+                ('estrellas_2', models.PositiveIntegerField(default=0)),
+                ('estrellas_3', models.PositiveIntegerField(default=0)),
+                ('estrellas_4', models.PositiveIntegerField(default=0)),
+                ('estrellas_5', models.PositiveIntegerField(default=0)),
+                ('granularidad', models.CharField(choices=[('hora', 'Hora'), ('dia', 'Día')], max_length=4)),
+                ('inicio', models.DateTimeField()),
+                ('genero', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actividad', to='libros.genero')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularidad', 'inicio'], name='actividad_genero_inicio_idx')],
+                'constraints': [models.UniqueConstraint(fields=('genero', 'granularidad', 'inicio'), name='actividad_genero_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ActividadLibro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('suma_puntuaciones', models.DecimalField(decimal_places=1, default=0, max_digits=14)),
+                ('cantidad_calificaciones', models.PositiveIntegerField(default=0)),
+                ('estrellas_1', models.PositiveIntegerField(default=0)),
+                ('estrellas_2', models.PositiveIntegerField(default=0)),
+                ('estrellas_3', models.PositiveIntegerField(default=0)),
+                ('estrellas_4', models.PositiveIntegerField(default=0)),
+                ('estrellas_5', models.PositiveIntegerField(default=0)),
+                ('granularidad', models.CharField(choices=[('hora', 'Hora'), ('dia', 'Día')], max_length=4)),
+                ('inicio', models.DateTimeField()),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actividad', to='libros.libro')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularidad', 'inicio'], name='actividad_libro_inicio_idx')],
+                'constraints': [models.UniqueConstraint(fields=('libro', 'granularidad', 'inicio'), name='actividad_libro_unica')],
+            },
+        ),
+    ]
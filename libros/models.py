@@ -1,37 +1,205 @@
 from django.db import models
 # Create your models here.
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
 
-class Genero(models.Model):
+
+class AgregadoQuerySet(models.QuerySet):
+    def con_promedio(self, sin_votos=None):
+        """Anota ``promedio`` a partir de las columnas materializadas (``sin_votos`` si no tiene)."""
+        return self.annotate(promedio=Case(
+            When(cantidad_calificaciones=0, then=Value(sin_votos)),
+            default=Cast('suma_puntuaciones', FloatField()) / F('cantidad_calificaciones'),
+            output_field=FloatField(),
+        ))
+
+
+class AgregadoCalificaciones(models.Model):
+    """Resumen de calificaciones mantenido de forma incremental (ver ``libros.agregados``)."""
+    suma_puntuaciones = models.DecimalField(max_digits=14, decimal_places=1, default=0)
+    cantidad_calificaciones = models.PositiveIntegerField(default=0)
+    estrellas_1 = models.PositiveIntegerField(default=0)
+    estrellas_2 = models.PositiveIntegerField(default=0)
+    estrellas_3 = models.PositiveIntegerField(default=0)
+    estrellas_4 = models.PositiveIntegerField(default=0)
+    estrellas_5 = models.PositiveIntegerField(default=0)
+
+    objects = AgregadoQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @property
+    def histograma(self):
+        return [self.estrellas_1, self.estrellas_2, self.estrellas_3, self.estrellas_4, self.estrellas_5]
+
+
+class Genero(AgregadoCalificaciones):
     nombre = models.CharField(max_length=120)
 
+    class Meta:
+        indexes = [models.Index(fields=['nombre'], name='genero_nombre_idx')]
+
     def __str__(self):
         return self.nombre
     
-class Autor(models.Model):
+class Autor(AgregadoCalificaciones):
     nombre = models.CharField(max_length=120)
     nacionalidad = models.CharField(max_length=120)
 
+    class Meta:
+        indexes = [models.Index(fields=['nombre'], name='autor_nombre_idx')]
+
     def __str__(self):
         return self.nombre
 
-class Libro(models.Model):
+class Libro(AgregadoCalificaciones):
     titulo = models.CharField(max_length=220)
     autor = models.ForeignKey(Autor, on_delete=models.CASCADE, related_name='libros')
     genero = models.ForeignKey(Genero, on_delete=models.CASCADE, related_name='libros')
     fecha_de_lanzamiento = models.DateField()
     url_del_libro = models.URLField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['titulo'], name='libro_titulo_idx'),
+            models.Index(fields=['fecha_de_lanzamiento'], name='libro_fecha_idx'),
+            # Ranking por género y libros populares: en PostgreSQL se resuelven solo con el índice
+            models.Index(fields=['genero', '-cantidad_calificaciones'], include=['suma_puntuaciones'],
+                         name='libro_genero_votos_idx'),
+            models.Index(fields=['-cantidad_calificaciones'], name='libro_votos_idx'),
+        ]
+
     def __str__(self):
         return self.titulo
 
 class Calificacion(models.Model):
     libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='calificaciones')
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='calificaciones')
-    puntuacion = models.DecimalField(max_digits=2, decimal_places=1)
+    puntuacion = models.DecimalField(max_digits=2, decimal_places=1,
+                                     validators=[MinValueValidator(1), MaxValueValidator(5)])
+    # Último alta o cambio; nula en las calificaciones cargadas antes de guardar fechas
+    fecha = models.DateTimeField(default=timezone.now, null=True, editable=False)
 
 
     class Meta:
         unique_together = ('libro', 'usuario') 
+        indexes = [
+            # Calificaciones de un usuario (recomendaciones): la unique empieza por libro
+            models.Index(fields=['usuario', 'libro'], include=['puntuacion'], name='calif_usuario_libro_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=Q(puntuacion__gte=1) & Q(puntuacion__lte=5),
+                                   name='calif_puntuacion_rango'),
+        ]
     def __str__(self):
         return f"{self.usuario.username} - {self.libro.titulo} ({self.puntaje})"
+
+
+class UsuarioGenero(models.Model):
+    """Celda de la matriz usuario x género; solo existen las que tienen calificaciones (ver ``libros.agregados``)."""
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='calificaciones_por_genero')
+    genero = models.ForeignKey(Genero, on_delete=models.CASCADE, related_name='calificaciones_por_usuario')
+    suma_puntuaciones = models.DecimalField(max_digits=14, decimal_places=1, default=0)
+    cantidad_calificaciones = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'genero'], name='usuario_genero_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} x {self.genero_id} ({self.cantidad_calificaciones})"
+
+
+class ActividadCalificaciones(AgregadoCalificaciones):
+    """Calificaciones cuya ``fecha`` cae en una hora o un día (ver ``libros.tendencias``)."""
+    HORA = 'hora'
+    DIA = 'dia'
+
+    granularidad = models.CharField(max_length=4, choices=[(HORA, 'Hora'), (DIA, 'Día')])
+    inicio = models.DateTimeField()
+
+    class Meta:
+        abstract = True
+
+
+class ActividadLibro(ActividadCalificaciones):
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='actividad')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['libro', 'granularidad', 'inicio'], name='actividad_libro_unica'),
+        ]
+        indexes = [models.Index(fields=['granularidad', 'inicio'], name='actividad_libro_inicio_idx')]
+
+    def __str__(self):
+        return f"{self.libro_id} {self.granularidad} {self.inicio:%Y-%m-%d %H:%M} ({self.cantidad_calificaciones})"
+
+
+class ActividadGenero(ActividadCalificaciones):
+    genero = models.ForeignKey(Genero, on_delete=models.CASCADE, related_name='actividad')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['genero', 'granularidad', 'inicio'], name='actividad_genero_unica'),
+        ]
+        indexes = [models.Index(fields=['granularidad', 'inicio'], name='actividad_genero_inicio_idx')]
+
+    def __str__(self):
+        return f"{self.genero_id} {self.granularidad} {self.inicio:%Y-%m-%d %H:%M} ({self.cantidad_calificaciones})"
+
+
+class PosicionRanking(models.Model):
+    """Leaderboard precalculado por ``libros.ranking``; ``genero`` nulo es el ranking general."""
+    genero = models.ForeignKey(Genero, on_delete=models.CASCADE, null=True, blank=True, related_name='ranking')
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='posiciones')
+    posicion = models.PositiveIntegerField()
+    puntaje = models.FloatField()
+    promedio = models.FloatField()
+    votos = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['genero', 'posicion'], name='ranking_genero_posicion_idx')]
+
+    def __str__(self):
+        return f"{self.posicion}. {self.libro_id} ({self.puntaje:.2f})"
+
+
+class Tarea(models.Model):
+    """Trabajo en segundo plano que ejecuta ``manage.py trabajador`` (ver ``libros.tareas``)."""
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    TERMINADA = 'terminada'
+    FALLIDA = 'fallida'
+    ESTADOS = [(PENDIENTE, 'Pendiente'), (EN_CURSO, 'En curso'), (TERMINADA, 'Terminada'), (FALLIDA, 'Fallida')]
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    # Hash de tipo y parámetros: dos tareas iguales no pueden estar pendientes o en curso a la vez
+    clave = models.CharField(max_length=64)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='tareas')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=3)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    creada = models.DateTimeField(auto_now_add=True)
+    iniciada = models.DateTimeField(null=True, blank=True)
+    finalizada = models.DateTimeField(null=True, blank=True)
+    trabajador = models.CharField(max_length=100, blank=True)
+    resultado = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['clave'], condition=Q(estado__in=['pendiente', 'en_curso']),
+                                    name='tarea_activa_unica'),
+        ]
+        indexes = [models.Index(fields=['estado', 'disponible_desde'], name='tarea_estado_disponible_idx')]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.estado})"
@@ -0,0 +1,20 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class CursorPaginacion(CursorPagination):
+    """Paginación por clave (keyset) sobre la PK.
+
+    Cada página filtra por ``id > cursor`` usando el índice de la clave
+    primaria, por lo que las páginas profundas cuestan lo mismo que la primera.
+    """
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class PaginacionBusqueda(LimitOffsetPagination):
+    """Resultados de ``?q=``: vienen ordenados por relevancia, no por PK,
+    así que se paginan con ``limit``/``offset``."""
+    default_limit = 20
+    max_limit = 100
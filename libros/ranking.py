@@ -0,0 +1,141 @@
+"""Ranking ponderado (promedio bayesiano, como el de IMDB).
+
+    puntaje = (v / (v + m)) * R + (m / (v + m)) * C
+
+donde ``R`` es el promedio del libro, ``v`` sus votos, ``C`` el promedio de
+referencia (general o del género) y ``m`` el mínimo de votos a partir del
+cual el promedio propio empieza a pesar más que el de referencia. Así un libro
+con un único 5.0 no le gana a uno con 500 votos de 4.8.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Avg
+
+from .models import Libro, PosicionRanking
+
+logger = logging.getLogger(__name__)
+
+
+def minimo_votos(media_votos):
+    """``m``: el valor de ``RANKING_MINIMO_VOTOS`` o, si no está definido, la media de votos por libro."""
+    configurado = getattr(settings, 'RANKING_MINIMO_VOTOS', None)
+    if configurado is not None:
+        return float(configurado)
+    return max(1.0, float(media_votos or 0))
+
+
+def clasificar(filas, referencia, m):
+    """Ordena ``[(libro_id, suma, votos)]`` por puntaje bayesiano.
+
+    Devuelve ``[(libro_id, puntaje, promedio, votos)]`` de mayor a menor.
+    """
+    resultado = [
+        (libro_id, (float(suma) + referencia * m) / (votos + m), float(suma) / votos, votos)
+        for libro_id, suma, votos in filas if votos
+    ]
+    resultado.sort(key=lambda fila: (-fila[1], -fila[3], fila[0]))
+    return resultado
+
+
+def _referencia(filas):
+    votos = sum(fila[2] for fila in filas)
+    return sum(float(fila[1]) for fila in filas) / votos if votos else 0.0
+
+
+def mejores_libros(genero_id=None, n=10):
+    """Calcula en el momento el ranking (general o de un género) a partir de los agregados."""
+    calificados = Libro.objects.filter(cantidad_calificaciones__gt=0)
+    m = minimo_votos(calificados.aggregate(media=Avg('cantidad_calificaciones'))['media'])
+    if genero_id is not None:
+        calificados = calificados.filter(genero_id=genero_id)
+    filas = list(calificados.values_list('id', 'suma_puntuaciones', 'cantidad_calificaciones'))
+    return clasificar(filas, _referencia(filas), m)[:n]
+
+
+# Clave del pg_advisory_xact_lock que serializa los refrescos entre procesos
+CLAVE_LOCK_REFRESCO = 0x52414e4b  # 'RANK'
+
+
+def _bloquear_refresco():
+    """Espera a que termine cualquier otro refresco (de este u otro proceso) hasta el fin de la transacción.
+
+    Sin esto, dos refrescos simultáneos en READ COMMITTED borran cada uno las
+    filas que ve y ambos insertan un ranking completo. SQLite ya serializa las
+    escrituras.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CLAVE_LOCK_REFRESCO])
+
+
+@transaction.atomic
+def refrescar_ranking(tamanio=None):
+    """Recalcula y guarda el ranking general y el de cada género (O(libros))."""
+    # Antes de leer los agregados, para calcular sobre lo que dejó el refresco anterior
+    _bloquear_refresco()
+    tamanio = tamanio or getattr(settings, 'RANKING_TAMANIO', 100)
+    todos = list(
+        Libro.objects.filter(cantidad_calificaciones__gt=0)
+        .values_list('id', 'genero_id', 'suma_puntuaciones', 'cantidad_calificaciones')
+    )
+    m = minimo_votos(sum(fila[3] for fila in todos) / len(todos) if todos else 0)
+
+    por_genero = {None: []}
+    for libro_id, genero_id, suma, votos in todos:
+        por_genero[None].append((libro_id, suma, votos))
+        por_genero.setdefault(genero_id, []).append((libro_id, suma, votos))
+
+    posiciones = []
+    for genero_id, filas in por_genero.items():
+        clasificados = clasificar(filas, _referencia(filas), m)[:tamanio]
+        posiciones.extend(
+            PosicionRanking(genero_id=genero_id, libro_id=libro_id, posicion=i,
+                            puntaje=puntaje, promedio=promedio, votos=votos)
+            for i, (libro_id, puntaje, promedio, votos) in enumerate(clasificados, 1)
+        )
+
+    PosicionRanking.objects.all().delete()
+    PosicionRanking.objects.bulk_create(posiciones, batch_size=1000)
+    return len(posiciones)
+
+
+_lock = threading.Lock()
+_pendiente = None
+_ultimo = 0.0
+
+
+def _refrescar_en_segundo_plano():
+    global _pendiente, _ultimo
+    with _lock:
+        _pendiente = None
+        _ultimo = time.monotonic()
+    try:
+        close_old_connections()
+        refrescar_ranking()
+    except Exception:
+        logger.exception('No se pudo refrescar el ranking')
+    finally:
+        connection.close()
+
+
+def programar_refresco():
+    """Agenda un refresco del ranking en un hilo aparte.
+
+    Las llamadas que llegan mientras ya hay uno agendado se unen a ese, y no
+    se refresca más de una vez cada ``RANKING_INTERVALO`` segundos.
+    """
+    global _pendiente
+    if not getattr(settings, 'RANKING_REFRESCO_EN_SEGUNDO_PLANO', True):
+        return
+    intervalo = getattr(settings, 'RANKING_INTERVALO', 60)
+    with _lock:
+        if _pendiente is not None:
+            return
+        espera = max(0.0, _ultimo + intervalo - time.monotonic())
+        _pendiente = threading.Timer(espera, _refrescar_en_segundo_plano)
+        _pendiente.daemon = True
+        _pendiente.start()
@@ -0,0 +1,154 @@
+"""Recomendador colaborativo ítem-ítem.
+
+``calcular_indice`` arma la matriz dispersa usuario x libro con las
+puntuaciones centradas en la media de cada usuario y guarda, para cada libro,
+sus K vecinos más parecidos por coseno en un ``.npz`` compacto. Los endpoints
+solo leen ese índice, sin recorrer la tabla de calificaciones.
+"""
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from . import analitica
+from .models import Libro
+
+TAMANIO_BLOQUE = 2048
+
+
+class IndiceNoDisponible(Exception):
+    pass
+
+
+def calcular_indice(k=50, bloque=TAMANIO_BLOQUE):
+    """Calcula los ``k`` vecinos de cada libro. Devuelve ``(libro_ids, vecinos, similitudes)``."""
+    from scipy import sparse
+
+    libro_ids = np.fromiter(Libro.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+    cal = analitica.cargar_calificaciones()
+    n_libros = len(libro_ids)
+    vecinos = np.full((n_libros, k), -1, dtype=np.int32)
+    similitudes = np.zeros((n_libros, k), dtype=np.float32)
+    if cal.empty or n_libros == 0:
+        return libro_ids, vecinos, similitudes
+
+    columnas = np.searchsorted(libro_ids, cal['libro_id'].to_numpy())
+    usuarios, filas = np.unique(cal['usuario_id'].to_numpy(), return_inverse=True)
+    puntuaciones = cal['puntuacion'].to_numpy(dtype=np.float32)
+
+    # Coseno ajustado: se resta la media de cada usuario
+    medias = np.bincount(filas, weights=puntuaciones) / np.bincount(filas)
+    centradas = (puntuaciones - medias[filas]).astype(np.float32)
+    matriz = sparse.csc_matrix((centradas, (filas, columnas)), shape=(len(usuarios), n_libros))
+    normas = np.sqrt(np.asarray(matriz.multiply(matriz).sum(axis=0)).ravel())
+    normas[normas == 0] = 1
+    matriz = sparse.csc_matrix(matriz.multiply(1 / normas))
+    traspuesta = matriz.T.tocsr()
+
+    # Por bloques de libros, para no materializar la matriz libro x libro completa
+    for inicio in range(0, n_libros, bloque):
+        parecidos = (traspuesta[inicio:inicio + bloque] @ matriz).tocsr()
+        for fila in range(parecidos.shape[0]):
+            desde, hasta = parecidos.indptr[fila], parecidos.indptr[fila + 1]
+            columnas_fila = parecidos.indices[desde:hasta]
+            valores = parecidos.data[desde:hasta]
+            utiles = (valores > 0) & (columnas_fila != inicio + fila)
+            columnas_fila, valores = columnas_fila[utiles], valores[utiles]
+            if len(valores) > k:
+                elegidos = np.argpartition(-valores, k - 1)[:k]
+                columnas_fila, valores = columnas_fila[elegidos], valores[elegidos]
+            orden = np.argsort(-valores, kind='stable')
+            vecinos[inicio + fila, :len(orden)] = columnas_fila[orden]
+            similitudes[inicio + fila, :len(orden)] = valores[orden]
+
+    return libro_ids, vecinos, similitudes
+
+
+def guardar_indice(libro_ids, vecinos, similitudes, ruta=None):
+    ruta = str(ruta or settings.RECOMENDADOR_INDICE)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + '.tmp.npz'
+    np.savez_compressed(temporal, libro_ids=libro_ids, vecinos=vecinos,
+                        similitudes=similitudes.astype(np.float16))
+    # Reemplazo atómico: los workers nunca leen un archivo a medio escribir
+    os.replace(temporal, ruta)
+
+
+class IndiceSimilitud:
+    def __init__(self, libro_ids, vecinos, similitudes):
+        self.libro_ids = libro_ids
+        self.vecinos = vecinos
+        self.similitudes = similitudes.astype(np.float32)
+
+    def posiciones(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.searchsorted(self.libro_ids, ids)
+        pos = np.minimum(pos, len(self.libro_ids) - 1)
+        return np.where(self.libro_ids[pos] == ids, pos, -1)
+
+    def similares(self, libro_id, n=10):
+        """Lista ``[(libro_id, similitud)]`` de los libros más parecidos a ``libro_id``."""
+        if len(self.libro_ids) == 0:
+            return []
+        pos = self.posiciones([libro_id])[0]
+        if pos < 0:
+            return []
+        validos = self.vecinos[pos] >= 0
+        vecinos = self.vecinos[pos][validos][:n]
+        sims = self.similitudes[pos][validos][:n]
+        return [(int(self.libro_ids[v]), float(s)) for v, s in zip(vecinos, sims)]
+
+    def recomendar(self, calificaciones, n=10):
+        """Recomienda a partir de ``{libro_id: puntuacion}`` de un usuario.
+
+        Cada libro calificado aporta a sus vecinos su similitud por el
+        desvío de la puntuación respecto de la media del usuario. El puntaje
+        se suaviza con el total de similitud para no premiar un único vecino.
+        """
+        if not calificaciones or len(self.libro_ids) == 0:
+            return []
+        ids = np.fromiter(calificaciones.keys(), dtype=np.int64)
+        puntuaciones = np.fromiter((float(p) for p in calificaciones.values()), dtype=np.float32)
+        pos = self.posiciones(ids)
+        conocidos = pos >= 0
+        pos, puntuaciones = pos[conocidos], puntuaciones[conocidos]
+        if len(pos) == 0:
+            return []
+
+        media = float(puntuaciones.mean())
+        vecinos = self.vecinos[pos]
+        sims = self.similitudes[pos]
+        validos = vecinos >= 0
+        desvios = np.broadcast_to((puntuaciones - media)[:, None], vecinos.shape)
+
+        numerador = np.zeros(len(self.libro_ids), dtype=np.float64)
+        soporte = np.zeros(len(self.libro_ids), dtype=np.float64)
+        np.add.at(numerador, vecinos[validos], sims[validos] * desvios[validos])
+        np.add.at(soporte, vecinos[validos], sims[validos])
+        soporte[pos] = 0  # no se recomienda lo que ya calificó
+
+        candidatos = np.flatnonzero(soporte > 0)
+        puntajes = media + numerador[candidatos] / (soporte[candidatos] + 1)
+        orden = np.lexsort((-soporte[candidatos], -puntajes))[:n]
+        return [(int(self.libro_ids[candidatos[i]]), float(puntajes[i])) for i in orden]
+
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def obtener_indice(ruta=None):
+    """Devuelve el índice en memoria; se vuelve a leer solo si el archivo cambió."""
+    ruta = str(ruta or settings.RECOMENDADOR_INDICE)
+    try:
+        modificado = os.stat(ruta).st_mtime_ns
+    except FileNotFoundError:
+        raise IndiceNoDisponible('El índice de similitud todavía no fue calculado.')
+    with _lock:
+        actual = _cache.get(ruta)
+        if actual is None or actual[0] != modificado:
+            with np.load(ruta) as datos:
+                indice = IndiceSimilitud(datos['libro_ids'], datos['vecinos'], datos['similitudes'])
+            actual = _cache[ruta] = (modificado, indice)
+        return actual[1]
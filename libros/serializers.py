@@ -1,6 +1,73 @@
+from decimal import Decimal
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from django.contrib.auth.models import User
-from .models import Genero, Autor, Libro, Calificacion
+from django.utils import timezone
+from .filtros import MAXIMO_ENTERO
+from .matrices import MUESTREOS
+from .models import Genero, Autor, Libro, Calificacion, Tarea
+
+
+def campos_solicitados(request):
+    """Devuelve el conjunto de campos pedidos en ``?fields=`` o ``None``."""
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return None
+    valor = request.query_params.get('fields')
+    if not valor:
+        return None
+    return {campo.strip() for campo in valor.split(',') if campo.strip()}
+
+
+class CamposDinamicosMixin:
+    """Permite elegir las columnas de la respuesta con ``?fields=id,titulo``."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        campos = campos_solicitados(self.context.get('request'))
+        if campos is not None:
+            for nombre in set(self.fields) - campos:
+                self.fields.pop(nombre)
+
+
+class PrimaryKeyEnLoteField(serializers.PrimaryKeyRelatedField):
+    """Con ``many=True`` resuelve todas las PK del lote en una sola consulta.
+
+    Con un único objeto se comporta igual que ``PrimaryKeyRelatedField``.
+    """
+
+    def convertir_pk(self, data):
+        """La PK como entero; ``True`` o ``1.9`` no son una PK (``int()`` las convertiría en 1)."""
+        if isinstance(data, bool) or (isinstance(data, float) and not data.is_integer()):
+            raise TypeError(data)
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        pk = int(data)
+        if abs(pk) > MAXIMO_ENTERO:
+            raise ValueError(data)
+        return pk
+
+    def to_internal_value(self, data):
+        try:
+            pk = self.convertir_pk(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        raiz = self.root
+        if not isinstance(raiz, serializers.ListSerializer) or not isinstance(getattr(raiz, 'initial_data', None), list):
+            return super().to_internal_value(pk)
+        if getattr(self, '_objetos_lote', None) is None:
+            ids = set()
+            for item in raiz.initial_data:
+                try:
+                    ids.add(self.convertir_pk(item.get(self.field_name)))
+                except (AttributeError, TypeError, ValueError, serializers.ValidationError):
+                    pass
+            self._objetos_lote = self.get_queryset().in_bulk(ids)
+        try:
+            return self._objetos_lote[pk]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
 
 class GeneroSerializer(serializers.ModelSerializer):
     class Meta:
@@ -14,11 +81,11 @@ class AutorSerializer(serializers.ModelSerializer):
         fields = ['id', 'nombre', 'nacionalidad']
 
 
-class LibroSerializer(serializers.ModelSerializer):
+class LibroSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     autor = AutorSerializer(read_only=True)
     genero = GeneroSerializer(read_only=True)
-    autor_id = serializers.PrimaryKeyRelatedField(queryset=Autor.objects.all(), source='autor', write_only=True)
-    genero_id = serializers.PrimaryKeyRelatedField(queryset=Genero.objects.all(), source='genero', write_only=True)
+    autor_id = PrimaryKeyEnLoteField(queryset=Autor.objects.all(), source='autor', write_only=True)
+    genero_id = PrimaryKeyEnLoteField(queryset=Genero.objects.all(), source='genero', write_only=True)
 
     class Meta:
         model = Libro
@@ -31,10 +98,90 @@ class UsuarioSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email']
 
 
-class CalificacionSerializer(serializers.ModelSerializer):
-    libro_id = serializers.PrimaryKeyRelatedField(queryset=Libro.objects.all(), source='libro')
+class CalificacionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    libro_id = PrimaryKeyEnLoteField(queryset=Libro.objects.all(), source='libro')
     usuario = serializers.ReadOnlyField(source='usuario.username')
+    fecha = serializers.DateTimeField(read_only=True)
 
     class Meta:
         model = Calificacion
-        fields = ['id', 'libro_id', 'usuario', 'puntuacion']
+        fields = ['id', 'libro_id', 'usuario', 'puntuacion', 'fecha']
+
+
+
+class TareaSerializer(serializers.ModelSerializer):
+    usuario = serializers.ReadOnlyField(source='usuario.username', default=None)
+
+    class Meta:
+        model = Tarea
+        fields = ['id', 'tipo', 'parametros', 'estado', 'usuario', 'intentos', 'max_intentos',
+                  'creada', 'iniciada', 'finalizada', 'resultado', 'error']
+        read_only_fields = [campo for campo in fields if campo not in ('tipo', 'parametros')]
+
+
+# Parámetros aceptados por cada tipo de tarea (ver libros.tareas); los valores
+# por defecto se completan antes de calcular la clave que evita duplicados.
+class ParametrosReporteSerializer(serializers.Serializer):
+    only = serializers.ListField(child=serializers.IntegerField(min_value=1, max_value=10), required=False)
+    top = serializers.IntegerField(min_value=1, max_value=100, default=30)
+    muestreo = serializers.ChoiceField(choices=MUESTREOS, default='top')
+
+
+class ParametrosAgregadosSerializer(serializers.Serializer):
+    libros = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, max_length=10000)
+
+
+class ParametrosRecomendarSerializer(serializers.Serializer):
+    genero = serializers.IntegerField(min_value=1)
+    n = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class ParametrosCalificacionesSerializer(serializers.Serializer):
+    min = serializers.IntegerField(min_value=0, default=0)
+    max = serializers.IntegerField(min_value=0, default=8)
+    semilla = serializers.IntegerField(required=False)
+    dias = serializers.IntegerField(min_value=0, default=0)
+
+    def validate(self, datos):
+        if datos['min'] > datos['max']:
+            raise serializers.ValidationError({'min': ['No puede ser mayor que max.']})
+        return datos
+
+
+# Lectura rápida para listados y exportaciones: se arman los mismos objetos que
+# LibroSerializer y CalificacionSerializer desde filas de values_list(), sin
+# instanciar modelos ni campos de DRF por cada fila.
+CAMPOS_LIBRO_PLANO = (
+    'id', 'titulo', 'fecha_de_lanzamiento', 'url_del_libro',
+    'autor_id', 'autor__nombre', 'autor__nacionalidad',
+    'genero_id', 'genero__nombre',
+)
+CAMPOS_CALIFICACION_PLANO = ('id', 'libro_id', 'usuario__username', 'puntuacion', 'fecha')
+
+_EXPONENTE_PUNTUACION = Decimal(1).scaleb(-Calificacion._meta.get_field('puntuacion').decimal_places)
+
+
+def libro_desde_fila(fila):
+    """Arma desde una fila de ``CAMPOS_LIBRO_PLANO`` el mismo objeto que ``LibroSerializer``."""
+    id_, titulo, fecha, url, autor_id, autor_nombre, nacionalidad, genero_id, genero_nombre = fila
+    return {
+        'id': id_, 'titulo': titulo, 'fecha_de_lanzamiento': fecha.isoformat(), 'url_del_libro': url,
+        'autor': {'id': autor_id, 'nombre': autor_nombre, 'nacionalidad': nacionalidad},
+        'genero': {'id': genero_id, 'nombre': genero_nombre},
+    }
+
+
+def calificacion_desde_fila(fila):
+    """Arma desde una fila de ``CAMPOS_CALIFICACION_PLANO`` el mismo objeto que ``CalificacionSerializer``."""
+    id_, libro_id, usuario, puntuacion, fecha = fila
+    puntuacion = puntuacion.quantize(_EXPONENTE_PUNTUACION)
+    if fecha is not None:
+        # Como DateTimeField de DRF: en la zona horaria actual y con Z para UTC
+        fecha = fecha.astimezone(timezone.get_current_timezone()).isoformat()
+        if fecha.endswith('+00:00'):
+            fecha = fecha[:-6] + 'Z'
+    return {
+        'id': id_, 'libro_id': libro_id, 'usuario': usuario,
+        'puntuacion': f'{puntuacion:f}' if api_settings.COERCE_DECIMAL_TO_STRING else puntuacion,
+        'fecha': fecha,
+    }
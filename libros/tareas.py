@@ -0,0 +1,251 @@
+"""Cola de tareas en la base de datos, sin broker externo.
+
+``encolar`` guarda una ``Tarea`` pendiente y ``manage.py trabajador`` las
+toma y ejecuta con un grupo de procesos o hilos. Cada trabajador reclama una
+tarea con un ``UPDATE ... WHERE estado = 'pendiente'``: si otro la tomó antes,
+no se actualiza ninguna fila y prueba con la siguiente, así que no hace falta
+bloquear filas y funciona igual en PostgreSQL y en SQLite.
+
+Dos tareas con el mismo tipo y los mismos parámetros no pueden estar
+pendientes o en curso a la vez (``tarea_activa_unica``): encolar una repetida
+devuelve la que ya existe. Si una tarea falla se reintenta hasta
+``max_intentos`` veces, esperando ``TAREAS_ESPERA_REINTENTO`` segundos la
+primera vez y el doble en cada reintento; una tarea en curso por más de
+``TAREAS_TIMEOUT`` segundos (el trabajador murió) vuelve a la cola.
+"""
+import hashlib
+import json
+import logging
+import os
+import signal
+import socket
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import agregados, ranking
+from .models import Libro, Calificacion, Tarea
+from .serializers import (
+    ParametrosReporteSerializer, ParametrosAgregadosSerializer,
+    ParametrosRecomendarSerializer, ParametrosCalificacionesSerializer,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _reporte(tarea, top, muestreo, only=None):
+    carpeta = os.path.join(getattr(settings, 'TAREAS_DIR', 'tareas'), f'reporte-{tarea.pk}')
+    argumentos = {'output_dir': carpeta, 'top': top, 'muestreo': muestreo}
+    if only:
+        argumentos['only'] = only
+    call_command('reporte_libros', stdout=StringIO(), **argumentos)
+    return {'carpeta': str(carpeta), 'graficos': sorted(f for f in os.listdir(carpeta) if f.endswith('.png'))}
+
+
+def _recalcular_agregados(tarea, libros=None):
+    agregados.recalcular_agregados(libros)
+    ranking.refrescar_ranking()
+    return {'libros': len(libros) if libros is not None else Libro.objects.count()}
+
+
+def _recomendar(tarea, genero, n):
+    mejores = ranking.mejores_libros(genero, n)
+    titulos = dict(Libro.objects.filter(pk__in=[libro_id for libro_id, *_ in mejores]).values_list('id', 'titulo'))
+    return [
+        {'libro_id': libro_id, 'titulo': titulos[libro_id], 'puntaje': round(puntaje, 4),
+         'promedio': round(promedio, 4), 'votos': votos}
+        for libro_id, puntaje, promedio, votos in mejores
+    ]
+
+
+def _generar_calificaciones(tarea, **opciones):
+    antes = Calificacion.objects.count()
+    call_command('generar_calificaciones', stdout=StringIO(), **opciones)
+    return {'insertadas': Calificacion.objects.count() - antes}
+
+
+# tipo -> (función, serializer de los parámetros)
+TAREAS = {
+    'reporte': (_reporte, ParametrosReporteSerializer),
+    'recalcular_agregados': (_recalcular_agregados, ParametrosAgregadosSerializer),
+    'recomendar': (_recomendar, ParametrosRecomendarSerializer),
+    'generar_calificaciones': (_generar_calificaciones, ParametrosCalificacionesSerializer),
+}
+
+
+# Veces que encolar vuelve a intentar si la tarea duplicada terminó entre el INSERT y la lectura
+REINTENTOS_ENCOLAR = 3
+
+
+def clave(tipo, parametros):
+    # Las listas son conjuntos (only=[2, 1] es la misma tarea que [1, 2])
+    parametros = {
+        nombre: sorted(valor) if isinstance(valor, list) else valor for nombre, valor in parametros.items()
+    }
+    texto = json.dumps([tipo, parametros], sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def encolar(tipo, parametros=None, usuario=None):
+    """Guarda una tarea pendiente y devuelve ``(tarea, creada)``.
+
+    Si ya hay una igual pendiente o en curso devuelve esa con ``creada=False``.
+    Lanza ``ValidationError`` si el tipo o los parámetros no son válidos.
+    """
+    if tipo not in TAREAS:
+        raise serializers.ValidationError({'tipo': [f"Debe ser uno de: {', '.join(TAREAS)}."]})
+    validador = TAREAS[tipo][1](data=parametros or {})
+    if not validador.is_valid():
+        raise serializers.ValidationError({'parametros': validador.errors})
+    parametros = validador.validated_data
+    datos = {'tipo': tipo, 'parametros': parametros, 'clave': clave(tipo, parametros)}
+    for intento in range(REINTENTOS_ENCOLAR):
+        try:
+            with transaction.atomic():
+                return Tarea.objects.create(
+                    usuario=usuario, max_intentos=getattr(settings, 'TAREAS_MAX_INTENTOS', 3), **datos,
+                ), True
+        except IntegrityError as exc:
+            if not _es_duplicada(exc) or intento == REINTENTOS_ENCOLAR - 1:
+                raise
+            # Puede terminar justo entre el INSERT fallido y esta lectura: en ese caso se vuelve a intentar
+            existente = Tarea.objects.filter(
+                clave=datos['clave'], estado__in=[Tarea.PENDIENTE, Tarea.EN_CURSO],
+            ).first()
+            if existente is not None:
+                return existente, False
+
+
+def _es_duplicada(error):
+    """Si ``error`` es la violación de ``tarea_activa_unica`` (PostgreSQL la nombra; SQLite, la columna)."""
+    mensaje = str(error)
+    return 'tarea_activa_unica' in mensaje or 'libros_tarea.clave' in mensaje
+
+
+def liberar_vencidas():
+    """Devuelve a la cola (o da por fallidas) las tareas en curso hace más de ``TAREAS_TIMEOUT`` segundos."""
+    ahora = timezone.now()
+    vencidas = Tarea.objects.filter(
+        estado=Tarea.EN_CURSO, iniciada__lt=ahora - timedelta(seconds=getattr(settings, 'TAREAS_TIMEOUT', 3600)),
+    )
+    error = 'El trabajador no terminó la tarea a tiempo.'
+    fallidas = vencidas.filter(intentos__gte=F('max_intentos')).update(
+        estado=Tarea.FALLIDA, finalizada=ahora, error=error,
+    )
+    return fallidas + vencidas.update(estado=Tarea.PENDIENTE, disponible_desde=ahora, trabajador='', error=error)
+
+
+def tomar(trabajador):
+    """Reclama la próxima tarea disponible para ``trabajador`` o devuelve ``None``."""
+    while True:
+        ahora = timezone.now()
+        candidatas = list(
+            Tarea.objects.filter(estado=Tarea.PENDIENTE, disponible_desde__lte=ahora)
+            .order_by('disponible_desde', 'id').values_list('id', flat=True)[:10]
+        )
+        if not candidatas:
+            return None
+        for pk in candidatas:
+            reclamada = Tarea.objects.filter(pk=pk, estado=Tarea.PENDIENTE).update(
+                estado=Tarea.EN_CURSO, iniciada=ahora, trabajador=trabajador, intentos=F('intentos') + 1,
+            )
+            if reclamada:
+                return Tarea.objects.get(pk=pk)
+
+
+def ejecutar(tarea):
+    """Ejecuta una tarea reclamada con ``tomar`` y guarda el resultado; devuelve si terminó bien."""
+    # Solo si sigue siendo este intento: pudo vencer y haberla tomado otro trabajador
+    intento = Tarea.objects.filter(pk=tarea.pk, estado=Tarea.EN_CURSO, intentos=tarea.intentos)
+    if tarea.tipo not in TAREAS:
+        intento.update(estado=Tarea.FALLIDA, finalizada=timezone.now(),
+                       error=f'Tipo de tarea desconocido: {tarea.tipo}')
+        return False
+    funcion = TAREAS[tarea.tipo][0]
+    try:
+        resultado = funcion(tarea, **tarea.parametros)
+    except KeyboardInterrupt:
+        # Se detuvo el trabajador a mitad de la tarea: vuelve a la cola sin gastar el intento
+        intento.update(estado=Tarea.PENDIENTE, trabajador='', intentos=F('intentos') - 1)
+        raise
+    except Exception as exc:
+        logger.exception('Falló la tarea %s (intento %d de %d)', tarea, tarea.intentos, tarea.max_intentos)
+        error = ''.join(traceback.format_exception_only(exc)).strip()
+        if tarea.intentos < tarea.max_intentos:
+            espera = getattr(settings, 'TAREAS_ESPERA_REINTENTO', 30) * 2 ** (tarea.intentos - 1)
+            intento.update(estado=Tarea.PENDIENTE, disponible_desde=timezone.now() + timedelta(seconds=espera),
+                           trabajador='', error=error)
+        else:
+            intento.update(estado=Tarea.FALLIDA, finalizada=timezone.now(), error=error)
+        return False
+    intento.update(estado=Tarea.TERMINADA, finalizada=timezone.now(), resultado=resultado, error='')
+    return True
+
+
+def nombre_trabajador():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def trabajar(nombre, detener, una_vez=False, espera=1.0):
+    """Toma y ejecuta tareas hasta que se active ``detener`` (con ``una_vez``, hasta vaciar la cola).
+
+    Devuelve la cantidad de tareas ejecutadas.
+    """
+    # Dentro de una transacción (como en las pruebas) no se toca la conexión
+    propia = not connection.in_atomic_block
+    ejecutadas = 0
+    try:
+        while not detener.is_set():
+            if propia:
+                close_old_connections()
+            liberar_vencidas()
+            tarea = tomar(nombre)
+            if tarea is None:
+                if una_vez:
+                    break
+                detener.wait(espera)
+                continue
+            ejecutar(tarea)
+            ejecutadas += 1
+    finally:
+        if propia:
+            connection.close()
+    return ejecutadas
+
+
+def trabajar_con_hilos(nombre, hilos, detener, una_vez=False, espera=1.0):
+    if hilos == 1:
+        return trabajar(nombre, detener, una_vez, espera)
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        futuros = [pool.submit(trabajar, f'{nombre}-{i}', detener, una_vez, espera) for i in range(hilos)]
+        try:
+            return sum(futuro.result() for futuro in futuros)
+        except KeyboardInterrupt:
+            # Antes de salir del with, que espera a que los hilos terminen su tarea en curso
+            detener.set()
+            raise
+
+
+_detener_proceso = None
+
+
+def iniciar_proceso(detener):
+    """Inicializador de cada proceso del grupo: el Ctrl+C lo atiende el proceso principal."""
+    global _detener_proceso
+    import django
+    django.setup()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _detener_proceso = detener
+
+
+def trabajar_en_proceso(hilos, una_vez=False, espera=1.0):
+    return trabajar_con_hilos(nombre_trabajador(), hilos, _detener_proceso, una_vez, espera)
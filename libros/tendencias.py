@@ -0,0 +1,74 @@
+"""Libros y géneros con más calificaciones recientes.
+
+``libros.agregados`` mantiene, en cada alta, cambio o baja, una fila por
+libro (``ActividadLibro``) y por género (``ActividadGenero``) para cada hora y
+cada día con calificaciones: cantidad, suma e histograma de las calificaciones
+cuya ``fecha`` cae en ese período. Las tendencias suman solo esas filas, sin
+recorrer la tabla de calificaciones. Las filas por hora se conservan
+``TENDENCIAS_RETENCION_HORAS`` horas; las diarias, siempre.
+"""
+import re
+from datetime import timedelta
+
+from django.db.models import FloatField, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .agregados import CAMPOS_ESTRELLAS, HORA, DIA, inicios, retencion_horas
+from .models import ActividadLibro, ActividadGenero
+
+VENTANA = re.compile(r'(\d+)([hd])')
+MAXIMO_DIAS = 3650
+
+
+def ventana(texto, ahora=None):
+    """Convierte ``'24h'`` o ``'7d'`` en ``(granularidad, desde)``.
+
+    La ventana incluye la hora (o el día) en curso: ``7d`` son hoy y los seis
+    días anteriores. Lanza ``ValueError`` si el texto no es válido.
+    """
+    coincidencia = VENTANA.fullmatch(texto or '')
+    if coincidencia is None:
+        raise ValueError('Debe ser un número de horas o días, por ejemplo 24h o 7d.')
+    cantidad, unidad = int(coincidencia.group(1)), coincidencia.group(2)
+    if cantidad < 1:
+        raise ValueError('Debe ser mayor que cero.')
+    actual = inicios(ahora or timezone.now())
+    if unidad == 'h':
+        if cantidad > retencion_horas():
+            raise ValueError(f'Solo se guardan las últimas {retencion_horas()} horas; usa días.')
+        return HORA, actual[HORA] - timedelta(hours=cantidad - 1)
+    return DIA, actual[DIA] - timedelta(days=min(cantidad, MAXIMO_DIAS) - 1)
+
+
+def _sumar(filas, campo, n):
+    return list(
+        filas.values(campo).annotate(
+            votos=Sum('cantidad_calificaciones'),
+            suma=Sum('suma_puntuaciones'),
+            **{campo_estrella: Sum(campo_estrella) for campo_estrella in CAMPOS_ESTRELLAS},
+        ).annotate(
+            promedio=Cast('suma', FloatField()) / Cast('votos', FloatField()),
+        ).order_by('-votos', '-promedio', campo)[:n]
+    )
+
+
+def _resultado(fila):
+    return {
+        'votos': fila['votos'],
+        'promedio': round(fila['promedio'], 4),
+        'histograma': [fila[campo] for campo in CAMPOS_ESTRELLAS],
+    }
+
+
+def libros(granularidad, desde, n=10, genero=None):
+    """``[(libro_id, {votos, promedio, histograma})]`` de los libros con más calificaciones desde ``desde``."""
+    filas = ActividadLibro.objects.filter(granularidad=granularidad, inicio__gte=desde)
+    if genero is not None:
+        filas = filas.filter(libro__genero_id=genero)
+    return [(fila['libro_id'], _resultado(fila)) for fila in _sumar(filas, 'libro_id', n)]
+
+
+def generos(granularidad, desde, n=10):
+    filas = ActividadGenero.objects.filter(granularidad=granularidad, inicio__gte=desde)
+    return [(fila['genero_id'], _resultado(fila)) for fila in _sumar(filas, 'genero_id', n)]
@@ -1,3 +1,1415 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_finished, request_started
+from django.db import IntegrityError, close_old_connections, connection
+from django.db.models import Avg, Count, Sum
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import agregados, analitica, cache, matrices, metricas, ranking, recomendador, tareas
+from .models import (
+    Genero, Autor, Libro, Calificacion, PosicionRanking, UsuarioGenero, ActividadLibro, ActividadGenero, Tarea,
+)
+from .serializers import LibroSerializer, CalificacionSerializer
+
+
+class DatosBaseMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = [
+            User.objects.create_user(username=f'usuario{i}', password='clave')
+            for i in range(3)
+        ]
+        cls.generos = [Genero.objects.create(nombre=f'Género {i}') for i in range(3)]
+        cls.autores = [
+            Autor.objects.create(nombre=f'Autor {i}', nacionalidad='Paraguaya')
+            for i in range(4)
+        ]
+        cls.libros = [
+            Libro.objects.create(
+                titulo=f'Libro {i}',
+                autor=cls.autores[i % len(cls.autores)],
+                genero=cls.generos[i % len(cls.generos)],
+                fecha_de_lanzamiento=date(1990 + i, 1, 1),
+                url_del_libro=f'https://example.com/libro-{i}',
+            )
+            for i in range(12)
+        ]
+        for i, libro in enumerate(cls.libros):
+            for j, usuario in enumerate(cls.usuarios):
+                if (i + j) % 2 == 0:
+                    Calificacion.objects.create(libro=libro, usuario=usuario, puntuacion=(i + j) % 5 + 1)
+        agregados.recalcular_agregados()
+
+    def setUp(self):
+        cache.obtener_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuarios[0])
+
+    def assertAgregadosConsistentes(self):
+        for modelo, filtro in ((Libro, 'libro'), (Autor, 'libro__autor'), (Genero, 'libro__genero')):
+            for objeto in modelo.objects.all():
+                calificaciones = Calificacion.objects.filter(**{filtro: objeto})
+                esperado = calificaciones.aggregate(suma=Sum('puntuacion'), cantidad=Count('id'))
+                self.assertEqual(objeto.cantidad_calificaciones, esperado['cantidad'])
+                self.assertEqual(objeto.suma_puntuaciones, esperado['suma'] or 0)
+                histograma = [0] * 5
+                for puntuacion in calificaciones.values_list('puntuacion', flat=True):
+                    histograma[agregados.estrellas(puntuacion) - 1] += 1
+                self.assertEqual(objeto.histograma, histograma)
+
+        # La matriz usuario x género tiene exactamente las celdas con calificaciones
+        esperadas = {
+            (fila['usuario_id'], fila['libro__genero_id']): (fila['suma'], fila['cantidad'])
+            for fila in Calificacion.objects.values('usuario_id', 'libro__genero_id')
+            .annotate(suma=Sum('puntuacion'), cantidad=Count('id'))
+        }
+        celdas = {
+            (usuario_id, genero_id): (suma, cantidad)
+            for usuario_id, genero_id, suma, cantidad in UsuarioGenero.objects.values_list(
+                'usuario_id', 'genero_id', 'suma_puntuaciones', 'cantidad_calificaciones')
+        }
+        self.assertEqual(celdas, esperadas)
+
+        # Actividad por hora (dentro de la retención) y por día de la fecha de cada calificación
+        primera_hora = agregados.inicios(timezone.now())[agregados.HORA] - timedelta(hours=agregados.retencion_horas() - 1)
+        for modelo, campo in ((ActividadLibro, 'libro_id'), (ActividadGenero, 'genero_id')):
+            esperadas = {}
+            for duenio, puntuacion, fecha in Calificacion.objects.filter(fecha__isnull=False).values_list(
+                    'libro_id' if modelo is ActividadLibro else 'libro__genero_id', 'puntuacion', 'fecha'):
+                for granularidad, inicio in agregados.inicios(fecha).items():
+                    if granularidad == agregados.HORA and inicio < primera_hora:
+                        continue
+                    suma, cantidad, histograma = esperadas.get((duenio, granularidad, inicio), (0, 0, [0] * 5))
+                    histograma = list(histograma)
+                    histograma[agregados.estrellas(puntuacion) - 1] += 1
+                    esperadas[(duenio, granularidad, inicio)] = (suma + puntuacion, cantidad + 1, histograma)
+            filas = {
+                (getattr(fila, campo), fila.granularidad, fila.inicio):
+                    (fila.suma_puntuaciones, fila.cantidad_calificaciones, fila.histograma)
+                for fila in modelo.objects.all()
+            }
+            self.assertEqual(filas, esperadas)
+
+
+class ConsultasPorEndpointTests(DatosBaseMixin, TestCase):
+    """Fija la cantidad de consultas SQL de cada endpoint para detectar N+1."""
+
+    def test_listar_libros(self):
+        with self.assertNumQueries(1):
+            respuesta = self.client.get('/api/libros/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.json()['results']), len(self.libros))
+
+    def test_listar_libros_no_crece_con_el_catalogo(self):
+        for i in range(20):
+            Libro.objects.create(
+                titulo=f'Extra {i}', autor=self.autores[0], genero=self.generos[0],
+                fecha_de_lanzamiento=date(2000, 1, 1), url_del_libro='https://example.com/extra',
+            )
+        with self.assertNumQueries(1):
+            self.client.get('/api/libros/')
+
+    def test_obtener_libro(self):
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(f'/api/libros/{self.libros[0].pk}/')
+        self.assertEqual(respuesta.json()['autor']['nombre'], self.libros[0].autor.nombre)
+
+    def test_listar_generos(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/generos/')
+
+    def test_listar_autores(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/autores/')
+
+    def test_listar_calificaciones(self):
+        with self.assertNumQueries(1):
+            respuesta = self.client.get('/api/calificaciones/')
+        self.assertEqual(len(respuesta.json()['results']), Calificacion.objects.count())
+
+    def test_obtener_calificacion(self):
+        calificacion = Calificacion.objects.first()
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(f'/api/calificaciones/{calificacion.pk}/')
+        self.assertEqual(respuesta.json()['usuario'], calificacion.usuario.username)
+
+
+class PaginacionTests(DatosBaseMixin, TestCase):
+    def recorrer(self, url):
+        vistos = []
+        while url:
+            with self.assertNumQueries(1):
+                respuesta = self.client.get(url)
+            datos = respuesta.json()
+            vistos.extend(item['id'] for item in datos['results'])
+            url = datos['next']
+        return vistos
+
+    def test_cursor_recorre_todo_el_catalogo_en_orden(self):
+        vistos = self.recorrer('/api/libros/?page_size=5')
+        self.assertEqual(vistos, sorted(libro.pk for libro in self.libros))
+
+    def test_cursor_en_calificaciones(self):
+        vistos = self.recorrer('/api/calificaciones/?page_size=4')
+        self.assertEqual(vistos, list(Calificacion.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_page_size_tiene_tope(self):
+        respuesta = self.client.get('/api/generos/?page_size=100000')
+        self.assertEqual(len(respuesta.json()['results']), len(self.generos))
+
+
+class CamposDinamicosTests(DatosBaseMixin, TestCase):
+    def test_fields_limita_las_columnas(self):
+        respuesta = self.client.get('/api/libros/?fields=id,titulo')
+        for item in respuesta.json()['results']:
+            self.assertEqual(set(item), {'id', 'titulo'})
+
+    def test_fields_incluye_relacion_anidada(self):
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(f'/api/libros/{self.libros[0].pk}/?fields=id,autor')
+        self.assertEqual(set(respuesta.json()), {'id', 'autor'})
+        self.assertEqual(respuesta.json()['autor']['id'], self.libros[0].autor_id)
+
+    def test_fields_en_calificaciones(self):
+        respuesta = self.client.get('/api/calificaciones/?fields=libro_id,puntuacion')
+        for item in respuesta.json()['results']:
+            self.assertEqual(set(item), {'libro_id', 'puntuacion'})
+
+    def test_fields_no_afecta_escrituras(self):
+        respuesta = self.client.post('/api/libros/?fields=id', {
+            'titulo': 'Nuevo', 'autor_id': self.autores[0].pk, 'genero_id': self.generos[0].pk,
+            'fecha_de_lanzamiento': '2001-01-01', 'url_del_libro': 'https://example.com/nuevo',
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.json()['titulo'], 'Nuevo')
+
+
+class ExportacionTests(DatosBaseMixin, TestCase):
+    def leer_ndjson(self, respuesta):
+        self.assertEqual(respuesta['Content-Type'], 'application/x-ndjson')
+        contenido = b''.join(respuesta.streaming_content).decode()
+        return [json.loads(linea) for linea in contenido.splitlines()]
+
+    def test_exportar_libros_mantiene_el_formato_de_la_api(self):
+        with self.assertNumQueries(1):
+            filas = self.leer_ndjson(self.client.get('/api/libros/export/'))
+        self.assertEqual(len(filas), len(self.libros))
+        detalle = self.client.get(f'/api/libros/{filas[0]["id"]}/').json()
+        self.assertEqual(filas[0], detalle)
+
+    def test_exportar_calificaciones(self):
+        with self.assertNumQueries(1):
+            filas = self.leer_ndjson(self.client.get('/api/calificaciones/export/'))
+        self.assertEqual(len(filas), Calificacion.objects.count())
+        detalle = self.client.get(f'/api/calificaciones/{filas[-1]["id"]}/').json()
+        self.assertEqual(filas[-1], detalle)
+
+    def test_exportar_requiere_autenticacion(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/libros/export/').status_code, 401)
+
+
+class AgregadosTests(DatosBaseMixin, TestCase):
+    def test_estrellas_redondea_a_la_mas_cercana(self):
+        casos = {'1.0': 1, '1.4': 1, '1.5': 2, '2.4': 2, '3.5': 4, '4.4': 4, '4.5': 5, '5.0': 5}
+        for puntuacion, estrella in casos.items():
+            self.assertEqual(agregados.estrellas(Decimal(puntuacion)), estrella)
+
+    def test_recalcular_coincide_con_la_agregacion_directa(self):
+        self.assertAgregadosConsistentes()
+        promedios = dict(Libro.objects.con_promedio().values_list('id', 'promedio'))
+        for libro_id, promedio in Libro.objects.annotate(p=Avg('calificaciones__puntuacion')).values_list('id', 'p'):
+            if promedio is None:
+                self.assertIsNone(promedios[libro_id])
+            else:
+                self.assertAlmostEqual(promedios[libro_id], float(promedio))
+
+    def test_crear_actualizar_y_borrar_calificacion(self):
+        libro = Libro.objects.filter(cantidad_calificaciones=0).first() or self.libros[1]
+        usuario = User.objects.create_user(username='nuevo', password='clave')
+        self.client.force_authenticate(usuario)
+        respuesta = self.client.post('/api/calificaciones/', {'libro_id': libro.pk, 'puntuacion': '4.6'}, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertAgregadosConsistentes()
+
+        calificacion_id = respuesta.json()['id']
+        respuesta = self.client.put(f'/api/calificaciones/{calificacion_id}/',
+                                    {'libro_id': libro.pk, 'puntuacion': '2.0'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertAgregadosConsistentes()
+
+        otro = self.libros[5] if libro != self.libros[5] else self.libros[6]
+        self.client.put(f'/api/calificaciones/{calificacion_id}/', {'libro_id': otro.pk, 'puntuacion': '3.0'}, format='json')
+        self.assertAgregadosConsistentes()
+
+        self.assertEqual(self.client.delete(f'/api/calificaciones/{calificacion_id}/').status_code, 204)
+        self.assertAgregadosConsistentes()
+
+    def test_mover_y_borrar_libro_actualiza_autor_y_genero(self):
+        libro = self.libros[0]
+        self.client.put(f'/api/libros/{libro.pk}/', {
+            'titulo': libro.titulo, 'autor_id': self.autores[1].pk, 'genero_id': self.generos[2].pk,
+            'fecha_de_lanzamiento': '1990-01-01', 'url_del_libro': libro.url_del_libro,
+        }, format='json')
+        self.assertAgregadosConsistentes()
+        self.client.delete(f'/api/libros/{libro.pk}/')
+        self.assertAgregadosConsistentes()
+
+    def test_borrar_autor_actualiza_generos(self):
+        respuesta = self.client.delete(f'/api/autores/{self.autores[1].pk}/')
+        self.assertEqual(respuesta.status_code, 204)
+        self.assertFalse(Libro.objects.filter(autor_id=self.autores[1].pk).exists())
+        self.assertAgregadosConsistentes()
+
+    def test_borrar_genero_actualiza_autores(self):
+        respuesta = self.client.delete(f'/api/generos/{self.generos[1].pk}/')
+        self.assertEqual(respuesta.status_code, 204)
+        self.assertFalse(Libro.objects.filter(genero_id=self.generos[1].pk).exists())
+        self.assertAgregadosConsistentes()
+
+    def test_comando_recalcular_agregados(self):
+        Libro.objects.update(cantidad_calificaciones=0, suma_puntuaciones=0)
+        Genero.objects.update(estrellas_3=99)
+        call_command('recalcular_agregados', stdout=StringIO())
+        self.assertAgregadosConsistentes()
+
+    def test_recomendar_libros_usa_los_agregados(self):
+        salida = StringIO()
+        with self.assertNumQueries(4):
+            call_command('recomendar_libros', genero=self.generos[0].pk, stdout=salida)
+        self.assertIn(self.libros[0].titulo, salida.getvalue())
+
+
+class AltaCalificacionTests(DatosBaseMixin, TestCase):
+    def test_calificacion_repetida_responde_400(self):
+        calificacion = Calificacion.objects.filter(usuario=self.usuarios[0]).first()
+        respuesta = self.client.post('/api/calificaciones/', {'libro_id': calificacion.libro_id, 'puntuacion': '2.5'},
+                                     format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['detail'], 'Ya has calificado este libro.')
+        calificacion.refresh_from_db()
+        self.assertNotEqual(calificacion.puntuacion, Decimal('2.5'))
+        self.assertAgregadosConsistentes()
+
+    def test_reemplazar_mi_calificacion(self):
+        calificacion = Calificacion.objects.filter(usuario=self.usuarios[0]).first()
+        respuesta = self.client.post('/api/calificaciones/?reemplazar=true',
+                                     {'libro_id': calificacion.libro_id, 'puntuacion': '2.5'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['id'], calificacion.pk)
+        calificacion.refresh_from_db()
+        self.assertEqual(calificacion.puntuacion, Decimal('2.5'))
+        self.assertAgregadosConsistentes()
+
+        sin_calificar = Libro.objects.exclude(calificaciones__usuario=self.usuarios[0]).first()
+        respuesta = self.client.post('/api/calificaciones/?reemplazar=true',
+                                     {'libro_id': sin_calificar.pk, 'puntuacion': '4.0'}, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertAgregadosConsistentes()
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class AltaCalificacionConcurrenteTests(DatosBaseMixin, TransactionTestCase):
+    """Peticiones simultáneas sobre la misma calificación (y refrescos del ranking), cada una en su propia conexión.
+
+    Necesita una base de prueba que acepte varias conexiones (PostgreSQL, no
+    SQLite en memoria).
+    """
+    HILOS = 8
+
+    def setUp(self):
+        self.setUpTestData()
+        super().setUp()
+        self.usuario = User.objects.create_user(username='concurrente', password='clave')
+        self.libro = self.libros[1]
+
+    def peticiones_simultaneas(self, ruta, metodo='post'):
+        barrera = threading.Barrier(self.HILOS)
+        estados = []
+
+        def peticion(i):
+            cliente = APIClient()
+            cliente.force_authenticate(self.usuario)
+            try:
+                barrera.wait()
+                respuesta = getattr(cliente, metodo)(
+                    ruta, {'libro_id': self.libro.pk, 'puntuacion': f'{i % 5 + 1}.0'}, format='json',
+                )
+                estados.append(respuesta.status_code)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=peticion, args=(i,)) for i in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return sorted(estados)
+
+    def test_una_sola_alta_gana(self):
+        estados = self.peticiones_simultaneas('/api/calificaciones/')
+        self.assertEqual(estados, [201] + [400] * (self.HILOS - 1))
+        self.assertEqual(Calificacion.objects.filter(usuario=self.usuario, libro=self.libro).count(), 1)
+        self.assertAgregadosConsistentes()
+
+    def test_reemplazos_simultaneos_mantienen_los_agregados(self):
+        estados = self.peticiones_simultaneas('/api/calificaciones/?reemplazar=true')
+        self.assertEqual(estados, [200] * (self.HILOS - 1) + [201])
+        self.assertEqual(Calificacion.objects.filter(usuario=self.usuario, libro=self.libro).count(), 1)
+        self.assertAgregadosConsistentes()
+
+    def test_ediciones_simultaneas_mantienen_los_agregados(self):
+        calificacion = Calificacion.objects.create(libro=self.libro, usuario=self.usuario, puntuacion=3)
+        agregados.recalcular_agregados()
+        estados = self.peticiones_simultaneas(f'/api/calificaciones/{calificacion.pk}/', 'put')
+        self.assertEqual(estados, [200] * self.HILOS)
+        self.assertAgregadosConsistentes()
+
+    def test_bajas_simultaneas_restan_una_sola_vez(self):
+        calificacion = Calificacion.objects.create(libro=self.libro, usuario=self.usuario, puntuacion=3)
+        agregados.recalcular_agregados()
+        estados = self.peticiones_simultaneas(f'/api/calificaciones/{calificacion.pk}/', 'delete')
+        self.assertIn(204, estados)
+        self.assertTrue(set(estados) <= {204, 404})
+        self.assertFalse(Calificacion.objects.filter(pk=calificacion.pk).exists())
+        self.assertAgregadosConsistentes()
+
+    def test_refrescos_simultaneos_no_duplican_posiciones(self):
+        barrera = threading.Barrier(self.HILOS)
+
+        def refrescar():
+            try:
+                barrera.wait()
+                ranking.refrescar_ranking()
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=refrescar) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        repetidas = PosicionRanking.objects.values('genero_id', 'posicion').annotate(n=Count('id')).filter(n__gt=1)
+        self.assertFalse(repetidas.exists())
+        self.assertEqual(PosicionRanking.objects.count(), ranking.refrescar_ranking())
+
+
+class LecturaPlanaTests(DatosBaseMixin, TestCase):
+    def test_listados_iguales_al_serializer(self):
+        libros = Libro.objects.select_related('autor', 'genero').order_by('-cantidad_calificaciones', 'id')[:5]
+        respuesta = self.client.get('/api/libros/?ordering=-votos&page_size=5')
+        self.assertEqual(respuesta.json()['results'], LibroSerializer(libros, many=True).data)
+
+        calificaciones = Calificacion.objects.select_related('usuario').order_by('id')
+        respuesta = self.client.get('/api/calificaciones/?page_size=1000')
+        self.assertEqual(respuesta.json()['results'], CalificacionSerializer(calificaciones, many=True).data)
+
+    def test_fields_y_cursor_con_lectura_plana(self):
+        respuesta = self.client.get('/api/libros/?fields=id,genero&ordering=promedio&page_size=4').json()
+        self.assertEqual(set(respuesta['results'][0]), {'id', 'genero'})
+        siguiente = self.client.get(respuesta['next']).json()
+        ids = [libro['id'] for libro in respuesta['results'] + siguiente['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_comando_comparar_serializadores(self):
+        salida = StringIO()
+        call_command('comparar_serializadores', filas=[50], repeticiones=1, stdout=salida)
+        self.assertIn('calificaciones', salida.getvalue())
+
+
+class GenerarCalificacionesTests(DatosBaseMixin, TestCase):
+    def test_genera_en_lotes_sin_duplicar(self):
+        Calificacion.objects.all().delete()
+        call_command('generar_calificaciones', min=1, max=3, lote=7, semilla=1, stdout=StringIO())
+        cantidad = Calificacion.objects.count()
+        self.assertGreaterEqual(cantidad, len(self.libros))
+        self.assertLessEqual(cantidad, len(self.libros) * 3)
+
+        call_command('generar_calificaciones', min=3, max=3, lote=5, semilla=1, stdout=StringIO())
+        self.assertEqual(
+            Calificacion.objects.values('libro', 'usuario').distinct().count(),
+            Calificacion.objects.count(),
+        )
+        self.assertEqual(Libro.objects.aggregate(t=Sum('cantidad_calificaciones'))['t'], Calificacion.objects.count())
+
+    def test_carga_desde_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as archivo:
+            archivo.write('libro_id,usuario_id,puntuacion\n')
+            archivo.write(f'{self.libros[0].pk},{self.usuarios[1].pk},3.5\n')
+            archivo.write(f'{self.libros[1].pk},{self.usuarios[1].pk},4.0\n')
+        self.addCleanup(os.remove, archivo.name)
+        antes = Calificacion.objects.count()
+        call_command('generar_calificaciones', archivo=archivo.name, borrar=True, stdout=StringIO())
+        self.assertEqual(Calificacion.objects.count(), 2)
+        self.assertNotEqual(antes, 2)
+        self.libros[1].refresh_from_db()
+        self.assertEqual(self.libros[1].cantidad_calificaciones, 1)
+
+    def test_csv_con_filas_invalidas(self):
+        valida = f'{self.libros[0].pk},{self.usuarios[1].pk},3.5'
+        casos = [
+            (f'999999,{self.usuarios[1].pk},3.0', 'Línea 3: no existe libro_id=999999.'),
+            (f'{self.libros[1].pk},999999,3.0', 'Línea 3: no existe usuario_id=999999.'),
+            (f'{self.libros[1].pk},{self.usuarios[1].pk},7.0', 'Línea 3: la puntuación debe ir de 1.0 a 5.0'),
+            (f'{self.libros[1].pk},{self.usuarios[1].pk},x', 'Línea 3: fila inválida'),
+            (f'{self.libros[1].pk}', 'Línea 3: fila inválida'),
+            (f'{2 ** 64},{self.usuarios[1].pk},3.0', 'Línea 3: fila inválida'),
+        ]
+        for fila, mensaje in casos:
+            with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as archivo:
+                archivo.write(f'libro_id,usuario_id,puntuacion\n{valida}\n{fila}\n')
+            self.addCleanup(os.remove, archivo.name)
+            with self.subTest(fila=fila), self.assertRaisesMessage(CommandError, mensaje):
+                call_command('generar_calificaciones', archivo=archivo.name, borrar=True, lote=1, stdout=StringIO())
+            # El primer lote quedó guardado y los agregados lo incluyen
+            self.assertEqual(Calificacion.objects.count(), 1)
+            self.assertAgregadosConsistentes()
+
+    def test_fechas_repartidas_en_dias(self):
+        Calificacion.objects.all().delete()
+        call_command('generar_calificaciones', min=2, max=3, dias=10, semilla=1, stdout=StringIO())
+        fechas = list(Calificacion.objects.values_list('fecha', flat=True))
+        self.assertTrue(all(timezone.now() - timedelta(days=10) <= fecha <= timezone.now() for fecha in fechas))
+        self.assertGreater(len({fecha.date() for fecha in fechas}), 1)
+        self.assertAgregadosConsistentes()
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY solo existe en PostgreSQL')
+    def test_copy_en_varios_lotes_dentro_de_una_transaccion(self):
+        Calificacion.objects.all().delete()
+        call_command('generar_calificaciones', copy=True, min=1, max=3, lote=5, semilla=1, stdout=StringIO())
+        self.assertGreater(Calificacion.objects.count(), 5)
+        self.assertAgregadosConsistentes()
+
+    def test_opciones_invalidas(self):
+        casos = [
+            ({'min': 5, 'max': 2}, '--min no puede ser mayor que --max.'),
+            ({'min': -1}, '--min y --max no pueden ser negativos.'),
+            ({'lote': 0}, '--lote debe ser mayor que cero.'),
+            ({'dias': -3}, '--dias no puede ser negativo.'),
+        ]
+        for opciones, mensaje in casos:
+            with self.subTest(**opciones), self.assertRaisesMessage(CommandError, mensaje):
+                call_command('generar_calificaciones', stdout=StringIO(), **opciones)
+
+
+class LotesTests(DatosBaseMixin, TestCase):
+    def libro_nuevo(self, i, autor=None):
+        return {
+            'titulo': f'Lote {i}', 'autor_id': autor or self.autores[i % 4].pk,
+            'genero_id': self.generos[i % 3].pk, 'fecha_de_lanzamiento': '2010-05-01',
+            'url_del_libro': f'https://example.com/lote-{i}',
+        }
+
+    def test_crear_libros_en_lote_con_consultas_constantes(self):
+        lote = [self.libro_nuevo(i) for i in range(50)]
+        with self.assertNumQueries(3):
+            respuesta = self.client.post('/api/libros/bulk/', lote, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.json()['creados'], 50)
+        self.assertEqual(Libro.objects.filter(titulo__startswith='Lote').count(), 50)
+
+    def test_errores_por_objeto(self):
+        lote = [self.libro_nuevo(0), self.libro_nuevo(1, autor=999999), {'titulo': 'Incompleto'}]
+        respuesta = self.client.post('/api/libros/bulk/', lote, format='json')
+        self.assertEqual(respuesta.status_code, 207)
+        datos = respuesta.json()
+        self.assertEqual(datos['creados'], 1)
+        self.assertEqual([error['indice'] for error in datos['errores']], [1, 2])
+        self.assertIn('autor_id', datos['errores'][0]['errores'])
+
+    def test_lote_debe_ser_lista(self):
+        respuesta = self.client.post('/api/libros/bulk/', self.libro_nuevo(0), format='json')
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_calificaciones_en_lote_hacen_upsert(self):
+        usuario = self.usuarios[0]
+        existente = Calificacion.objects.filter(usuario=usuario).first()
+        sin_calificar = Libro.objects.exclude(calificaciones__usuario=usuario)[:3]
+        lote = [{'libro_id': existente.libro_id, 'puntuacion': '1.0'}]
+        lote += [{'libro_id': libro.pk, 'puntuacion': '4.5'} for libro in sin_calificar]
+        respuesta = self.client.post('/api/calificaciones/bulk/', lote, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.json()['creadas'], 3)
+        self.assertEqual(respuesta.json()['actualizadas'], 1)
+        existente.refresh_from_db()
+        self.assertEqual(existente.puntuacion, Decimal('1.0'))
+        self.assertAgregadosConsistentes()
+
+    def test_calificaciones_en_lote_informa_repetidos_e_invalidos(self):
+        lote = [
+            {'libro_id': self.libros[1].pk, 'puntuacion': '2.0'},
+            {'libro_id': self.libros[1].pk, 'puntuacion': '3.0'},
+            {'libro_id': 999999, 'puntuacion': '3.0'},
+        ]
+        respuesta = self.client.post('/api/calificaciones/bulk/', lote, format='json')
+        self.assertEqual(respuesta.status_code, 207)
+        self.assertEqual([error['indice'] for error in respuesta.json()['errores']], [2])
+        self.assertEqual([aviso['indice'] for aviso in respuesta.json()['avisos']], [0])
+        self.assertEqual(
+            Calificacion.objects.get(usuario=self.usuarios[0], libro=self.libros[1]).puntuacion,
+            Decimal('3.0'),
+        )
+
+    def test_ids_no_enteros_en_el_lote(self):
+        libro = self.libros[1]
+        lote = [{'libro_id': valor, 'puntuacion': '3.0'}
+                for valor in (libro.pk + 0.9, True, f'{libro.pk}.9', 2 ** 64, float(libro.pk))]
+        respuesta = self.client.post('/api/calificaciones/bulk/', lote, format='json')
+        self.assertEqual(respuesta.status_code, 207)
+        self.assertEqual([error['indice'] for error in respuesta.json()['errores']], [0, 1, 2, 3])
+        self.assertEqual(respuesta.json()['creadas'] + respuesta.json()['actualizadas'], 1)
+
+        respuesta = self.client.post('/api/calificaciones/', {'libro_id': libro.pk + 0.9, 'puntuacion': '3.0'},
+                                     format='json')
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_calificaciones_en_lote_con_repetidos_y_sin_errores(self):
+        lote = [{'libro_id': self.libros[1].pk, 'puntuacion': '2.0'},
+                {'libro_id': self.libros[1].pk, 'puntuacion': '3.0'}]
+        respuesta = self.client.post('/api/calificaciones/bulk/', lote, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.json()['errores'], [])
+        self.assertEqual([aviso['indice'] for aviso in respuesta.json()['avisos']], [0])
+
+
+class ReporteLibrosTests(DatosBaseMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+
+    def generar(self, *args):
+        salida = StringIO()
+        call_command('reporte_libros', '--output-dir', self.output_dir, *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_only_genera_solo_los_graficos_pedidos(self):
+        self.generar('--only', '1', '3')
+        self.assertEqual(
+            sorted(f for f in os.listdir(self.output_dir) if f.endswith('.png')),
+            ['1_libros_por_genero.png', '3_libros_mas_calificados.png'],
+        )
+
+    def test_incremental_omite_graficos_sin_cambios(self):
+        self.generar('--only', '1', '3')
+        salida = self.generar('--only', '1', '3', '--incremental')
+        self.assertIn('0 gráficos generados', salida)
+
+        Calificacion.objects.filter(libro=self.libros[2]).delete()
+        agregados.recalcular_agregados()
+        salida = self.generar('--only', '1', '3', '--incremental')
+        self.assertIn('1 gráficos generados: [3]', salida)
+
+    def test_incremental_no_carga_los_datos_si_las_tablas_no_cambiaron(self):
+        self.generar('--only', '1', '8')
+        # Solo las consultas agregadas de la clave rápida
+        with self.assertNumQueries(5):
+            salida = self.generar('--only', '1', '8', '--incremental')
+        self.assertIn('0 gráficos generados', salida)
+
+        calificacion = Calificacion.objects.filter(usuario=self.usuarios[0]).first()
+        respuesta = self.client.put(f'/api/calificaciones/{calificacion.pk}/',
+                                    {'libro_id': calificacion.libro_id, 'puntuacion': '4.5'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        # El gráfico 1 solo depende del catálogo: sigue sin cargarse; el 8 se carga (3 consultas) y se dibuja
+        with self.assertNumQueries(5 + 3):
+            salida = self.generar('--only', '1', '8', '--incremental')
+        self.assertIn('1 gráficos generados: [8]', salida)
+
+    def test_only_carga_solo_los_graficos_pedidos(self):
+        with self.assertNumQueries(5 + 1):
+            self.generar('--only', '3')
+
+    def test_mapas_de_calor_con_muestreo(self):
+        self.generar('--only', '8', '9', '--top', '2')
+        salida = self.generar('--only', '8', '9', '--top', '2', '--incremental')
+        self.assertIn('0 gráficos generados', salida)
+        # Cambiar el muestreo cambia el orden de filas y columnas: se vuelven a dibujar
+        salida = self.generar('--only', '8', '9', '--top', '3', '--muestreo', 'cluster', '--incremental')
+        self.assertIn('2 gráficos generados: [8, 9]', salida)
+
+
+class EstadisticasTests(DatosBaseMixin, TestCase):
+    def test_indice_lista_las_diez(self):
+        datos = self.client.get('/api/estadisticas/').json()
+        self.assertEqual(len(datos), 10)
+        for nombre, url in datos.items():
+            consultas = 3 if nombre.startswith('usuario-') else 1
+            with self.assertNumQueries(consultas):
+                self.assertEqual(self.client.get(url).status_code, 200, nombre)
+
+    def test_promedios_coinciden_con_el_orm(self):
+        datos = self.client.get('/api/estadisticas/promedio-genero/').json()
+        for fila in datos:
+            esperado = Calificacion.objects.filter(libro__genero_id=fila['id']).aggregate(p=Avg('puntuacion'))['p']
+            self.assertAlmostEqual(fila['prom'], float(esperado), places=4)
+
+        datos = self.client.get('/api/estadisticas/promedio-usuario/').json()
+        self.assertEqual([fila['username'] for fila in datos], [u.username for u in self.usuarios])
+        for fila in datos:
+            calificaciones = Calificacion.objects.filter(usuario_id=fila['id'])
+            self.assertEqual(fila['total'], calificaciones.count())
+            self.assertAlmostEqual(fila['prom'], float(calificaciones.aggregate(p=Avg('puntuacion'))['p']), places=4)
+
+    def test_mapa_de_calor_como_matriz(self):
+        datos = self.client.get('/api/estadisticas/usuario-libro/?n=3').json()
+        self.assertLessEqual(len(datos['libros']), 3)
+        self.assertLessEqual(len(datos['usuarios']), 3)
+        for titulo, fila in zip(datos['libros'], datos['valores']):
+            for username, valor in zip(datos['usuarios'], fila):
+                esperada = Calificacion.objects.filter(libro__titulo=titulo, usuario__username=username).first()
+                if esperada is None:
+                    self.assertIsNone(valor)
+                else:
+                    self.assertAlmostEqual(valor, float(esperada.puntuacion), places=4)
+        self.assertEqual(self.client.get('/api/estadisticas/usuario-libro/?muestreo=otro').status_code, 400)
+        self.assertEqual(self.client.get('/api/estadisticas/no-existe/').status_code, 404)
+
+    def test_cacheada_hasta_que_cambian_las_calificaciones(self):
+        url = '/api/estadisticas/libros-mas-calificados/?n=1'
+        primera = self.client.get(url).json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json(), primera)
+
+        libro = Libro.objects.order_by('cantidad_calificaciones', 'id').first()
+        for i in range(10):
+            usuario = User.objects.create_user(username=f'votante{i}', password='clave')
+            self.client.force_authenticate(usuario)
+            self.client.post('/api/calificaciones/', {'libro_id': libro.pk, 'puntuacion': '4.0'}, format='json')
+        self.assertEqual(self.client.get(url).json()[0]['id'], libro.pk)
+
+
+class TendenciasTests(DatosBaseMixin, TestCase):
+    def calificar_hace(self, libro, usuario, puntuacion, **tiempo):
+        calificacion = Calificacion.objects.create(libro=libro, usuario=usuario, puntuacion=puntuacion)
+        Calificacion.objects.filter(pk=calificacion.pk).update(fecha=timezone.now() - timedelta(**tiempo))
+
+    def test_ventanas_por_hora_y_por_dia(self):
+        Calificacion.objects.filter(libro=self.libros[3]).delete()
+        self.calificar_hace(self.libros[3], self.usuarios[0], 5, days=20)
+        self.calificar_hace(self.libros[3], self.usuarios[1], 4, days=3)
+        self.calificar_hace(self.libros[3], self.usuarios[2], 3, minutes=1)
+        agregados.recalcular_agregados()
+        self.assertAgregadosConsistentes()
+
+        votos = {}
+        for ventana in ('24h', '7d', '30d'):
+            respuesta = self.client.get(f'/api/libros/tendencias/?ventana={ventana}&n=100')
+            self.assertEqual(respuesta.status_code, 200)
+            votos[ventana] = {fila['libro']['id']: fila['votos'] for fila in respuesta.json()}
+        self.assertEqual([votos[v][self.libros[3].pk] for v in ('24h', '7d', '30d')], [1, 2, 3])
+        self.assertEqual(sum(votos['24h'].values()), Calificacion.objects.filter(
+            fecha__gte=timezone.now() - timedelta(days=1)).count())
+
+        primera = self.client.get('/api/libros/tendencias/?ventana=30d').json()[0]
+        self.assertEqual(primera['posicion'], 1)
+        self.assertEqual(sum(primera['histograma']), primera['votos'])
+        self.assertEqual(primera['libro'], self.client.get(f"/api/libros/{primera['libro']['id']}/").json())
+
+    def test_alta_cambio_y_baja_mantienen_la_actividad(self):
+        libro = self.libros[1]
+        Calificacion.objects.filter(libro=libro, usuario=self.usuarios[0]).delete()
+        agregados.recalcular_agregados()
+        respuesta = self.client.post('/api/calificaciones/', {'libro_id': libro.pk, 'puntuacion': '4.5'},
+                                     format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertIsNotNone(respuesta.json()['fecha'])
+        self.assertAgregadosConsistentes()
+
+        calificacion = respuesta.json()['id']
+        Calificacion.objects.filter(pk=calificacion).update(fecha=timezone.now() - timedelta(days=2))
+        agregados.recalcular_agregados([libro.pk])
+        respuesta = self.client.put(f'/api/calificaciones/{calificacion}/', {'libro_id': libro.pk, 'puntuacion': '2.0'},
+                                    format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertAgregadosConsistentes()
+        self.client.delete(f'/api/calificaciones/{calificacion}/')
+        self.assertAgregadosConsistentes()
+
+    def test_filtro_por_genero_y_tendencias_de_generos(self):
+        genero = self.generos[0]
+        respuesta = self.client.get(f'/api/libros/tendencias/?ventana=7d&genero={genero.pk}&n=100').json()
+        self.assertTrue(respuesta)
+        self.assertTrue(all(fila['libro']['genero']['id'] == genero.pk for fila in respuesta))
+
+        respuesta = self.client.get('/api/generos/tendencias/?ventana=7d').json()
+        self.assertEqual(
+            {fila['genero']['id']: fila['votos'] for fila in respuesta},
+            dict(Genero.objects.filter(cantidad_calificaciones__gt=0).values_list('id', 'cantidad_calificaciones')),
+        )
+        votos = [fila['votos'] for fila in respuesta]
+        self.assertEqual(votos, sorted(votos, reverse=True))
+
+    def test_ventana_invalida(self):
+        for ventana in ('7', 'semana', '0d', '1000h'):
+            respuesta = self.client.get(f'/api/libros/tendencias/?ventana={ventana}')
+            self.assertEqual(respuesta.status_code, 400, ventana)
+            self.assertIn('ventana', respuesta.json())
+        self.assertEqual(self.client.get('/api/libros/tendencias/?genero=x').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/libros/tendencias/?genero={2 ** 64}').status_code, 400)
+
+    def test_calificaciones_sin_fecha_no_cuentan(self):
+        Calificacion.objects.update(fecha=None)
+        agregados.recalcular_agregados()
+        self.assertFalse(ActividadLibro.objects.exists())
+        self.assertEqual(self.client.get('/api/libros/tendencias/').json(), [])
+
+    def test_poda_de_horas_viejas(self):
+        self.assertEqual(agregados.podar_actividad(forzar=True), 0)
+        ActividadLibro.objects.filter(granularidad=agregados.HORA).update(inicio=timezone.now() - timedelta(days=30))
+        self.assertGreater(agregados.podar_actividad(forzar=True), 0)
+        self.assertFalse(ActividadLibro.objects.filter(granularidad=agregados.HORA).exists())
+        self.assertTrue(ActividadLibro.objects.filter(granularidad=agregados.DIA).exists())
+
+
+class MatricesTests(DatosBaseMixin, TestCase):
+    def test_usuario_libro_lee_solo_la_muestra(self):
+        with self.assertNumQueries(3):
+            df = matrices.usuario_libro(n=2)
+        usuarios = list(matrices.usuarios_mas_activos(2).values())
+        libros = list(matrices.libros_mas_calificados(2).values())
+        self.assertLessEqual(len(df), 4)
+        self.assertTrue(set(df['usuario__username']) <= set(usuarios))
+        self.assertTrue(set(df['libro__titulo']) <= set(libros))
+        for fila in df.itertuples(index=False):
+            esperada = Calificacion.objects.get(libro__titulo=fila.libro__titulo, usuario__username=fila.usuario__username)
+            self.assertAlmostEqual(float(fila.puntuacion), float(esperada.puntuacion), places=5)
+
+    def test_usuario_genero_promedia_desde_la_matriz(self):
+        df = matrices.usuario_genero(n=10)
+        self.assertEqual(len(df), UsuarioGenero.objects.count())
+        for fila in df.itertuples(index=False):
+            esperado = Calificacion.objects.filter(
+                usuario__username=fila.usuario, libro__genero__nombre=fila.genero,
+            ).aggregate(p=Avg('puntuacion'))['p']
+            self.assertAlmostEqual(float(fila.puntuacion), float(esperado), places=5)
+        # En modo top las filas van de más a menos votos
+        totales = [Calificacion.objects.filter(usuario__username=u).count() for u in df['usuario'].cat.categories]
+        self.assertEqual(totales, sorted(totales, reverse=True))
+
+    def test_cluster_reordena_la_misma_muestra(self):
+        top = matrices.usuario_libro(n=10)
+        cluster = matrices.usuario_libro(n=10, muestreo='cluster')
+        for columna in ('libro__titulo', 'usuario__username'):
+            self.assertEqual(sorted(top[columna].cat.categories), sorted(cluster[columna].cat.categories))
+        self.assertEqual(len(top), len(cluster))
+
+
+class AnaliticaTests(DatosBaseMixin, TestCase):
+    def test_carga_en_una_consulta_con_tipos_compactos(self):
+        with self.assertNumQueries(1):
+            cal = analitica.cargar_calificaciones()
+        self.assertEqual(len(cal), Calificacion.objects.count())
+        self.assertEqual(str(cal['puntuacion'].dtype), 'float32')
+        self.assertEqual(str(cal['libro_id'].dtype), 'int64')
+
+    def test_coincide_con_el_orm(self):
+        cal = analitica.cargar_calificaciones(chunk_size=3).set_index(['libro_id', 'usuario_id'])
+        for c in Calificacion.objects.all():
+            self.assertAlmostEqual(float(cal.loc[(c.libro_id, c.usuario_id), 'puntuacion']), float(c.puntuacion),
+                                   places=5)
+
+    def test_tabla_vacia(self):
+        Calificacion.objects.all().delete()
+        self.assertTrue(analitica.cargar_calificaciones().empty)
+
+
+class RecomendadorTests(DatosBaseMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Calificacion.objects.all().delete()
+        # Quien disfruta el libro 0 también disfruta el 1; el 2 les gusta a otros
+        lectores = [User.objects.create_user(username=f'lector{i}') for i in range(6)]
+        for i, lector in enumerate(lectores):
+            if i < 4:
+                Calificacion.objects.create(libro=cls.libros[0], usuario=lector, puntuacion=5)
+                Calificacion.objects.create(libro=cls.libros[1], usuario=lector, puntuacion='4.5')
+                Calificacion.objects.create(libro=cls.libros[2], usuario=lector, puntuacion=1)
+            else:
+                Calificacion.objects.create(libro=cls.libros[2], usuario=lector, puntuacion=5)
+                Calificacion.objects.create(libro=cls.libros[3], usuario=lector, puntuacion=5)
+                Calificacion.objects.create(libro=cls.libros[0], usuario=lector, puntuacion=1)
+        agregados.recalcular_agregados()
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        ajuste = override_settings(RECOMENDADOR_INDICE=os.path.join(directorio, 'similitudes.npz'))
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def test_vecinos_por_coseno_ajustado(self):
+        libro_ids, vecinos, similitudes = recomendador.calcular_indice(k=3)
+        indice = recomendador.IndiceSimilitud(libro_ids, vecinos, similitudes)
+        parecidos = indice.similares(self.libros[0].pk)
+        self.assertEqual(parecidos[0][0], self.libros[1].pk)
+        self.assertNotIn(self.libros[0].pk, [libro_id for libro_id, _ in parecidos])
+        self.assertEqual(indice.similares(self.libros[11].pk), [])
+
+    def test_similares_sin_indice_responde_503(self):
+        respuesta = self.client.get(f'/api/libros/{self.libros[0].pk}/similares/')
+        self.assertEqual(respuesta.status_code, 503)
+
+    def test_similares_desde_el_indice(self):
+        call_command('calcular_similitudes', k=5, stdout=StringIO())
+        with self.assertNumQueries(2):
+            respuesta = self.client.get(f'/api/libros/{self.libros[0].pk}/similares/?n=1')
+        datos = respuesta.json()
+        self.assertEqual(len(datos), 1)
+        self.assertEqual(datos[0]['libro']['id'], self.libros[1].pk)
+        self.assertGreater(datos[0]['similitud'], 0)
+        self.assertEqual(self.client.get('/api/libros/999999/similares/').status_code, 404)
+
+    def test_recomendaciones_personalizadas(self):
+        call_command('calcular_similitudes', stdout=StringIO())
+        nuevo = User.objects.create_user(username='nuevo')
+        Calificacion.objects.create(libro=self.libros[0], usuario=nuevo, puntuacion=5)
+        Calificacion.objects.create(libro=self.libros[3], usuario=nuevo, puntuacion=2)
+        self.client.force_authenticate(nuevo)
+        with self.assertNumQueries(2):
+            datos = self.client.get('/api/recomendaciones/').json()
+        self.assertEqual(datos['origen'], 'colaborativo')
+        ids = [item['libro']['id'] for item in datos['results']]
+        self.assertEqual(ids[0], self.libros[1].pk)
+        self.assertNotIn(self.libros[0].pk, ids)
+
+    def test_recomendaciones_sin_historial_usa_populares(self):
+        nuevo = User.objects.create_user(username='nuevo')
+        self.client.force_authenticate(nuevo)
+        datos = self.client.get('/api/recomendaciones/?n=2').json()
+        self.assertEqual(datos['origen'], 'populares')
+        self.assertEqual(len(datos['results']), 2)
+
+    async def test_recomendaciones_async_desde_el_indice(self):
+        await sync_to_async(call_command)('calcular_similitudes', stdout=StringIO())
+        nuevo = await User.objects.acreate(username='nuevo')
+        await Calificacion.objects.acreate(libro=self.libros[0], usuario=nuevo, puntuacion=5)
+        await Calificacion.objects.acreate(libro=self.libros[3], usuario=nuevo, puntuacion=2)
+        respuesta = await self.async_client.get(
+            '/api/async/recomendaciones/', headers={'Authorization': f'Bearer {AccessToken.for_user(nuevo)}'},
+        )
+        datos = respuesta.json()
+        self.assertEqual(datos['origen'], 'colaborativo')
+        self.assertEqual(datos['results'][0]['libro']['id'], self.libros[1].pk)
+
+
+class RankingTests(DatosBaseMixin, TestCase):
+    def test_pocos_votos_no_superan_a_muchos(self):
+        filas = [(1, Decimal('5.0'), 1), (2, Decimal('4.8') * 500, 500), (3, 0, 0)]
+        clasificados = ranking.clasificar(filas, referencia=3.0, m=50)
+        self.assertEqual([libro_id for libro_id, *_ in clasificados], [2, 1])
+        self.assertAlmostEqual(clasificados[1][2], 5.0)
+        self.assertLess(clasificados[1][1], 3.1)
+
+    def test_refrescar_ranking_general_y_por_genero(self):
+        call_command('refrescar_ranking', stdout=StringIO())
+        calificados = Libro.objects.filter(cantidad_calificaciones__gt=0)
+        self.assertEqual(PosicionRanking.objects.filter(genero__isnull=True).count(), calificados.count())
+        for genero in self.generos:
+            posiciones = list(PosicionRanking.objects.filter(genero=genero).order_by('posicion'))
+            self.assertEqual([p.libro_id for p in posiciones],
+                             [libro_id for libro_id, *_ in ranking.mejores_libros(genero.pk, 100)])
+            self.assertTrue(all(p.libro.genero_id == genero.pk for p in posiciones))
+
+    def test_top_lee_las_posiciones_guardadas(self):
+        ranking.refrescar_ranking()
+        with self.assertNumQueries(1):
+            datos = self.client.get('/api/libros/top/?n=3').json()
+        self.assertEqual([item['posicion'] for item in datos], [1, 2, 3])
+        esperado = [libro_id for libro_id, *_ in ranking.mejores_libros(n=3)]
+        self.assertEqual([item['libro']['id'] for item in datos], esperado)
+
+        genero = self.generos[1]
+        datos = self.client.get(f'/api/libros/top/?genero={genero.pk}').json()
+        self.assertTrue(datos)
+        self.assertTrue(all(item['libro']['genero']['id'] == genero.pk for item in datos))
+        self.assertEqual(self.client.get('/api/libros/top/?genero=x').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/libros/top/?genero={2 ** 64}').status_code, 400)
+
+    def test_top_sin_ranking_lo_calcula(self):
+        datos = self.client.get('/api/libros/top/').json()
+        self.assertTrue(datos)
+        self.assertTrue(PosicionRanking.objects.exists())
+
+
+class CacheRespuestasTests(DatosBaseMixin, TestCase):
+    def test_segunda_lectura_sale_de_la_cache(self):
+        primera = self.client.get('/api/libros/?fields=id,titulo')
+        with self.assertNumQueries(0):
+            segunda = self.client.get('/api/libros/?fields=id,titulo')
+        self.assertEqual(primera.json(), segunda.json())
+        self.assertEqual(primera['ETag'], segunda['ETag'])
+        self.assertIn('Last-Modified', segunda)
+        # Otros parámetros son otra entrada
+        self.assertNotEqual(self.client.get('/api/libros/?fields=id')['ETag'], primera['ETag'])
+
+    def test_revalidacion_con_etag_y_last_modified(self):
+        respuesta = self.client.get(f'/api/generos/{self.generos[0].pk}/')
+        with self.assertNumQueries(0):
+            no_modificado = self.client.get(f'/api/generos/{self.generos[0].pk}/',
+                                            HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(no_modificado.status_code, 304)
+        self.assertEqual(no_modificado.content, b'')
+        no_modificado = self.client.get(f'/api/generos/{self.generos[0].pk}/',
+                                        HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified'])
+        self.assertEqual(no_modificado.status_code, 304)
+
+    def test_los_cambios_invalidan_las_respuestas(self):
+        etag = self.client.get('/api/libros/')['ETag']
+        self.client.put(f'/api/generos/{self.generos[0].pk}/', {'nombre': 'Renombrado'}, format='json')
+        respuesta = self.client.get('/api/libros/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('Renombrado', respuesta.content.decode())
+
+        etag = respuesta['ETag']
+        self.client.post('/api/libros/bulk/', [{
+            'titulo': 'Nuevo', 'fecha_de_lanzamiento': '2020-01-01', 'url_del_libro': 'https://example.com/n',
+            'autor_id': self.autores[0].pk, 'genero_id': self.generos[0].pk,
+        }], format='json')
+        self.assertEqual(self.client.get('/api/libros/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_calificar_invalida_los_listados_por_agregados(self):
+        libro = self.libros[0]
+        Calificacion.objects.filter(libro=libro).delete()
+        agregados.recalcular_agregados()
+        respuesta = self.client.get('/api/libros/?votos_min=1&page_size=100')
+        self.assertNotIn(libro.pk, [fila['id'] for fila in respuesta.json()['results']])
+        autores = self.client.get('/api/autores/')
+
+        respuesta_alta = self.client.post('/api/calificaciones/', {'libro_id': libro.pk, 'puntuacion': '4.0'},
+                                          format='json')
+        self.assertEqual(respuesta_alta.status_code, 201)
+        nueva = self.client.get('/api/libros/?votos_min=1&page_size=100', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(nueva.status_code, 200)
+        self.assertIn(libro.pk, [fila['id'] for fila in nueva.json()['results']])
+        # Los autores no muestran los agregados: su caché no se descarta
+        self.assertEqual(self.client.get('/api/autores/', HTTP_IF_NONE_MATCH=autores['ETag']).status_code, 304)
+
+    def test_no_cachea_errores(self):
+        self.assertEqual(self.client.get('/api/autores/999999/').status_code, 404)
+        autor = Autor.objects.create(nombre='Tardío', nacionalidad='Chilena')
+        self.assertEqual(self.client.get(f'/api/autores/{autor.pk}/').status_code, 200)
+
+
+class IndicesTests(DatosBaseMixin, TestCase):
+    def test_puntuacion_fuera_de_rango(self):
+        respuesta = self.client.post('/api/calificaciones/', {'libro_id': self.libros[1].pk, 'puntuacion': '6.0'},
+                                     format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('puntuacion', respuesta.json())
+
+    def test_explicar_consultas_compara_planes(self):
+        salida = StringIO()
+        call_command('explicar_consultas', comparar=True, repeticiones=1, stdout=salida)
+        self.assertIn('Sin índices', salida.getvalue())
+        self.assertIn('calif_usuario_libro_idx', salida.getvalue())
+        # Los índices borrados para comparar vuelven a estar
+        self.assertTrue(Calificacion.objects.filter(usuario=self.usuarios[0]).explain().count('calif_usuario_libro_idx'))
+
+
+class BusquedaTests(DatosBaseMixin, TestCase):
+    def ids(self, respuesta):
+        return [libro['id'] for libro in respuesta.json()['results']]
+
+    def test_ordena_por_relevancia(self):
+        respuesta = self.client.get('/api/libros/?q=libro 3')
+        self.assertEqual(respuesta.json()['count'], 3)
+        # Primero el que lo tiene en el título, después los de "Autor 3"
+        self.assertEqual(self.ids(respuesta), [self.libros[3].pk, self.libros[7].pk, self.libros[11].pk])
+        pagina = self.client.get('/api/libros/?q=libro 3&limit=1&offset=1')
+        self.assertEqual(self.ids(pagina), [self.libros[7].pk])
+
+    def test_tolera_errores_y_acentos(self):
+        autor = Autor.objects.create(nombre='Gabriel García Márquez', nacionalidad='Colombiana')
+        libro = Libro.objects.create(titulo='Cien años de soledad', autor=autor, genero=self.generos[0],
+                                     fecha_de_lanzamiento=date(1967, 5, 30), url_del_libro='https://example.com/cien')
+        self.assertEqual(self.ids(self.client.get('/api/libros/?q=garcia marquez')), [libro.pk])
+        self.assertEqual(self.ids(self.client.get('/api/libros/?q=soledd')), [libro.pk])
+        self.assertEqual(self.ids(self.client.get('/api/libros/?q=librp 5')), [self.libros[5].pk])
+        self.assertEqual(self.ids(self.client.get('/api/libros/?q=inexistente')), [])
+
+    def test_el_indice_sigue_los_cambios(self):
+        self.client.get('/api/libros/?q=libro')
+        self.client.put(f'/api/autores/{self.autores[0].pk}/', {'nombre': 'Borges', 'nacionalidad': 'Argentina'},
+                        format='json')
+        ids = self.ids(self.client.get('/api/libros/?q=borges'))
+        self.assertEqual(ids, [libro.pk for libro in self.libros if libro.autor_id == self.autores[0].pk])
+
+
+class FiltrosTests(DatosBaseMixin, TestCase):
+    def ids(self, url):
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return [item['id'] for item in respuesta.json()['results']]
+
+    def test_filtros_de_libros_en_una_consulta(self):
+        autor, genero = self.autores[1], self.generos[2]
+        with self.assertNumQueries(1):
+            ids = self.ids(f'/api/libros/?autor={autor.pk}&genero={genero.pk}&fecha_desde=1995-01-01')
+        esperados = [libro.pk for libro in self.libros
+                     if libro.autor_id == autor.pk and libro.genero_id == genero.pk
+                     and libro.fecha_de_lanzamiento >= date(1995, 1, 1)]
+        self.assertTrue(esperados)
+        self.assertEqual(ids, esperados)
+
+        varios = self.ids(f'/api/libros/?genero={self.generos[0].pk},{self.generos[1].pk}&fecha_hasta=1995-12-31')
+        self.assertEqual(varios, [libro.pk for libro in self.libros[:6] if libro.genero_id != genero.pk])
+
+    def test_filtro_por_promedio(self):
+        ids = self.ids('/api/libros/?promedio_min=3&promedio_max=4')
+        esperados = [
+            libro.pk for libro in Libro.objects.con_promedio().order_by('id')
+            if libro.promedio is not None and 3 <= libro.promedio <= 4
+        ]
+        self.assertEqual(ids, esperados)
+
+    def test_orden_por_agregados_con_cursor(self):
+        esperados = [
+            libro.pk for libro in sorted(
+                Libro.objects.con_promedio(sin_votos=0.0),
+                key=lambda libro: (-libro.promedio, libro.pk),
+            )
+        ]
+        ids, url = [], '/api/libros/?ordering=-promedio&page_size=5'
+        while url:
+            datos = self.client.get(url).json()
+            ids += [item['id'] for item in datos['results']]
+            url = datos['next']
+        self.assertEqual(ids, esperados)
+        votos = self.ids('/api/libros/?ordering=votos,-fecha')
+        self.assertEqual(votos, [libro.pk for libro in sorted(
+            Libro.objects.all(), key=lambda libro: (libro.cantidad_calificaciones, -libro.fecha_de_lanzamiento.year))])
+
+    def test_mis_calificaciones(self):
+        ids = self.ids('/api/calificaciones/?usuario=me&puntuacion_min=2&ordering=-puntuacion')
+        propias = Calificacion.objects.filter(usuario=self.usuarios[0], puntuacion__gte=2)
+        self.assertEqual(ids, [c.pk for c in sorted(propias, key=lambda c: (-c.puntuacion, c.pk))])
+
+    def test_parametros_invalidos(self):
+        for url in ('/api/libros/?autor=x', '/api/libros/?fecha_desde=ayer', '/api/libros/?ordering=url_del_libro',
+                    '/api/libros/?promedio_min=NaN', '/api/calificaciones/?usuario=yo',
+                    f'/api/calificaciones/?libro={2 ** 70}', f'/api/calificaciones/?usuario={2 ** 63}',
+                    f'/api/libros/?votos_min=-{2 ** 64}'):
+            self.assertEqual(self.client.get(url).status_code, 400, url)
+
+    def test_busqueda_con_filtros(self):
+        ids = self.ids(f'/api/libros/?q=libro&genero={self.generos[1].pk}')
+        self.assertEqual(sorted(ids), [libro.pk for libro in self.libros if libro.genero_id == self.generos[1].pk])
+
+
+class PruebaCargaTests(DatosBaseMixin, TestCase):
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_mide_latencias_contra_wsgi(self):
+        # Dentro de la transacción de la prueba no se puede cerrar la conexión al terminar cada petición
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+        salida = StringIO()
+        call_command('prueba_carga', peticiones=10, calentamiento=0, concurrencia=1, json=True, stdout=salida)
+        resultado = json.loads(salida.getvalue())
+        self.assertEqual(resultado['peticiones'], 10)
+        self.assertEqual(resultado['errores'], 0)
+        self.assertLessEqual(resultado['p50_ms'], resultado['p99_ms'])
+        self.assertFalse(resultado['cache_respuestas'])
+
+
+class TareasTests(DatosBaseMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user(username='admin', password='clave', is_staff=True)
+        self.client.force_authenticate(self.staff)
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta)
+        ajustes = override_settings(TAREAS_DIR=carpeta, TAREAS_ESPERA_REINTENTO=0)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def trabajar(self, *args):
+        salida = StringIO()
+        call_command('trabajador', '--una-vez', *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_encolar_no_duplica_tareas_iguales(self):
+        primera, creada = tareas.encolar('recomendar', {'genero': self.generos[0].pk})
+        self.assertTrue(creada)
+        # Los valores por defecto se completan antes de comparar
+        repetida, creada = tareas.encolar('recomendar', {'genero': self.generos[0].pk, 'n': 10})
+        self.assertFalse(creada)
+        self.assertEqual(repetida.pk, primera.pk)
+        otra, creada = tareas.encolar('recomendar', {'genero': self.generos[1].pk})
+        self.assertTrue(creada)
+
+        self.assertIn('2 tareas ejecutadas', self.trabajar())
+        # Terminada la primera, una igual vuelve a encolarse
+        self.assertTrue(tareas.encolar('recomendar', {'genero': self.generos[0].pk})[1])
+
+    def test_listas_en_cualquier_orden_son_la_misma_tarea(self):
+        primera, _ = tareas.encolar('reporte', {'only': [1, 3]})
+        repetida, creada = tareas.encolar('reporte', {'only': [3, 1]})
+        self.assertFalse(creada)
+        self.assertEqual(repetida.pk, primera.pk)
+
+    def test_otros_errores_de_integridad_no_se_reintentan(self):
+        error = IntegrityError('NOT NULL constraint failed: libros_tarea.tipo')
+        with mock.patch.object(Tarea.objects, 'create', side_effect=error) as crear:
+            with self.assertRaises(IntegrityError):
+                tareas.encolar('recalcular_agregados')
+        self.assertEqual(crear.call_count, 1)
+
+        duplicada = IntegrityError('UNIQUE constraint failed: libros_tarea.clave')
+        with mock.patch.object(Tarea.objects, 'create', side_effect=duplicada) as crear:
+            with self.assertRaises(IntegrityError):
+                tareas.encolar('recalcular_agregados')
+        self.assertEqual(crear.call_count, tareas.REINTENTOS_ENCOLAR)
+
+    def test_api_encola_y_consulta_el_estado(self):
+        respuesta = self.client.post('/api/tareas/', {'tipo': 'recalcular_agregados'}, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        tarea = respuesta.json()
+        self.assertEqual((tarea['estado'], tarea['usuario'], tarea['parametros']), ('pendiente', 'admin', {}))
+        repetida = self.client.post('/api/tareas/', {'tipo': 'recalcular_agregados'}, format='json')
+        self.assertEqual(repetida.status_code, 200)
+        self.assertEqual(repetida.json()['id'], tarea['id'])
+
+        Libro.objects.update(cantidad_calificaciones=0)
+        self.trabajar()
+        tarea = self.client.get(f"/api/tareas/{tarea['id']}/").json()
+        self.assertEqual((tarea['estado'], tarea['intentos'], tarea['resultado']),
+                         ('terminada', 1, {'libros': len(self.libros)}))
+        self.assertIsNotNone(tarea['finalizada'])
+        self.assertAgregadosConsistentes()
+
+        listado = self.client.get('/api/tareas/?estado=terminada&tipo=recalcular_agregados').json()['results']
+        self.assertEqual([t['id'] for t in listado], [tarea['id']])
+
+    def test_reporte_en_segundo_plano(self):
+        respuesta = self.client.post('/api/tareas/', {'tipo': 'reporte', 'parametros': {'only': [1, 3]}}, format='json')
+        self.assertEqual(respuesta.json()['parametros'], {'only': [1, 3], 'top': 30, 'muestreo': 'top'})
+        self.trabajar()
+        resultado = self.client.get(f"/api/tareas/{respuesta.json()['id']}/").json()['resultado']
+        self.assertEqual(resultado['graficos'], ['1_libros_por_genero.png', '3_libros_mas_calificados.png'])
+        self.assertTrue(os.path.isdir(resultado['carpeta']))
+
+    def test_validacion_y_permisos(self):
+        self.assertEqual(self.client.post('/api/tareas/', {'tipo': 'borrar_todo'}, format='json').status_code, 400)
+        respuesta = self.client.post('/api/tareas/', {'tipo': 'reporte', 'parametros': {'top': 0}}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('top', respuesta.json()['parametros'])
+        self.assertEqual(self.client.get('/api/tareas/?estado=perdida').status_code, 400)
+
+        self.client.force_authenticate(self.usuarios[0])
+        self.assertEqual(self.client.post('/api/tareas/', {'tipo': 'reporte'}, format='json').status_code, 403)
+        self.assertEqual(self.client.get('/api/tareas/').status_code, 403)
+
+    def test_reintenta_hasta_agotar_los_intentos(self):
+        fallos = []
+
+        def falla_una_vez(tarea, **parametros):
+            if not fallos:
+                fallos.append(tarea.intentos)
+                raise RuntimeError('sin conexión')
+            return {'ok': True}
+
+        def falla_siempre(tarea, **parametros):
+            raise RuntimeError('roto')
+
+        registro = {
+            'intermitente': (falla_una_vez, tareas.ParametrosAgregadosSerializer),
+            'rota': (falla_siempre, tareas.ParametrosAgregadosSerializer),
+        }
+        with mock.patch.dict(tareas.TAREAS, registro), self.assertLogs('libros.tareas', 'ERROR'):
+            intermitente, _ = tareas.encolar('intermitente')
+            rota, _ = tareas.encolar('rota')
+            self.trabajar()
+        intermitente.refresh_from_db()
+        rota.refresh_from_db()
+        self.assertEqual((intermitente.estado, intermitente.intentos, intermitente.error), ('terminada', 2, ''))
+        self.assertEqual((rota.estado, rota.intentos), ('fallida', 3))
+        self.assertEqual(rota.error, 'RuntimeError: roto')
+
+    def test_tarea_abandonada_vuelve_a_la_cola(self):
+        tarea, _ = tareas.encolar('recomendar', {'genero': self.generos[0].pk})
+        self.assertEqual(tareas.tomar('otro').pk, tarea.pk)
+        self.assertIsNone(tareas.tomar('otro'))
+        self.assertEqual(tareas.liberar_vencidas(), 0)
+
+        Tarea.objects.filter(pk=tarea.pk).update(iniciada=timezone.now() - timedelta(hours=2))
+        self.assertEqual(tareas.liberar_vencidas(), 1)
+        self.trabajar()
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('terminada', 2))
+        self.assertEqual([fila['libro_id'] for fila in tarea.resultado],
+                         [libro_id for libro_id, *_ in ranking.mejores_libros(self.generos[0].pk, 10)])
+
+    def test_opciones_invalidas(self):
+        with self.assertRaises(CommandError):
+            call_command('trabajador', procesos=0, stdout=StringIO())
+
+
+class MedirRendimientoTests(DatosBaseMixin, TestCase):
+    def test_generar_datos_sinteticos(self):
+        call_command('generar_datos', borrar=True, generos=2, autores=3, libros=20, usuarios=4,
+                     max=3, semilla=7, stdout=StringIO())
+        self.assertEqual((Genero.objects.count(), Autor.objects.count(), Libro.objects.count()), (2, 3, 20))
+        self.assertTrue(User.objects.filter(username='lector4').exists())
+        self.assertAgregadosConsistentes()
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_resultados_en_json_y_comparacion(self):
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta = os.path.join(carpeta, 'resultados.json')
+            call_command('medir_rendimiento', repeticiones=2, sin_comandos=True, salida=ruta, stdout=StringIO())
+            with open(ruta, encoding='utf-8') as archivo:
+                resultado = json.load(archivo)
+            self.assertEqual(resultado['escala']['libros'], len(self.libros))
+            libros = resultado['endpoints']['libros']
+            self.assertEqual(libros['estado'], 200)
+            self.assertGreaterEqual(libros['consultas'], 1)
+            self.assertLessEqual(libros['p50_ms'], libros['p95_ms'])
+
+            # Una consulta más que en la corrida anterior cuenta como regresión
+            resultado['endpoints']['libros']['consultas'] = 0
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                json.dump(resultado, archivo)
+            with self.assertRaisesMessage(CommandError, 'regresiones'):
+                call_command('medir_rendimiento', repeticiones=1, sin_comandos=True, comparar=ruta,
+                             tolerancia=1e9, stdout=StringIO())
+
+
+@override_settings(METRICAS_ACTIVAS=True, METRICAS_TOKEN='secreto')
+class MetricasTests(DatosBaseMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metricas.registro.limpiar()
+
+    def test_mide_cada_peticion_y_publica_histogramas(self):
+        respuesta = self.client.get('/api/libros/')
+        self.assertIn('db;dur=', respuesta['Server-Timing'])
+        self.client.get('/api/calificaciones/?fields=id')
+
+        self.assertEqual(APIClient().get('/api/_metrics/').status_code, 401)
+        texto = APIClient().get('/api/_metrics/', HTTP_AUTHORIZATION='Bearer secreto').content.decode()
+        self.assertIn('biblioteca_peticion_segundos_count{vista="LibroViewSet",accion="list",metodo="GET"} 1', texto)
+        self.assertIn('biblioteca_consultas_bucket{vista="CalificacionViewSet",accion="list",metodo="GET",le="+Inf"} 1',
+                      texto)
+        self.assertIn('biblioteca_peticiones_total{vista="LibroViewSet",accion="list",metodo="GET",estado="200"} 1',
+                      texto)
+
+        staff = User.objects.create_user(username='admin', password='clave', is_staff=True)
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(staff)}')
+        self.assertEqual(cliente.get('/api/_metrics/').status_code, 200)
+        cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.usuarios[1])}')
+        self.assertEqual(cliente.get('/api/_metrics/').status_code, 401)
+
+    def test_detecta_consultas_repetidas(self):
+        medicion = metricas.Medicion(self.client.get('/api/generos/').wsgi_request)
+        with connection.execute_wrapper(medicion):
+            for libro in self.libros[:5]:
+                Libro.objects.get(pk=libro.pk)
+        with self.assertLogs('libros.metricas', 'WARNING'):
+            medicion.terminar(0.1)
+        self.assertEqual(medicion.repetida[1], 5)
+
+    def test_perfil_a_pedido(self):
+        with tempfile.TemporaryDirectory() as carpeta, self.settings(METRICAS_PERFIL_DIR=carpeta):
+            self.assertNotIn('X-Perfil-Archivo', self.client.get('/api/generos/', HTTP_X_PERFIL='otro'))
+            respuesta = self.client.get('/api/generos/', HTTP_X_PERFIL='secreto')
+            self.assertEqual(os.listdir(carpeta), [respuesta['X-Perfil-Archivo']])
+
+    def test_perfil_ocupado_atiende_sin_perfil(self):
+        with tempfile.TemporaryDirectory() as carpeta, self.settings(METRICAS_PERFIL_DIR=carpeta):
+            # Otra petición se está perfilando en este proceso
+            with metricas._lock_perfil:
+                respuesta = self.client.get('/api/generos/', HTTP_X_PERFIL='secreto')
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertNotIn('X-Perfil-Archivo', respuesta)
+            self.assertEqual(os.listdir(carpeta), [])
+
+            self.assertIn('X-Perfil-Archivo', self.client.get('/api/generos/', HTTP_X_PERFIL='secreto'))
+            self.assertFalse(metricas._lock_perfil.locked())
+
+
+class VistasAsyncTests(DatosBaseMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.autorizacion = {'Authorization': f'Bearer {AccessToken.for_user(self.usuarios[0])}'}
+
+    async def leer(self, respuesta):
+        return json.loads(b''.join([parte async for parte in respuesta.streaming_content]))
+
+    async def test_listado_transmitido_igual_al_sincronico(self):
+        respuesta = await self.async_client.get('/api/async/libros/?page_size=5', headers=self.autorizacion)
+        self.assertTrue(respuesta.streaming)
+        datos = await self.leer(respuesta)
+        esperado = await sync_to_async(self.client.get)('/api/libros/?page_size=5')
+        self.assertEqual(datos['results'], esperado.json()['results'])
+
+        ids = [libro['id'] for libro in datos['results']]
+        while datos['next']:
+            datos = await self.leer(await self.async_client.get(datos['next'], headers=self.autorizacion))
+            ids += [libro['id'] for libro in datos['results']]
+        self.assertEqual(ids, [libro.pk for libro in self.libros])
+
+    async def test_detalle_filtros_y_errores(self):
+        libro = self.libros[2]
+        respuesta = await self.async_client.get(f'/api/async/libros/{libro.pk}/', headers=self.autorizacion)
+        self.assertEqual(respuesta.json()['autor']['id'], libro.autor_id)
+        respuesta = await self.async_client.get('/api/async/libros/999999/', headers=self.autorizacion)
+        self.assertEqual(respuesta.status_code, 404)
+
+        genero = self.generos[1]
+        datos = await self.leer(await self.async_client.get(f'/api/async/libros/?genero={genero.pk}',
+                                                            headers=self.autorizacion))
+        self.assertTrue(all(item['genero']['id'] == genero.pk for item in datos['results']))
+        respuesta = await self.async_client.get('/api/async/libros/?genero=x', headers=self.autorizacion)
+        self.assertEqual(respuesta.status_code, 400)
+        for url in (f'/api/async/libros/?despues={2 ** 64}', f'/api/async/libros/top/?genero={2 ** 64}'):
+            respuesta = await self.async_client.get(url, headers=self.autorizacion)
+            self.assertEqual(respuesta.status_code, 400, url)
+        respuesta = await self.async_client.get(f'/api/async/libros/{2 ** 64}/', headers=self.autorizacion)
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertEqual((await self.async_client.get('/api/async/libros/')).status_code, 401)
+
+    async def test_top_y_recomendaciones(self):
+        await sync_to_async(ranking.refrescar_ranking)()
+        sincronico = await sync_to_async(self.client.get)('/api/libros/top/?n=3')
+        respuesta = await self.async_client.get('/api/async/libros/top/?n=3', headers=self.autorizacion)
+        self.assertEqual(respuesta.json(), sincronico.json())
+
+        respuesta = await self.async_client.get('/api/async/recomendaciones/?n=2', headers=self.autorizacion)
+        datos = respuesta.json()
+        self.assertEqual(datos['origen'], 'populares')
+        self.assertEqual(len(datos['results']), 2)
+
+    async def test_token_revocado_al_cambiar_la_contrasenia(self):
+        usuario = self.usuarios[0]
+        # Los módulos importan api_settings por nombre: override_settings lo reemplazaría sin que lo vean
+        with mock.patch.object(api_settings, 'CHECK_REVOKE_TOKEN', True):
+            autorizacion = {'Authorization': f'Bearer {AccessToken.for_user(usuario)}'}
+            respuesta = await self.async_client.get('/api/async/libros/1/', headers=autorizacion)
+            self.assertNotEqual(respuesta.status_code, 401)
+
+            usuario.set_password('otra-clave')
+            await usuario.asave()
+            respuesta = await self.async_client.get('/api/async/libros/1/', headers=autorizacion)
+            self.assertEqual(respuesta.status_code, 401)
@@ -1,13 +1,24 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from .views import GeneroViewSet, AutorViewSet, LibroViewSet, CalificacionViewSet
+from . import metricas, views_async
+from .views import (
+    GeneroViewSet, AutorViewSet, LibroViewSet, CalificacionViewSet, RecomendacionViewSet, EstadisticaViewSet, TareaViewSet,
+)
 
 router = DefaultRouter()
 router.register(r'generos', GeneroViewSet)
 router.register(r'autores', AutorViewSet)
 router.register(r'libros', LibroViewSet)
 router.register(r'calificaciones', CalificacionViewSet)
+router.register(r'recomendaciones', RecomendacionViewSet, basename='recomendacion')
+router.register(r'estadisticas', EstadisticaViewSet, basename='estadistica')
+router.register(r'tareas', TareaViewSet)
 
 urlpatterns = [
+    path('_metrics/', metricas.metricas, name='metricas'),
+    path('async/libros/', views_async.libros, name='async-libros'),
+    path('async/libros/top/', views_async.top, name='async-libros-top'),
+    path('async/libros/<int:pk>/', views_async.libro, name='async-libro'),
+    path('async/recomendaciones/', views_async.recomendaciones, name='async-recomendaciones'),
     path('', include(router.urls)),
 ]
@@ -1,22 +1,198 @@
-from rest_framework import viewsets, status
-from rest_framework.permissions import IsAuthenticated
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import mixins, viewsets, status, serializers
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from .models import Genero, Autor, Libro, Calificacion
+from rest_framework.reverse import reverse
+from . import agregados, busqueda, estadisticas, matrices, metricas, ranking, recomendador, tareas, tendencias
+from .cache import invalidar, respuesta_cacheada
+from .filtros import Filtro, FiltroConsulta, fecha, entero, id_unico, ids, numero, opciones, usuario
+from .models import Genero, Autor, Libro, Calificacion, ActividadLibro, PosicionRanking, Tarea
+from .pagination import PaginacionBusqueda
 from .serializers import (
     GeneroSerializer, AutorSerializer,
-    LibroSerializer, CalificacionSerializer
+    LibroSerializer, CalificacionSerializer, TareaSerializer,
+    CAMPOS_LIBRO_PLANO, CAMPOS_CALIFICACION_PLANO,
+    campos_solicitados, libro_desde_fila, calificacion_desde_fila,
 )
 
-class LibroViewSet(viewsets.ModelViewSet):
-    queryset = Libro.objects.all()
+# Filas que se piden a la base por cada viaje del cursor del servidor
+TAMANIO_BLOQUE_EXPORTACION = 2000
+
+
+def respuesta_ndjson(filas, nombre):
+    """Transmite ``filas`` como NDJSON (un objeto JSON por línea) sin armar la lista en memoria."""
+    codificador = DjangoJSONEncoder()
+    lineas = (codificador.encode(fila) + '\n' for fila in filas)
+    respuesta = StreamingHttpResponse(lineas, content_type='application/x-ndjson')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}.ndjson"'
+    return respuesta
+
+# Máximo de objetos aceptados por cada petición a los endpoints /bulk/
+TAMANIO_MAXIMO_LOTE = 10000
+
+# Máximo de ?n= en /api/estadisticas/
+MAXIMO_ESTADISTICAS = 100
+
+
+def validar_lote(serializer):
+    """Valida cada objeto de un serializer ``many=True`` por separado.
+
+    Devuelve los datos válidos como ``(indice, validated_data)`` y los
+    errores como ``{'indice': i, 'errores': {...}}``, para que un objeto
+    inválido no impida guardar el resto del lote.
+    """
+    datos = serializer.initial_data
+    if not isinstance(datos, list):
+        raise serializers.ValidationError({'detail': 'Se esperaba una lista de objetos.'})
+    if len(datos) > TAMANIO_MAXIMO_LOTE:
+        raise serializers.ValidationError({'detail': f'El lote no puede superar {TAMANIO_MAXIMO_LOTE} objetos.'})
+
+    validos, errores = [], []
+    for indice, item in enumerate(datos):
+        try:
+            validos.append((indice, serializer.child.run_validation(item)))
+        except serializers.ValidationError as exc:
+            errores.append({'indice': indice, 'errores': exc.detail})
+    return validos, errores
+
+
+def entero_param(request, nombre, defecto, maximo):
+    valor = request.query_params.get(nombre)
+    if valor is None:
+        return defecto
+    try:
+        valor = int(valor)
+    except ValueError:
+        raise serializers.ValidationError({nombre: ['Debe ser un número entero.']})
+    if valor < 1:
+        raise serializers.ValidationError({nombre: ['Debe ser mayor que cero.']})
+    return min(valor, maximo)
+
+
+def ventana_param(request):
+    try:
+        return tendencias.ventana(request.query_params.get('ventana', '7d'))
+    except ValueError as exc:
+        raise serializers.ValidationError({'ventana': [str(exc)]})
+
+
+def libros_con_puntaje(vista, pares, campo):
+    """Serializa ``[(libro_id, valor)]`` en el mismo orden, con una sola consulta."""
+    libros = Libro.objects.select_related('autor', 'genero').in_bulk([libro_id for libro_id, _ in pares])
+    return [
+        {'libro': vista.get_serializer(libros[libro_id]).data, campo: round(valor, 4)}
+        for libro_id, valor in pares if libro_id in libros
+    ]
+
+
+def estado_lote(guardados, errores):
+    if not errores:
+        return status.HTTP_201_CREATED
+    return status.HTTP_207_MULTI_STATUS if guardados else status.HTTP_400_BAD_REQUEST
+
+
+def eliminar_con_libros(instancia, libros):
+    """Borra ``instancia`` y, en cascada, ``libros``; recalcula los agregados de los autores y géneros que tocaban."""
+    with transaction.atomic():
+        relacionados = list(libros.values_list('autor_id', 'genero_id'))
+        autores = {autor_id for autor_id, _ in relacionados}
+        generos = {genero_id for _, genero_id in relacionados}
+        usuarios = set(Calificacion.objects.filter(libro__in=libros).values_list('usuario_id', flat=True))
+        periodos = set(ActividadLibro.objects.filter(libro__in=libros).values_list('inicio', flat=True))
+        instancia.delete()
+        agregados.recalcular_autores(autores)
+        agregados.recalcular_generos(generos)
+        agregados.recalcular_matriz(usuarios, generos)
+        agregados.recalcular_actividad_generos(generos, periodos)
+
+
+def con_promedio(queryset):
+    # Sin votos cuenta como 0 para ordenar: el cursor no admite valores nulos
+    return queryset.con_promedio(sin_votos=0.0)
+
+
+def calificados_con_promedio(queryset):
+    return con_promedio(queryset).filter(cantidad_calificaciones__gt=0)
+
+
+class ListadoPlanoMixin:
+    """Listado paginado armado desde ``values()`` con ``fila_plana``.
+
+    Devuelve lo mismo que el serializer de la vista (también con ``?fields=``)
+    sin crear un modelo ni un serializer por fila.
+    """
+    columnas_planas = ()
+
+    def listado_plano(self, queryset):
+        # El cursor necesita en cada fila los campos por los que se ordena
+        orden = [campo.lstrip('-') for campo in self.paginator.get_ordering(self.request, queryset, self)]
+        columnas = itemgetter(*self.columnas_planas)
+        filas = self.paginate_queryset(queryset.values(*dict.fromkeys([*self.columnas_planas, *orden])))
+        with metricas.serializando():
+            datos = [self.fila_plana(columnas(fila)) for fila in filas]
+            campos = campos_solicitados(self.request)
+            if campos is not None:
+                datos = [{clave: valor for clave, valor in dato.items() if clave in campos} for dato in datos]
+        return self.get_paginated_response(datos)
+
+
+class LibroViewSet(ListadoPlanoMixin, viewsets.ModelViewSet):
+    # El serializer anida autor y género: se traen en la misma consulta
+    queryset = Libro.objects.select_related('autor', 'genero')
     serializer_class = LibroSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [FiltroConsulta]
+    filtros = {
+        'autor': Filtro('autor_id__in', ids),
+        'genero': Filtro('genero_id__in', ids),
+        'fecha_desde': Filtro('fecha_de_lanzamiento__gte', fecha),
+        'fecha_hasta': Filtro('fecha_de_lanzamiento__lte', fecha),
+        'votos_min': Filtro('cantidad_calificaciones__gte', entero),
+        'promedio_min': Filtro('promedio__gte', numero, calificados_con_promedio),
+        'promedio_max': Filtro('promedio__lte', numero, calificados_con_promedio),
+    }
+    ordenamientos = {
+        'id': 'id',
+        'titulo': 'titulo',
+        'fecha': 'fecha_de_lanzamiento',
+        'votos': 'cantidad_calificaciones',
+        'promedio': 'promedio',
+    }
+    anotaciones_orden = {'promedio': con_promedio}
+    columnas_planas = CAMPOS_LIBRO_PLANO
+    fila_plana = staticmethod(libro_desde_fila)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        campos = campos_solicitados(self.request)
+        if campos is not None:
+            # Sin autor/género en ?fields= no hace falta el JOIN
+            queryset = queryset.select_related(None)
+            relacionados = [c for c in ('autor', 'genero') if c in campos]
+            if relacionados:
+                queryset = queryset.select_related(*relacionados)
+        return queryset
+
+    # Los agregados de los libros cambian con cada calificación (con update(), sin post_save)
+    @respuesta_cacheada(Libro, Autor, Genero, Calificacion)
     def list(self, request):
-        libros = self.get_queryset()
-        serializer = self.get_serializer(libros, many=True)
-        return Response(serializer.data)
+        texto = busqueda.texto_busqueda(request)
+        if texto:
+            # Ordenados por relevancia: se paginan con limit/offset
+            self.pagination_class = PaginacionBusqueda
+            libros = self.paginate_queryset(busqueda.buscar(self.filter_queryset(self.get_queryset()), texto))
+            serializer = self.get_serializer(libros, many=True)
+            return self.get_paginated_response(serializer.data)
+        return self.listado_plano(self.filter_queryset(self.get_queryset()))
 
+    @respuesta_cacheada(Libro, Autor, Genero, Calificacion)
     def retrieve(self, request, pk=None):
         try:
             libro = self.get_object()
@@ -34,28 +210,123 @@ class LibroViewSet(viewsets.ModelViewSet):
 
     def update(self, request, pk=None):
         libro = self.get_object()
+        anteriores = (libro.autor_id, libro.genero_id)
         serializer = self.get_serializer(libro, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                # Si el libro cambió de autor o género, sus calificaciones se mudan con él
+                if anteriores != (libro.autor_id, libro.genero_id):
+                    agregados.recalcular_autores({anteriores[0], libro.autor_id})
+                    agregados.recalcular_generos({anteriores[1], libro.genero_id})
+                    agregados.recalcular_matriz(libro.calificaciones.values('usuario_id'),
+                                                {anteriores[1], libro.genero_id})
+                    agregados.recalcular_actividad_generos({anteriores[1], libro.genero_id},
+                                                           libro.actividad.values('inicio'))
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, pk=None):
         libro = self.get_object()
-        libro.delete()
+        with transaction.atomic():
+            usuarios = list(libro.calificaciones.values_list('usuario_id', flat=True))
+            periodos = list(libro.actividad.values_list('inicio', flat=True))
+            libro.delete()
+            agregados.recalcular_autores([libro.autor_id])
+            agregados.recalcular_generos([libro.genero_id])
+            agregados.recalcular_matriz(usuarios, [libro.genero_id])
+            agregados.recalcular_actividad_generos([libro.genero_id], periodos)
         return Response({'detail': 'Libro eliminado correctamente.'}, status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        """Ranking ponderado precalculado, general o de ``?genero=``."""
+        genero = request.query_params.get('genero')
+        if genero is not None:
+            genero = id_unico('genero', genero, request)
+        n = entero_param(request, 'n', 10, getattr(settings, 'RANKING_TAMANIO', 100))
+
+        posiciones = (
+            PosicionRanking.objects.filter(genero_id=genero) if genero
+            else PosicionRanking.objects.filter(genero__isnull=True)
+        ).select_related('libro__autor', 'libro__genero').order_by('posicion')[:n]
+        if not posiciones and not PosicionRanking.objects.exists():
+            # Nunca se calculó: se arma una vez en el momento
+            ranking.refrescar_ranking()
+            posiciones = posiciones.all()
+        return Response([
+            {
+                'posicion': p.posicion, 'puntaje': round(p.puntaje, 4),
+                'promedio': round(p.promedio, 4), 'votos': p.votos,
+                'libro': self.get_serializer(p.libro).data,
+            }
+            for p in posiciones
+        ])
+
+    @action(detail=False, methods=['get'])
+    def tendencias(self, request):
+        """Libros con más calificaciones en ``?ventana=`` (``24h``, ``7d``...), leídos de la actividad por período."""
+        granularidad, desde = ventana_param(request)
+        genero = request.query_params.get('genero')
+        if genero is not None:
+            genero = id_unico('genero', genero, request)
+        posiciones = tendencias.libros(granularidad, desde, entero_param(request, 'n', 10, 100), genero)
+        libros = {
+            fila[0]: libro_desde_fila(fila)
+            for fila in Libro.objects.filter(pk__in=[libro_id for libro_id, _ in posiciones])
+            .values_list(*CAMPOS_LIBRO_PLANO)
+        }
+        return Response([
+            {'posicion': posicion, **datos, 'libro': libros[libro_id]}
+            for posicion, (libro_id, datos) in enumerate(posiciones, 1)
+        ])
+
+    @action(detail=True, methods=['get'])
+    def similares(self, request, pk=None):
+        libro = self.get_object()
+        try:
+            indice = recomendador.obtener_indice()
+        except recomendador.IndiceNoDisponible as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        parecidos = indice.similares(libro.pk, entero_param(request, 'n', 10, 50))
+        return Response(libros_con_puntaje(self, parecidos, 'similitud'))
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        validos, errores = validar_lote(self.get_serializer(data=request.data, many=True))
+        libros = Libro.objects.bulk_create(
+            [Libro(**datos) for _, datos in validos], batch_size=1000,
+        )
+        # bulk_create no dispara post_save
+        invalidar(Libro)
+        return Response({
+            'creados': len(libros),
+            'ids': [libro.pk for libro in libros],
+            'errores': errores,
+        }, status=estado_lote(libros, errores))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        filas = (
+            Libro.objects.order_by('id')
+            .values_list(*CAMPOS_LIBRO_PLANO)
+            .iterator(chunk_size=TAMANIO_BLOQUE_EXPORTACION)
+        )
+        return respuesta_ndjson((libro_desde_fila(fila) for fila in filas), 'libros')
+
 
 class GeneroViewSet(viewsets.ModelViewSet):
     queryset = Genero.objects.all()
     serializer_class = GeneroSerializer
     permission_classes = [IsAuthenticated]
 
+    @respuesta_cacheada(Genero)
     def list(self, request):
-        generos = self.get_queryset()
+        generos = self.paginate_queryset(self.get_queryset())
         serializer = self.get_serializer(generos, many=True)
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
+    @respuesta_cacheada(Genero)
     def retrieve(self, request, pk=None):
         try:
             genero = self.get_object()
@@ -64,6 +335,18 @@ class GeneroViewSet(viewsets.ModelViewSet):
         except Genero.DoesNotExist:
             return Response({'detail': 'No encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
+    @action(detail=False, methods=['get'])
+    def tendencias(self, request):
+        """Géneros con más calificaciones en ``?ventana=``, como ``/api/libros/tendencias/``."""
+        granularidad, desde = ventana_param(request)
+        posiciones = tendencias.generos(granularidad, desde, entero_param(request, 'n', 10, 100))
+        nombres = dict(Genero.objects.filter(pk__in=[genero_id for genero_id, _ in posiciones])
+                       .values_list('id', 'nombre'))
+        return Response([
+            {'posicion': posicion, **datos, 'genero': {'id': genero_id, 'nombre': nombres[genero_id]}}
+            for posicion, (genero_id, datos) in enumerate(posiciones, 1)
+        ])
+
     def create(self, request):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
@@ -81,7 +364,7 @@ class GeneroViewSet(viewsets.ModelViewSet):
 
     def destroy(self, request, pk=None):
         genero = self.get_object()
-        genero.delete()
+        eliminar_con_libros(genero, genero.libros.all())
         return Response(status=status.HTTP_204_NO_CONTENT)
     
     
@@ -90,11 +373,13 @@ class AutorViewSet(viewsets.ModelViewSet):
     serializer_class = AutorSerializer
     permission_classes = [IsAuthenticated]
 
+    @respuesta_cacheada(Autor)
     def list(self, request):
-        autores = self.get_queryset()
+        autores = self.paginate_queryset(self.get_queryset())
         serializer = self.get_serializer(autores, many=True)
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
+    @respuesta_cacheada(Autor)
     def retrieve(self, request, pk=None):
         try:
             autor = self.get_object()
@@ -120,19 +405,27 @@ class AutorViewSet(viewsets.ModelViewSet):
 
     def destroy(self, request, pk=None):
         autor = self.get_object()
-        autor.delete()
+        eliminar_con_libros(autor, autor.libros.all())
         return Response(status=status.HTTP_204_NO_CONTENT)
     
     
-class CalificacionViewSet(viewsets.ModelViewSet):
-    queryset = Calificacion.objects.all()
+class CalificacionViewSet(ListadoPlanoMixin, viewsets.ModelViewSet):
+    queryset = Calificacion.objects.select_related('usuario', 'libro')
     serializer_class = CalificacionSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [FiltroConsulta]
+    filtros = {
+        'libro': Filtro('libro_id__in', ids),
+        'usuario': Filtro('usuario_id', usuario),
+        'puntuacion_min': Filtro('puntuacion__gte', numero),
+        'puntuacion_max': Filtro('puntuacion__lte', numero),
+    }
+    ordenamientos = {'id': 'id', 'puntuacion': 'puntuacion'}
+    columnas_planas = CAMPOS_CALIFICACION_PLANO
+    fila_plana = staticmethod(calificacion_desde_fila)
 
     def list(self, request):
-        calificaciones = self.get_queryset()
-        serializer = self.get_serializer(calificaciones, many=True)
-        return Response(serializer.data)
+        return self.listado_plano(self.filter_queryset(self.get_queryset()))
 
     def retrieve(self, request, pk=None):
         try:
@@ -143,28 +436,194 @@ class CalificacionViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Calificación no encontrada'}, status=status.HTTP_404_NOT_FOUND)
 
     def create(self, request):
-        libro_id = request.data.get('libro_id')
-        usuario = request.user
-
-        if Calificacion.objects.filter(libro_id=libro_id, usuario=usuario).exists():
-            return Response({'detail': 'Ya has calificado este libro.'},
-                            status=status.HTTP_400_BAD_REQUEST)
+        """Alta de una calificación; con ``?reemplazar=true`` reemplaza la que ya existía.
 
+        No se consulta antes si existe: la restricción única de (libro, usuario)
+        decide, así dos altas simultáneas no terminan en un error 500.
+        """
         serializer = self.get_serializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save(usuario=usuario)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        reemplazar = request.query_params.get('reemplazar') in ('1', 'true')
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    calificacion = serializer.save(usuario=request.user)
+            except IntegrityError:
+                if not reemplazar:
+                    return Response({'detail': 'Ya has calificado este libro.'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                calificacion = Calificacion.objects.select_for_update().get(
+                    libro=serializer.validated_data['libro'], usuario=request.user,
+                )
+                anterior, fecha_anterior = calificacion.puntuacion, calificacion.fecha
+                calificacion.puntuacion = serializer.validated_data['puntuacion']
+                calificacion.fecha = timezone.now()
+                calificacion.save(update_fields=['puntuacion', 'fecha'])
+                agregados.cambiar_calificacion(calificacion.libro_id, anterior, calificacion.puntuacion,
+                                                calificacion.usuario_id, fecha_anterior, calificacion.fecha)
+                serializer.instance = calificacion
+                return Response(serializer.data)
+            agregados.sumar_calificacion(calificacion.libro_id, calificacion.puntuacion, calificacion.usuario_id,
+                                         calificacion.fecha)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in ('PUT', 'PATCH', 'DELETE'):
+            # Se bloquea la fila hasta que terminen de aplicarse los deltas a los agregados
+            queryset = queryset.select_for_update(of=('self',))
+        return queryset
 
     def update(self, request, pk=None):
-        calificacion = self.get_object()
-        serializer = self.get_serializer(calificacion, data=request.data, partial=False)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            calificacion = self.get_object()
+            libro_anterior, puntuacion_anterior = calificacion.libro_id, calificacion.puntuacion
+            fecha_anterior = calificacion.fecha
+            serializer = self.get_serializer(calificacion, data=request.data, partial=False)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            serializer.save(fecha=timezone.now())
+            if calificacion.libro_id == libro_anterior:
+                agregados.cambiar_calificacion(libro_anterior, puntuacion_anterior, calificacion.puntuacion,
+                                                calificacion.usuario_id, fecha_anterior, calificacion.fecha)
+            else:
+                agregados.restar_calificacion(libro_anterior, puntuacion_anterior, calificacion.usuario_id,
+                                              fecha_anterior)
+                agregados.sumar_calificacion(calificacion.libro_id, calificacion.puntuacion, calificacion.usuario_id,
+                                             calificacion.fecha)
+        return Response(serializer.data)
 
     def destroy(self, request, pk=None):
-        calificacion = self.get_object()
-        calificacion.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        with transaction.atomic():
+            calificacion = self.get_object()
+            # Si otra petición ya la borró, delete() no falla: solo se resta si esta la borró
+            if calificacion.delete()[0] == 1:
+                agregados.restar_calificacion(calificacion.libro_id, calificacion.puntuacion,
+                                              calificacion.usuario_id, calificacion.fecha)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Crea o reemplaza en una sola sentencia las calificaciones del usuario."""
+        validos, errores = validar_lote(self.get_serializer(data=request.data, many=True))
+
+        # Un libro repetido dentro del lote se queda con la última puntuación: es un aviso, no un error
+        por_libro, avisos = {}, []
+        for indice, datos in validos:
+            libro_id = datos['libro'].pk
+            if libro_id in por_libro:
+                avisos.append({'indice': por_libro[libro_id][0],
+                               'avisos': {'libro_id': ['Libro repetido en el lote; se usó el último.']}})
+            por_libro[libro_id] = (indice, datos['puntuacion'])
+
+        with transaction.atomic():
+            existentes = set(
+                Calificacion.objects.filter(usuario=request.user, libro_id__in=por_libro)
+                .values_list('libro_id', flat=True)
+            )
+            Calificacion.objects.bulk_create(
+                [Calificacion(libro_id=libro_id, usuario=request.user, puntuacion=puntuacion)
+                 for libro_id, (_, puntuacion) in por_libro.items()],
+                update_conflicts=True,
+                unique_fields=['libro', 'usuario'],
+                update_fields=['puntuacion', 'fecha'],
+                batch_size=1000,
+            )
+            if por_libro:
+                agregados.recalcular_agregados(libros=por_libro, usuarios=[request.user.pk])
+                invalidar(Calificacion)
+
+        return Response({
+            'creadas': len(por_libro) - len(existentes),
+            'actualizadas': len(existentes),
+            'errores': errores,
+            'avisos': avisos,
+        }, status=estado_lote(por_libro, errores))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        filas = (
+            Calificacion.objects.order_by('id')
+            .values_list(*CAMPOS_CALIFICACION_PLANO)
+            .iterator(chunk_size=TAMANIO_BLOQUE_EXPORTACION)
+        )
+        return respuesta_ndjson((calificacion_desde_fila(fila) for fila in filas), 'calificaciones')
+
+
+class RecomendacionViewSet(viewsets.GenericViewSet):
+    serializer_class = LibroSerializer
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        n = entero_param(request, 'n', 10, 50)
+        calificadas = dict(
+            Calificacion.objects.filter(usuario=request.user).values_list('libro_id', 'puntuacion')
+        )
+        try:
+            recomendados = recomendador.obtener_indice().recomendar(calificadas, n)
+        except recomendador.IndiceNoDisponible:
+            recomendados = []
+
+        origen = 'colaborativo'
+        if not recomendados:
+            # Sin historial (o sin índice): los libros con más votos que todavía no calificó
+            origen = 'populares'
+            recomendados = list(
+                Libro.objects.exclude(pk__in=calificadas)
+                .filter(cantidad_calificaciones__gt=0)
+                .con_promedio()
+                .order_by('-cantidad_calificaciones', '-promedio', 'id')
+                .values_list('id', 'promedio')[:n]
+            )
+        return Response({'origen': origen, 'results': libros_con_puntaje(self, recomendados, 'puntaje')})
+
+
+class EstadisticaViewSet(viewsets.ViewSet):
+    """Las estadísticas de ``reporte_libros`` en JSON (ver ``libros.estadisticas``)."""
+    permission_classes = [IsAuthenticated]
+    lookup_value_regex = '[a-z-]+'
+
+    def list(self, request):
+        return Response({
+            nombre: reverse('estadistica-detail', args=[nombre], request=request)
+            for nombre in estadisticas.ESTADISTICAS
+        })
+
+    @respuesta_cacheada(Libro, Autor, Genero, Calificacion)
+    def retrieve(self, request, pk=None):
+        if pk not in estadisticas.ESTADISTICAS:
+            return Response({'detail': 'Estadística no encontrada.'}, status=status.HTTP_404_NOT_FOUND)
+        calcular, n, admite_muestreo = estadisticas.ESTADISTICAS[pk]
+        argumentos = {}
+        if n is not None:
+            argumentos['n'] = entero_param(request, 'n', n, MAXIMO_ESTADISTICAS)
+        if admite_muestreo:
+            muestreo = request.query_params.get('muestreo', 'top')
+            if muestreo not in matrices.MUESTREOS:
+                raise serializers.ValidationError({'muestreo': [f"Debe ser {' o '.join(matrices.MUESTREOS)}."]})
+            argumentos['muestreo'] = muestreo
+        return Response(calcular(**argumentos))
+
+
+class TareaViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Encola tareas para ``manage.py trabajador`` y consulta su estado (ver ``libros.tareas``)."""
+    queryset = Tarea.objects.select_related('usuario')
+    serializer_class = TareaSerializer
+    permission_classes = [IsAdminUser]
+    filter_backends = [FiltroConsulta]
+    filtros = {
+        'estado': Filtro('estado', opciones(*(estado for estado, _ in Tarea.ESTADOS))),
+        'tipo': Filtro('tipo', opciones(*tareas.TAREAS)),
+    }
+    ordenamientos = {'id': 'id'}
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tarea, creada = tareas.encolar(
+            serializer.validated_data['tipo'], serializer.validated_data.get('parametros'), request.user,
+        )
+        # Si ya había una igual pendiente o en curso se devuelve esa
+        return Response(self.get_serializer(tarea).data, status=status.HTTP_201_CREATED if creada else status.HTTP_200_OK)
@@ -0,0 +1,197 @@
+"""Versiones asíncronas de los endpoints de lectura más usados.
+
+Con ASGI estas vistas corren directamente en el event loop y usan el ORM
+asíncrono (``aget``, ``async for``), sin ocupar un hilo por petición. Los
+listados se transmiten por bloques con generadores asíncronos, así un cliente
+lento no retiene ningún hilo mientras recibe la respuesta.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from usuarios.autenticacion import usuarios, verificar_revocacion
+
+from . import ranking, recomendador
+from .filtros import MAXIMO_ENTERO, id_unico
+from .models import Libro, Calificacion, PosicionRanking
+from .serializers import CAMPOS_LIBRO_PLANO, libro_desde_fila
+from .views import LibroViewSet
+
+TAMANIO_PAGINA = 50
+TAMANIO_MAXIMO_PAGINA = 1000
+TAMANIO_BLOQUE = 500
+
+_codificador = DjangoJSONEncoder()
+
+
+def _error(detalle, estado):
+    return JsonResponse({'detail': detalle}, status=estado)
+
+
+def _parametros(request, **limites):
+    """Valida los enteros de la consulta: ``limites`` es ``{nombre: (defecto, maximo)}``."""
+    valores = {}
+    for nombre, (defecto, maximo) in limites.items():
+        valor = request.GET.get(nombre)
+        if valor is None:
+            valores[nombre] = defecto
+            continue
+        if not valor.isdigit() or not 1 <= int(valor) <= MAXIMO_ENTERO:
+            raise serializers.ValidationError({nombre: ['Debe ser un número entero mayor que cero.']})
+        valores[nombre] = int(valor) if maximo is None else min(int(valor), maximo)
+    return valores
+
+
+def requiere_jwt(vista):
+    """Autenticación JWT para vistas asíncronas (equivalente a ``IsAuthenticated``)."""
+    autenticacion = JWTAuthentication()
+
+    @functools.wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        encabezado = autenticacion.get_header(request)
+        crudo = autenticacion.get_raw_token(encabezado) if encabezado else None
+        if crudo is None:
+            return _error('Las credenciales de autenticación no se proveyeron.', 401)
+        try:
+            token = autenticacion.get_validated_token(crudo)
+            usuario_id = token[api_settings.USER_ID_CLAIM]
+            # Solo lecturas: igual que JWTAutenticacionRapida, se usa la caché de usuarios
+            usuario = usuarios.obtener(usuario_id)
+            if usuario is None:
+                usuario = await User.objects.aget(pk=usuario_id, is_active=True)
+                usuarios.guardar(usuario)
+            verificar_revocacion(usuario, token)
+        except AuthenticationFailed as exc:
+            return _error(str(exc.detail), 401)
+        except (InvalidToken, TokenError, KeyError, User.DoesNotExist):
+            return _error('El token no es válido o expiró.', 401)
+        request.user = usuario
+        try:
+            return await vista(request, *args, **kwargs)
+        except serializers.ValidationError as exc:
+            return JsonResponse(exc.detail, status=400, safe=False)
+    return envoltura
+
+
+def _filtrar(request, queryset):
+    # Los mismos filtros (y validaciones) que /api/libros/
+    for nombre, filtro in LibroViewSet.filtros.items():
+        valor = request.GET.get(nombre)
+        if valor not in (None, ''):
+            queryset = filtro.filtrar(queryset, nombre, valor, request)
+    return queryset
+
+
+@requiere_jwt
+async def libros(request):
+    """Listado paginado por clave: ``?despues=<id>&page_size=N`` y los filtros de /api/libros/."""
+    parametros = _parametros(request, page_size=(TAMANIO_PAGINA, TAMANIO_MAXIMO_PAGINA), despues=(0, None))
+    tamanio = parametros['page_size']
+    base = _filtrar(request, Libro.objects.order_by('id')).values_list(*CAMPOS_LIBRO_PLANO)
+
+    async def contenido():
+        yield '{"results": ['
+        cantidad, ultimo = 0, parametros['despues']
+        # Por bloques de TAMANIO_BLOQUE filas, cada uno con su propia consulta por clave
+        while cantidad < tamanio:
+            bloque = base.filter(pk__gt=ultimo)[:min(TAMANIO_BLOQUE, tamanio - cantidad)]
+            filas = [fila async for fila in bloque]
+            for fila in filas:
+                yield (',' if cantidad else '') + _codificador.encode(libro_desde_fila(fila))
+                cantidad, ultimo = cantidad + 1, fila[0]
+            if len(filas) < TAMANIO_BLOQUE:
+                break
+        siguiente = None
+        if cantidad == tamanio:
+            consulta = request.GET.copy()
+            consulta['despues'] = ultimo
+            siguiente = request.build_absolute_uri(f'{request.path}?{consulta.urlencode()}')
+        yield '], "next": ' + _codificador.encode(siguiente) + '}'
+
+    return StreamingHttpResponse(contenido(), content_type='application/json')
+
+
+@requiere_jwt
+async def libro(request, pk):
+    try:
+        fila = await Libro.objects.values_list(*CAMPOS_LIBRO_PLANO).aget(pk=pk)
+    except Libro.DoesNotExist:
+        return _error('Libro no encontrado.', 404)
+    return JsonResponse(libro_desde_fila(fila), encoder=DjangoJSONEncoder)
+
+
+@requiere_jwt
+async def top(request):
+    """Igual que /api/libros/top/: el ranking ponderado precalculado."""
+    genero = request.GET.get('genero')
+    if genero is not None:
+        genero = id_unico('genero', genero, request)
+    n = _parametros(request, n=(10, getattr(settings, 'RANKING_TAMANIO', 100)))['n']
+    posiciones = (
+        PosicionRanking.objects.filter(genero_id=genero) if genero
+        else PosicionRanking.objects.filter(genero__isnull=True)
+    ).order_by('posicion').values_list(
+        'posicion', 'puntaje', 'promedio', 'votos', *(f'libro__{campo}' for campo in CAMPOS_LIBRO_PLANO),
+    )[:n]
+    filas = [fila async for fila in posiciones]
+    if not filas and not await PosicionRanking.objects.aexists():
+        await sync_to_async(ranking.refrescar_ranking)()
+        filas = [fila async for fila in posiciones.all()]
+    return JsonResponse([
+        {
+            'posicion': posicion, 'puntaje': round(puntaje, 4), 'promedio': round(promedio, 4),
+            'votos': votos, 'libro': libro_desde_fila(libro),
+        }
+        for posicion, puntaje, promedio, votos, *libro in filas
+    ], encoder=DjangoJSONEncoder, safe=False)
+
+
+async def _libros_con_puntaje(pares, campo):
+    libros = {
+        fila[0]: libro_desde_fila(fila)
+        async for fila in Libro.objects.filter(pk__in=[libro_id for libro_id, _ in pares])
+        .values_list(*CAMPOS_LIBRO_PLANO)
+    }
+    return [
+        {'libro': libros[libro_id], campo: round(valor, 4)}
+        for libro_id, valor in pares if libro_id in libros
+    ]
+
+
+@requiere_jwt
+async def recomendaciones(request):
+    """Igual que /api/recomendaciones/: colaborativo o, sin historial, los más votados."""
+    n = _parametros(request, n=(10, 50))['n']
+    calificadas = {
+        libro_id: puntuacion
+        async for libro_id, puntuacion in Calificacion.objects.filter(usuario=request.user)
+        .values_list('libro_id', 'puntuacion')
+    }
+    try:
+        # Leer el índice (stat y np.load) y recorrerlo bloquea: se hace en un hilo aparte, sin tocar la base
+        recomendados = await sync_to_async(
+            lambda: recomendador.obtener_indice().recomendar(calificadas, n), thread_sensitive=False,
+        )()
+    except recomendador.IndiceNoDisponible:
+        recomendados = []
+
+    origen = 'colaborativo'
+    if not recomendados:
+        origen = 'populares'
+        recomendados = [
+            par async for par in Libro.objects.exclude(pk__in=calificadas)
+            .filter(cantidad_calificaciones__gt=0)
+            .con_promedio()
+            .order_by('-cantidad_calificaciones', '-promedio', 'id')
+            .values_list('id', 'promedio')[:n]
+        ]
+    resultados = await _libros_con_puntaje(recomendados, 'puntaje')
+    return JsonResponse({'origen': origen, 'results': resultados}, encoder=DjangoJSONEncoder)
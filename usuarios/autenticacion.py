@@ -0,0 +1,165 @@
+"""Autenticación JWT con menos consultas por petición.
+
+``JWTAuthentication`` busca al usuario en la base en cada petición. Acá, en
+las lecturas (GET, HEAD, OPTIONS) se confía en los claims del token ya
+validado y el usuario sale de una caché LRU en memoria con vencimiento corto
+(``USUARIOS_CACHE_TAMANIO`` usuarios, ``USUARIOS_CACHE_TTL`` segundos). Las
+escrituras siempre leen el usuario de la base, así un usuario desactivado no
+puede modificar nada aunque siga en la caché.
+
+Los refresh tokens rotados o cerrados con /logout/ se guardan en
+``TokenRevocado`` hasta su vencimiento; las filas vencidas se borran cada
+``TOKENS_REVOCADOS_PODA`` segundos.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch, get_md5_hash_password
+
+from .models import TokenRevocado
+
+
+class CacheUsuarios:
+    """LRU de usuarios por ID con vencimiento, compartida por los hilos del proceso."""
+
+    def __init__(self):
+        self._usuarios = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def tamanio(self):
+        return getattr(settings, 'USUARIOS_CACHE_TAMANIO', 1024)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'USUARIOS_CACHE_TTL', 60)
+
+    def obtener(self, usuario_id):
+        with self._lock:
+            entrada = self._usuarios.get(usuario_id)
+            if entrada is None:
+                return None
+            usuario, vence = entrada
+            if vence < time.monotonic():
+                del self._usuarios[usuario_id]
+                return None
+            self._usuarios.move_to_end(usuario_id)
+        # Una copia por petición: nadie modifica el objeto compartido
+        return copy.copy(usuario)
+
+    def guardar(self, usuario):
+        if self.tamanio < 1 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._usuarios[usuario.pk] = (copy.copy(usuario), time.monotonic() + self.ttl)
+            self._usuarios.move_to_end(usuario.pk)
+            while len(self._usuarios) > self.tamanio:
+                self._usuarios.popitem(last=False)
+
+    def descartar(self, usuario_id):
+        with self._lock:
+            self._usuarios.pop(usuario_id, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._usuarios.clear()
+
+
+usuarios = CacheUsuarios()
+
+
+def _usuario_cambiado(sender, instance, **kwargs):
+    usuarios.descartar(instance.pk)
+
+
+def conectar_senales():
+    modelo = get_user_model()
+    post_save.connect(_usuario_cambiado, sender=modelo, dispatch_uid='usuarios_cache_guardado')
+    post_delete.connect(_usuario_cambiado, sender=modelo, dispatch_uid='usuarios_cache_borrado')
+
+
+def verificar_revocacion(usuario, token):
+    """Con ``CHECK_REVOKE_TOKEN``, el token deja de valer si cambió la contraseña."""
+    if api_settings.CHECK_REVOKE_TOKEN and token.get(
+        api_settings.REVOKE_TOKEN_CLAIM
+    ) != get_md5_hash_password(usuario.password):
+        raise AuthenticationFailed('La contraseña del usuario cambió.', code='password_changed')
+
+
+class JWTAutenticacionRapida(JWTAuthentication):
+    """Como ``JWTAuthentication``, pero las lecturas usan la caché de usuarios."""
+
+    def authenticate(self, request):
+        encabezado = self.get_header(request)
+        if encabezado is None:
+            return None
+        crudo = self.get_raw_token(encabezado)
+        if crudo is None:
+            return None
+        token = self.get_validated_token(crudo)
+        if request.method in SAFE_METHODS:
+            return self.get_user_cacheado(token), token
+        return self.get_user(token), token
+
+    def get_user_cacheado(self, token):
+        try:
+            usuario_id = token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('El token no identifica a ningún usuario.')
+        usuario = usuarios.obtener(usuario_id)
+        if usuario is None:
+            return self.get_user(token)
+        verificar_revocacion(usuario, token)
+        return usuario
+
+    def get_user(self, token):
+        usuario = super().get_user(token)
+        usuarios.guardar(usuario)
+        return usuario
+
+
+_ultima_poda = 0.0
+_lock_poda = threading.Lock()
+
+
+def podar_revocados(forzar=False):
+    """Borra los tokens revocados que ya vencieron (a lo sumo cada ``TOKENS_REVOCADOS_PODA`` s)."""
+    global _ultima_poda
+    ahora = time.monotonic()
+    with _lock_poda:
+        if not forzar and ahora - _ultima_poda < getattr(settings, 'TOKENS_REVOCADOS_PODA', 3600):
+            return 0
+        _ultima_poda = ahora
+    borrados, _ = TokenRevocado.objects.filter(expira__lt=timezone.now()).delete()
+    return borrados
+
+
+class TokenRefresco(RefreshToken):
+    """Refresh token que se puede revocar sin la app ``token_blacklist`` de simplejwt."""
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        if TokenRevocado.objects.filter(pk=self.payload[api_settings.JTI_CLAIM]).exists():
+            raise TokenError('El token fue revocado.')
+
+    def outstand(self):
+        # Sin la app token_blacklist no hay tabla de tokens emitidos: solo se guardan los revocados
+        return None
+
+    def blacklist(self):
+        TokenRevocado.objects.bulk_create(
+            [TokenRevocado(jti=self.payload[api_settings.JTI_CLAIM], expira=datetime_from_epoch(self.payload['exp']))],
+            ignore_conflicts=True,
+        )
+        podar_revocados()
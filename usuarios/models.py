@@ -1,3 +1,17 @@
 from django.db import models
 
 # Create your models here.
+
+
+class TokenRevocado(models.Model):
+    """Refresh token que ya no se acepta (rotado o cerrado con /logout/).
+
+    Solo se guarda el ``jti`` (la clave primaria, así la consulta es por
+    índice) y el vencimiento: pasado ``expira`` el token ya no es válido de
+    todas formas y la fila se puede borrar.
+    """
+    jti = models.CharField(max_length=255, primary_key=True)
+    expira = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
@@ -1,3 +1,68 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .autenticacion import podar_revocados, usuarios
+from .models import TokenRevocado
 
 # Create your tests here.
+
+
+class AutenticacionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        usuarios.limpiar()
+        self.usuario = User.objects.create_user('lector', password='clave1234')
+        self.client = APIClient()
+        respuesta = self.client.post('/login/', {'username': 'lector', 'password': 'clave1234'}, format='json')
+        self.tokens = respuesta.data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+
+    def consultas_a_usuarios(self, metodo, ruta, **kwargs):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = getattr(self.client, metodo)(ruta, **kwargs)
+        return respuesta, sum('auth_user' in consulta['sql'] for consulta in consultas)
+
+    def test_lecturas_usan_la_cache_de_usuarios(self):
+        respuesta, primera = self.consultas_a_usuarios('get', '/api/generos/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(primera, 1)
+        respuesta, segunda = self.consultas_a_usuarios('get', '/api/generos/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(segunda, 0)
+
+        # Las escrituras siempre leen el usuario de la base
+        _, escritura = self.consultas_a_usuarios('post', '/api/generos/', data={'nombre': 'Ensayo'}, format='json')
+        self.assertEqual(escritura, 1)
+
+    def test_usuario_desactivado_sale_de_la_cache(self):
+        self.assertEqual(self.client.get('/api/generos/').status_code, 200)
+        self.usuario.is_active = False
+        self.usuario.save()
+        self.assertEqual(self.client.get('/api/generos/').status_code, 401)
+
+    def test_refresh_rota_y_revoca_el_anterior(self):
+        anterior = self.tokens['refresh']
+        respuesta = self.client.post('/login/refresh/', {'refresh': anterior}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('access', respuesta.data)
+        self.assertNotEqual(respuesta.data['refresh'], anterior)
+        self.assertEqual(self.client.post('/login/refresh/', {'refresh': anterior}, format='json').status_code, 401)
+
+        nuevo = respuesta.data['refresh']
+        self.assertEqual(self.client.post('/logout/', {'refresh': nuevo}, format='json').status_code, 200)
+        self.assertEqual(self.client.post('/login/refresh/', {'refresh': nuevo}, format='json').status_code, 401)
+        self.assertEqual(self.client.post('/logout/', {'refresh': 'basura'}, format='json').status_code, 400)
+
+    def test_poda_de_tokens_vencidos(self):
+        ahora = timezone.now()
+        TokenRevocado.objects.create(jti='vencido', expira=ahora - timedelta(minutes=1))
+        TokenRevocado.objects.create(jti='vigente', expira=ahora + timedelta(days=1))
+        self.assertEqual(podar_revocados(forzar=True), 1)
+        self.assertEqual(list(TokenRevocado.objects.values_list('jti', flat=True)), ['vigente'])
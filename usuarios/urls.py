@@ -1,9 +1,11 @@
 from django.urls import path
-from .views import RegistroView
+from .views import LogoutView, RefrescoView, RegistroView
 from rest_framework_simplejwt.views import TokenObtainPairView
 
 urlpatterns = [
     path('register/', RegistroView.as_view(), name='register'),
     path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('login/refresh/', RefrescoView.as_view(), name='token_refresh'),
+    path('logout/', LogoutView.as_view(), name='logout'),
 
 ]
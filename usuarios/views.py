@@ -3,7 +3,8 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import RegisterSerializer
+from rest_framework_simplejwt.views import TokenRefreshView
+from .serializers import LogoutSerializer, RefrescoSerializer, RegisterSerializer
 
 class RegistroView(APIView):
     def post(self, request):
@@ -14,3 +15,18 @@ class RegistroView(APIView):
                 "message": "Usuario creado satisfactoriamente."
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RefrescoView(TokenRefreshView):
+    serializer_class = RefrescoSerializer
+
+
+class LogoutView(APIView):
+    def post(self, request):
+        serializer = LogoutSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.validated_data['refresh'].blacklist()
+            return Response({
+                "message": "Sesión cerrada."
+            }, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)